@@ -1,25 +1,272 @@
 import os
 import sys
+import time
 import streamlit as st
 import pandas as pd
 import duckdb
 from datetime import datetime
 # Assuming all your backend scripts are in the specified paths
 from src.Test_red.app_backend.data_utils import detect_column_types
-from src.Test_red.app_backend.analysis_utils import analyze_marketing_question, polish_with_gemini, _clean_and_prepare_data
+from src.Test_red.app_backend.analysis_utils import build_analysis_prompt, summarize_full_dataframe
+from src.Test_red.app_backend.sql_utils import build_sql_prompt, guarded_execute
+from src.Test_red.exception import DataIngestionError, QueryTimeoutError, SQLGuardError
+from src.Test_red.app_backend.prompt_utils import ANALYSIS_PROMPT_TOKENS, SQL_PROMPT_TOKENS, estimate_tokens
 from src.Test_red.app_backend.viz_utils import create_dynamic_visualizations
-from src.Test_red.app_backend.sql_utils import generate_sql_query
+from src.Test_red.app_backend.pipeline import StageResult, stream_question_pipeline
+from src.Test_red.app_backend.ingest import (
+    DEFAULT_CLEANING_SETTINGS, TABLE_NAME, STREAMING_INGEST, load_dataset, get_cached_dataset, is_large_upload, spill_upload,
+    create_table_from_frame, load_file_into_duckdb, stream_csv_into_duckdb, read_preview,
+)
+from src.Test_red.app_backend.workspace import get_workspace_manager
+from src.Test_red.app_backend.profile_utils import get_dataset_profile, get_table_profile, remember_profile
+from src.Test_red.app_backend.rollup_utils import build_rollups, list_rollups, rollup_context
+from src.Test_red.app_backend.query_cache import get_query_cache
+from src.Test_red.app_backend.insight_engine import answer_question, stream_narrative
+from src.Test_red.app_backend.llm_cache import LLM_CACHE_BYPASS, get_llm_cache, set_cache_bypass
+from src.Test_red.app_backend.trace_utils import bind_trace_context, new_id, recent_spans, start_metrics_export
+from src.Test_red.app_backend.api_clients import missing_api_keys, set_error_handler
+from src.Test_red.app_backend.compact_utils import compaction_report
+from src.Test_red.app_backend.excel_utils import EXCEL_SHEET, is_excel_file, list_sheets
+from src.Test_red.app_backend.append_utils import append_dataset, extend_workspace, get_appended_dataset
 
-def setup_dynamic_db() -> duckdb.DuckDBPyConnection:
-    return duckdb.connect(database=':memory:')
+SHOW_TIMINGS = os.getenv("GROWIFY_SHOW_TIMINGS", "1") == "1"  # "⏱️ Timings" expander under the results
+
+def setup_dynamic_db(dataset_key: str, load, profile_of) -> duckdb.DuckDBPyConnection:
+    """
+    Cursor on the dataset's persistent workspace, shared across sessions and reruns.
+    The first build loads the table with `load(conn)` and then materializes the
+    time rollups from the column tags of `profile_of(conn)`.
+    """
+    def build(build_conn):
+        load(build_conn)
+        build_rollups(build_conn, TABLE_NAME, detect_column_types(None, profile_of(build_conn)))
+    return get_workspace_manager().connect(dataset_key, build)
+
+def load_uploaded_dataset(uploaded_file, sheet=None):
+    """Returns (dataset_key, cleaned df), hashing the upload only once per file and sheet choice."""
+    keys = st.session_state.setdefault('dataset_keys', {})
+    upload_id = (uploaded_file.file_id, sheet)
+    if upload_id in keys:
+        cached = get_cached_dataset(keys[upload_id])
+        if cached is not None:
+            return keys[upload_id], cached
+    key, df = load_dataset(uploaded_file.getvalue(), uploaded_file.name,
+                           {**DEFAULT_CLEANING_SETTINGS, "excel_sheet": sheet} if sheet else None)
+    keys[upload_id] = key
+    return key, df
+
+def append_uploaded_rows(base_key: str, append_file):
+    """
+    Appends an upload's rows to the current dataset version and returns (new version key, df).
+    Only the new rows are cleaned; the workspace and its rollups are extended, not rebuilt.
+    """
+    versions = st.session_state.setdefault('appended_versions', {})
+    upload_id = (base_key, append_file.file_id)
+    if upload_id in versions:
+        version, n_rows = versions[upload_id]
+        cached = get_appended_dataset(version)
+        if cached is not None:
+            st.sidebar.caption(f"➕ {append_file.name}: {n_rows:,} rows appended")
+            return version, cached
+    result = append_dataset(base_key, append_file.getvalue(), append_file.name)
+    extend_workspace(result)
+    versions[upload_id] = (result.version, len(result.rows))
+    st.sidebar.caption(f"➕ {append_file.name}: {len(result.rows):,} rows appended")
+    return result.version, result.df
+
+def choose_sheet(uploaded_file):
+    """Sidebar picker for workbooks with several sheets: the first, all of them unioned, or one by name."""
+    sheets_by_file = st.session_state.setdefault('workbook_sheets', {})
+    if uploaded_file.file_id not in sheets_by_file:
+        sheets_by_file[uploaded_file.file_id] = list_sheets(uploaded_file.getvalue(), uploaded_file.name)
+    sheets = sheets_by_file[uploaded_file.file_id]
+    if len(sheets) < 2:
+        return None
+    options = ["first", "all"] + sheets
+    labels = {"first": f"First sheet ({sheets[0]})", "all": f"All {len(sheets)} sheets (union)"}
+    return st.sidebar.selectbox(
+        "📑 Sheet", options, index=options.index(EXCEL_SHEET) if EXCEL_SHEET in options else 0,
+        format_func=lambda option: labels.get(option, option),
+        help="The union adds a source_sheet column and aligns columns by name")
+
+def stream_with_progress(build_conn, path: str, dataset_key: str):
+    """Streams a CSV into the workspace chunk by chunk, refreshing sidebar metrics and prompt context as chunks land."""
+    panel = st.sidebar.empty()
+    profile = None
+    for profile, _ in stream_csv_into_duckdb(build_conn, path, TABLE_NAME):
+        with panel.container():
+            st.header("⏳ Loading in chunks")
+            st.metric("Rows loaded", f"{profile.n_rows:,}")
+            st.metric("Columns", len(profile.columns))
+            with st.expander("🧾 Prompt context so far"):
+                st.json(summarize_full_dataframe(None, profile=profile), expanded=False)
+    panel.empty()
+    if profile is not None:
+        remember_profile(dataset_key, profile)
+
+def load_large_dataset(uploaded_file, streaming: bool = False):
+    """
+    Spills a large upload to disk and loads it into the dataset's DuckDB workspace.
+    Returns (dataset_key, connection); pandas only ever sees bounded previews.
+    """
+    spilled = st.session_state.setdefault('spilled_uploads', {})
+    if uploaded_file.file_id not in spilled:
+        spilled[uploaded_file.file_id] = spill_upload(uploaded_file, uploaded_file.name)
+    key, path = spilled[uploaded_file.file_id]
+    if streaming and path.endswith('.csv'):
+        build = lambda build_conn: stream_with_progress(build_conn, path, key)
+    else:
+        build = lambda build_conn: load_file_into_duckdb(build_conn, path, TABLE_NAME)
+    conn = setup_dynamic_db(key, build, lambda build_conn: get_table_profile(build_conn, TABLE_NAME, key))
+    return key, conn
+
+def session_memo(name: str, dataset_key: str, compute):
+    """Computes a per-dataset value once and reuses it on every later rerun."""
+    if st.session_state.get('memo_dataset_key') != dataset_key:
+        st.session_state.memo_dataset_key = dataset_key
+        st.session_state.memo = {}
+    if name not in st.session_state.memo:
+        st.session_state.memo[name] = compute()
+    return st.session_state.memo[name]
+
+STAGE_TITLES = {
+    "analysis": "🔍 Detailed Analysis (Together AI)",
+    "polish": "📊 Executive Report (Gemini)",
+    "sql": "🔧 SQL Query (Advanced)",
+}
+
+def render_stage(slot, stage, conn, dataset_key):
+    """Renders one finished pipeline stage into its placeholder."""
+    with slot.container():
+        if stage.name == "sql":
+            with st.expander(STAGE_TITLES["sql"]):
+                if stage.error is not None:
+                    st.warning(f"Could not generate SQL: {stage.error}")
+                    return
+                st.code(stage.result, language='sql')
+                if st.button("Execute SQL", key="execute_sql"):
+                    try:
+                        # Guarded (SELECT only, row cap, plan check, timeout) and cached per dataset version
+                        result_df, cached, seconds = get_query_cache().execute(
+                            conn, stage.result, dataset_key, run=lambda: guarded_execute(conn, stage.result))
+                    except SQLGuardError as e:
+                        st.error(f"🛡️ {e}")
+                        return
+                    except QueryTimeoutError as e:
+                        st.error(f"⏱️ {e}. Try narrowing the question or a rollup table.")
+                        return
+                    st.dataframe(result_df, use_container_width=True)
+                    if result_df.attrs.get("truncated"):
+                        st.caption(f"Showing the first {len(result_df):,} rows")
+                    if cached:
+                        st.caption(f"⚡ Served from the result cache (saved {seconds:.2f}s)")
+                    else:
+                        st.caption(f"⏱️ Executed in {seconds:.2f}s")
+            return
+        st.subheader(STAGE_TITLES[stage.name])
+        if stage.error is not None:
+            st.error(f"{STAGE_TITLES[stage.name]} failed: {stage.error}")
+        else:
+            st.markdown(stage.result)
+        if stage.first_token is not None:
+            st.caption(f"⏱️ first token {stage.first_token:.1f}s · done {stage.seconds:.1f}s")
+        else:
+            st.caption(f"⏱️ {stage.seconds:.1f}s")
+
+def render_fast_answer(fast_answer):
+    """Renders an instant (no-LLM) answer, with an optional AI narrative on top of the exact figures."""
+    result = fast_answer['result']
+    st.subheader("⚡ Instant Answer")
+    st.markdown(result.summary)
+    st.plotly_chart(result.figure, use_container_width=True, key="fast_answer_chart")
+    st.dataframe(result.table, use_container_width=True)
+    source = "result cache" if result.cached else "DuckDB"
+    st.caption(f"⏱️ Computed exactly from the full dataset in {result.seconds * 1000:.0f} ms ({source}), "
+               "no LLM call. Ask a “why” question or untick instant answers for the full AI analysis.")
+    with st.expander("🔧 SQL used"):
+        st.code(result.sql, language='sql')
+    if 'narrative' in fast_answer:
+        st.markdown(fast_answer['narrative'])
+    elif st.button("📝 Add AI narrative", key="fast_answer_narrative"):
+        fast_answer['narrative'] = st.write_stream(stream_narrative(result))
+
+def spans_frame(spans) -> pd.DataFrame:
+    return pd.DataFrame([{
+        "span": s.name,
+        "seconds": round(s.seconds, 3),
+        "status": s.status,
+        "started": datetime.fromtimestamp(s.started_at).strftime("%H:%M:%S"),
+        "details": ", ".join(f"{k}={v}" for k, v in s.attrs.items() if k != "error") or s.attrs.get("error", ""),
+    } for s in spans])
+
+def render_timings(session_id: str, question_id=None):
+    """Span timings of this session: the latest question's stages first, then ingestion and setup work."""
+    spans = recent_spans(session_id=session_id)
+    if not spans:
+        return
+    with st.expander("⏱️ Timings"):
+        question_spans = [s for s in spans if question_id and s.question_id == question_id]
+        if question_spans:
+            st.caption("Latest question")
+            st.dataframe(spans_frame(question_spans), use_container_width=True, hide_index=True)
+        setup_spans = [s for s in spans if s.question_id is None][-50:]
+        if setup_spans:
+            st.caption("Upload, cleaning, profiling and charts")
+            st.dataframe(spans_frame(setup_spans), use_container_width=True, hide_index=True)
+
+def render_partial(slot, name, text):
+    """Renders a stage that is still streaming, with a cursor at the end."""
+    with slot.container():
+        st.subheader(STAGE_TITLES[name])
+        st.markdown(text + " ▌")
+
+STREAM_REFRESH_SECONDS = 0.1  # redraw streaming stages at most this often
+
+def run_streaming_pipeline(slots, conn, dataset_key, df, question, summary_text, column_analysis, profile,
+                           rollups, context):
+    """
+    Streams the analysis and the polish into their slots token by token while SQL
+    generation runs in the background. Returns the finished StageResults by name.
+    """
+    texts, first_token, results = {}, {}, {}
+    last_draw = {}
+    for event in stream_question_pipeline(df, question, summary_text, column_analysis, profile,
+                                          rollups=rollups, rollup_context=context):
+        name = event.stage
+        if event.kind == "token":
+            texts[name] = texts.get(name, "") + event.text
+            first_token.setdefault(name, event.seconds)
+            now = time.perf_counter()
+            if now - last_draw.get(name, 0.0) >= STREAM_REFRESH_SECONDS:
+                last_draw[name] = now
+                render_partial(slots[name], name, texts[name])
+            continue
+        error = event.text if event.kind == "error" else None
+        result = None if error is not None else event.text
+        results[name] = StageResult(name, result=result, error=error, seconds=event.seconds,
+                                    first_token=first_token.get(name))
+        render_stage(slots[name], results[name], conn, dataset_key)
+    return results
 
 def main():
     st.set_page_config(page_title="Dynamic Marketing Data Analyzer", page_icon="📊", layout="wide")
     st.title("🚀 Dynamic Marketing Data Analyzer")
     st.markdown("### AI-Powered Analysis with Together AI + Gemini Integration")
     
-    conn = setup_dynamic_db()
     st.markdown("---")
+    # The backend stays headless: key checks and provider errors surface here
+    missing_keys = missing_api_keys()
+    if missing_keys:
+        for name in missing_keys:
+            st.error(f"❌ Missing or empty {name} in environment variables")
+        st.stop()
+    # LLM calls also run on pipeline worker threads, so errors are collected and shown on this one
+    api_errors = []
+    set_error_handler(api_errors.append)
+    # Spans of this script run are correlated by session (and, once asked, by question)
+    start_metrics_export()
+    session_id = st.session_state.setdefault('trace_session_id', new_id())
+    bind_trace_context(session_id)
     uploaded_file = st.file_uploader("📁 Upload your marketing dataset", type=['csv', 'xlsx', 'xls'])
 
     if 'user_question' not in st.session_state:
@@ -27,38 +274,84 @@ def main():
 
     if uploaded_file:
         try:
-            if uploaded_file.name.endswith('.csv'):
-                df_raw = pd.read_csv(uploaded_file)
+            if is_large_upload(uploaded_file.size):
+                # Larger-than-RAM path: DuckDB reads and cleans the file, df is only a bounded preview
+                streaming = uploaded_file.name.lower().endswith('.csv') and st.sidebar.toggle(
+                    "Stream large CSVs in chunks", value=STREAMING_INGEST,
+                    help="Profile progressively with mergeable sketches while the file loads")
+                with st.spinner("🦆 Loading large file with DuckDB..."):
+                    dataset_key, conn = load_large_dataset(uploaded_file, streaming)
+                    df = session_memo('preview', dataset_key, lambda: read_preview(conn, TABLE_NAME))
             else:
-                df_raw = pd.read_excel(uploaded_file)
-            
-            df_raw.columns = df_raw.columns.str.strip().str.replace(' ', '_')
-            
-            # **CORRECTED**: Use the dedicated cleaning function from analysis_utils
-            df = _clean_and_prepare_data(df_raw)
-            
-            conn.register('marketing_data', df)
-            st.success(f"✅ Successfully loaded and cleaned: {len(df):,} rows × {len(df.columns)} columns")
+                # Parsing and cleaning are cached by content hash, so reruns are lookups
+                sheet = choose_sheet(uploaded_file) if is_excel_file(uploaded_file.name) else None
+                dataset_key, df = load_uploaded_dataset(uploaded_file, sheet)
+                append_files = st.sidebar.file_uploader(
+                    "➕ Append new rows", type=['csv', 'xlsx', 'xls'], accept_multiple_files=True,
+                    help="Newer exports with the same columns, appended in upload order without reprocessing the history")
+                for append_file in append_files or []:
+                    try:
+                        dataset_key, df = append_uploaded_rows(dataset_key, append_file)
+                    except DataIngestionError as e:
+                        st.sidebar.error(f"❌ {append_file.name} was not appended: {e}")
+                        break
+                conn = setup_dynamic_db(dataset_key,
+                                        lambda build_conn: create_table_from_frame(build_conn, df, TABLE_NAME),
+                                        lambda build_conn: get_dataset_profile(df, dataset_key))
             
             with st.spinner("🔍 Analyzing data structure..."):
-                # This can be used for UI elements but not for core analysis functions
-                column_analysis = detect_column_types(df)
+                # One profile per dataset version feeds the sidebar, charts and both LLM prompts
+                if is_large_upload(uploaded_file.size):
+                    profile = session_memo('profile', dataset_key, lambda: get_table_profile(conn, TABLE_NAME, dataset_key))
+                else:
+                    profile = session_memo('profile', dataset_key, lambda: get_dataset_profile(df, dataset_key))
+                column_analysis = session_memo('column_analysis', dataset_key, lambda: detect_column_types(df, profile))
+                rollups = session_memo('rollups', dataset_key, lambda: list_rollups(conn))
+                n_rows = profile.n_rows
                 # Create a simple text summary for the AI context
-                summary_text = f"The dataset has {len(df)} rows and columns like {', '.join(df.columns[:5])}."
+                summary_text = f"The dataset has {n_rows} rows and columns like {', '.join(df.columns[:5])}."
+            st.success(f"✅ Successfully loaded and cleaned: {n_rows:,} rows × {len(df.columns)} columns")
 
             with st.sidebar:
                 st.header("📊 Data Analysis")
                 with st.expander("📋 Dataset Overview", expanded=True):
-                    st.metric("Rows", f"{len(df):,}")
+                    st.metric("Rows", f"{n_rows:,}")
                     st.metric("Columns", len(df.columns))
-                    total_nulls = df.isnull().sum().sum()
-                    if len(df) > 0 and len(df.columns) > 0:
-                        quality_score = max(0, 100 - (total_nulls / (df.size) * 100))
+                    total_nulls = profile.total_nulls
+                    if n_rows > 0 and len(df.columns) > 0:
+                        quality_score = max(0, 100 - (total_nulls / (n_rows * len(df.columns)) * 100))
                         st.metric("Data Quality", f"{quality_score:.1f}%")
+                    compaction = compaction_report(df)
+                    if compaction is not None:
+                        st.metric("Memory", f"{compaction.bytes_after / 2**20:,.1f} MB",
+                                  f"-{(compaction.bytes_before - compaction.bytes_after) / 2**20:,.1f} MB",
+                                  delta_color="inverse", help="After compact dtypes (GROWIFY_COMPACT_DTYPES)")
+                        st.caption(f"🗜️ {compaction.describe()}")
                 
                 with st.expander("🔍 Column Details"):
                     st.json(column_analysis, expanded=False)
 
+                if rollups:
+                    with st.expander("🧊 Rollup Tables"):
+                        st.caption("Pre-aggregated at upload time; offered to the SQL and analysis prompts")
+                        for rollup in rollups:
+                            st.text(f"{rollup.name}: {rollup.row_count:,} rows")
+
+                with st.expander("🧠 LLM Response Cache"):
+                    bypass_cache = st.checkbox("Bypass cache (always call the models)", value=LLM_CACHE_BYPASS)
+                    set_cache_bypass(bypass_cache)
+                    cache_stats = get_llm_cache().stats()
+                    st.metric("Hit rate", f"{cache_stats['hit_rate'] * 100:.0f}%")
+                    st.caption(f"{cache_stats['hits']} hits · {cache_stats['misses']} misses · "
+                               f"{cache_stats['entries']} entries · {cache_stats['size_mb']} MB")
+
+                with st.expander("🗃️ SQL Result Cache"):
+                    query_stats = get_query_cache().stats()
+                    st.metric("Hit rate", f"{query_stats['hit_rate'] * 100:.0f}%")
+                    st.metric("Execution time saved", f"{query_stats['saved_seconds']:.2f}s")
+                    st.caption(f"{query_stats['hits']} hits · {query_stats['misses']} misses · "
+                               f"{query_stats['memory_mb']} MB in memory · {query_stats['disk_mb']} MB on disk")
+
             # Main layout
             col1, col2 = st.columns([2, 1])
             with col1:
@@ -67,7 +360,7 @@ def main():
                 
                 with st.expander("📊 Automatic Visualizations", expanded=True):
                     with st.spinner("📈 Creating visualizations..."):
-                        figures = create_dynamic_visualizations(df, column_analysis)
+                        figures = session_memo('figures', dataset_key, lambda: create_dynamic_visualizations(df, column_analysis, dataset_key))
                     if figures:
                         for i, fig in enumerate(figures):
                             st.plotly_chart(fig, use_container_width=True, key=f"chart_{i}")
@@ -80,7 +373,8 @@ def main():
                 if not numeric_cols.empty:
                     for col in numeric_cols[:4]:
                         try:
-                            value = df[col].sum() if 'spend' in col.lower() or 'cost' in col.lower() or 'sales' in col.lower() else df[col].mean()
+                            col_profile = profile.columns[col]
+                            value = col_profile.sum if 'spend' in col.lower() or 'cost' in col.lower() or 'sales' in col.lower() else col_profile.mean
                             st.metric(col, f"{value:,.2f}")
                         except Exception:
                             pass # Failsafe for display
@@ -100,36 +394,63 @@ def main():
                 placeholder="e.g., 'Why did performance drop in March?'"
             )
 
-            if st.button("Analyze Question"):
-                if user_question:
+            fast_path = st.checkbox(
+                "⚡ Answer templated questions instantly", value=True,
+                help="Totals/averages per period, best/worst period, top N and period-over-period change "
+                     "are computed directly from the data without an LLM call")
+            analyze_clicked = st.button("Analyze Question")
+            # Results persist per dataset so reruns (e.g. "Execute SQL") keep showing them
+            question_results = session_memo('question_results', dataset_key, dict)
+            prompt_tokens = session_memo('prompt_tokens', dataset_key, dict)
+            fast_answer = session_memo('fast_answer', dataset_key, dict)
+            if analyze_clicked and user_question:
+                st.session_state.trace_question_id = new_id()
+            # Question work (pipeline, fast path, "Execute SQL" reruns) is tagged with the latest question
+            bind_trace_context(session_id, st.session_state.get('trace_question_id'))
+            if analyze_clicked and not user_question:
+                st.warning("Please enter a question to analyze.")
+            elif analyze_clicked or question_results or fast_answer:
+                st.markdown("---")
+                if analyze_clicked:
                     st.session_state.user_question = user_question
-                    st.markdown("---")
-                    
-                    with st.spinner("🧠 Analyzing with Together AI..."):
-                        # **CORRECTED**: Call analyze_marketing_question with the correct arguments
-                        together_analysis = analyze_marketing_question(df, user_question, summary_text)
-                    
-                    st.subheader("🔍 Detailed Analysis (Together AI)")
-                    st.markdown(together_analysis)
-
-                    with st.spinner("✨ Polishing with Gemini..."):
-                        # **CORRECTED**: Call polish_with_gemini with the correct arguments
-                        final_report = polish_with_gemini(user_question, together_analysis, summary_text)
-                    
-                    st.subheader("📊 Executive Report (Gemini)")
-                    st.markdown(final_report)
-                    
-                    with st.expander("🔧 SQL Query (Advanced)"):
-                        try:
-                            sql_candidate = generate_sql_query(user_question, df, column_analysis)
-                            st.code(sql_candidate, language='sql')
-                            if st.button("Execute SQL"):
-                                result_df = conn.execute(sql_candidate).df()
-                                st.dataframe(result_df, use_container_width=True)
-                        except Exception as e:
-                            st.warning(f"Could not generate SQL: {e}")
+                    question_results.clear()
+                    prompt_tokens.clear()
+                    fast_answer.clear()
+                    if fast_path:
+                        insight = answer_question(conn, user_question, column_analysis, TABLE_NAME, dataset_key)
+                        if insight is not None:
+                            fast_answer['result'] = insight
+                if fast_answer:
+                    render_fast_answer(fast_answer)
                 else:
-                    st.warning("Please enter a question to analyze.")
+                    if analyze_clicked:
+                        # Exact figures from the best-matching rollup, read on the script thread
+                        context = rollup_context(conn, rollups, user_question)
+                        prompt_tokens.update(
+                            analysis=estimate_tokens(build_analysis_prompt(
+                                df, user_question, summary_text, profile, column_analysis, rollup_context=context)),
+                            sql=estimate_tokens(build_sql_prompt(user_question, column_analysis, rollups=rollups)),
+                        )
+                    if prompt_tokens:
+                        st.caption(
+                            f"📏 Prompt size: analysis ~{prompt_tokens['analysis']:,} / {ANALYSIS_PROMPT_TOKENS:,} "
+                            f"tokens, SQL ~{prompt_tokens['sql']:,} / {SQL_PROMPT_TOKENS:,} tokens")
+                    slots = {name: st.empty() for name in STAGE_TITLES}
+                    if analyze_clicked:
+                        for name, slot in slots.items():
+                            slot.info(f"⏳ {STAGE_TITLES[name]} in progress...")
+                        # Analysis and polish stream in as they are generated; SQL runs in the background
+                        question_results.update(run_streaming_pipeline(
+                            slots, conn, dataset_key, df, user_question, summary_text, column_analysis, profile,
+                            rollups, context))
+                    else:
+                        for name, stage in question_results.items():
+                            render_stage(slots[name], stage, conn, dataset_key)
+                for message in api_errors:
+                    st.error(message)
+
+            if SHOW_TIMINGS:
+                render_timings(session_id, st.session_state.get('trace_question_id'))
 
         except Exception as e:
             st.error(f"An error occurred while processing the file: {e}")
@@ -0,0 +1 @@
+# Benchmarks for the data hot paths; run from the repository root (see run_benchmarks.py)
@@ -0,0 +1,60 @@
+# File: benchmarks/compare.py
+"""
+Compares two run_benchmarks JSON reports benchmark by benchmark.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 1.10
+"""
+
+import sys
+import json
+import argparse
+from typing import List, Optional
+
+# Slower than baseline × THRESHOLD counts as a regression (exit status 1)
+DEFAULT_THRESHOLD = 1.10
+
+
+def _load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)["datasets"]
+
+
+def compare(baseline: dict, candidate: dict, threshold: float = DEFAULT_THRESHOLD) -> List[dict]:
+    """One row per benchmark present in both reports, with time and peak RSS ratios."""
+    rows = []
+    for size, benchmarks in candidate.items():
+        for name, result in benchmarks.items():
+            before = baseline.get(size, {}).get(name)
+            if before is None:
+                continue
+            ratio = result["seconds_median"] / before["seconds_median"] if before["seconds_median"] else float("inf")
+            rows.append({
+                "rows": int(size),
+                "benchmark": name,
+                "baseline_s": before["seconds_median"],
+                "candidate_s": result["seconds_median"],
+                "time_ratio": ratio,
+                "rss_ratio": result["peak_rss_mb"] / before["peak_rss_mb"] if before["peak_rss_mb"] else float("inf"),
+                "regression": ratio > threshold,
+            })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    rows = compare(_load(args.baseline), _load(args.candidate), args.threshold)
+    print(f"{'rows':>10}  {'benchmark':<30} {'baseline':>10} {'candidate':>10} {'time':>7} {'rss':>7}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['rows']:>10,}  {row['benchmark']:<30} {row['baseline_s']:>9.3f}s {row['candidate_s']:>9.3f}s "
+              f"{row['time_ratio']:>6.2f}x {row['rss_ratio']:>6.2f}x{flag}")
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+# File: benchmarks/datagen.py
+
+import os
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+# ────────────────────────────────────────────────────────────────────────────────
+# GENERATOR SETTINGS
+# ────────────────────────────────────────────────────────────────────────────────
+CHUNK_ROWS   = 500_000          # rows generated (and formatted) at a time
+NULL_RATE    = 0.02             # share of blank cells in every text-formatted column
+START_DATE   = "2022-01-01"
+DAYS         = 3 * 365
+
+# Every upload format the cleaner has to recognise, mixed row by row
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%d-%b-%Y", "%b %d, %Y")
+
+CHANNELS  = ("Search", "Social", "Display", "Video", "Email", "Affiliate", "Native", "Audio")
+PLATFORMS = ("Google", "Meta", "TikTok", "LinkedIn", "Snapchat", "Pinterest", "Bing", "Reddit", "X", "Amazon")
+REGIONS   = ("NA", "EMEA", "APAC", "LATAM")
+BRANDS    = ("acme", "globex", "initech", "umbrella", "hooli", "stark", "wayne", "wonka")
+OBJECTIVES = ("prospecting", "retargeting", "brand", "promo", "launch", "seasonal")
+
+# Extra metric columns for wide datasets, named so detect_column_types tags them
+EXTRA_METRICS = (
+    ("Video Views", "volume"), ("Leads", "volume"), ("Landing Page Views", "volume"),
+    ("Add To Cart Clicks", "volume"), ("Engagement Rate", "rate"), ("Conversion Rate", "rate"),
+    ("CPM", "money"), ("Cost per Lead", "money"), ("Budget", "money"), ("Frequency", "plain"),
+    ("Reach", "volume"), ("Bounce Rate", "rate"),
+)
+
+
+def _blank(values: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    values[rng.random(len(values)) < NULL_RATE] = ""
+    return values
+
+
+def _with_commas(values: np.ndarray, decimals: int) -> np.ndarray:
+    return np.array([f"{v:,.{decimals}f}" for v in values], dtype=object)
+
+
+def _dates(days: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    dates = pd.Timestamp(START_DATE) + pd.to_timedelta(days, unit="D")
+    out = np.empty(len(days), dtype=object)
+    style = rng.integers(0, len(DATE_FORMATS), len(days))
+    for i, fmt in enumerate(DATE_FORMATS):
+        picked = style == i
+        out[picked] = dates[picked].strftime(fmt)
+    return out
+
+
+def _campaigns(rng: np.random.Generator, n: int, cardinality: int) -> np.ndarray:
+    ids = rng.zipf(1.3, n) % cardinality
+    brand = np.asarray(BRANDS, dtype=object)[ids % len(BRANDS)]
+    objective = np.asarray(OBJECTIVES, dtype=object)[(ids // len(BRANDS)) % len(OBJECTIVES)]
+    return brand + "_" + objective + "_" + pd.Series(ids).map("{:05d}".format).to_numpy(dtype=object)
+
+
+def _chunk(rng: np.random.Generator, n: int, extra_metrics: int, campaign_cardinality: int) -> pd.DataFrame:
+    impressions = rng.lognormal(9, 1.2, n).round()
+    ctr = np.clip(rng.normal(0.02, 0.008, n), 0.001, None)
+    clicks = np.round(impressions * ctr)
+    cpc = rng.gamma(2.0, 0.6, n)
+    spend = clicks * cpc
+    conversions = rng.binomial(clicks.astype(np.int64), 0.04)
+    revenue = conversions * rng.gamma(3.0, 25.0, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        roas = np.where(spend > 0, revenue / spend, np.nan)
+
+    columns = {
+        "Date": _blank(_dates(rng.integers(0, DAYS, n), rng), rng),
+        "Campaign Name": _campaigns(rng, n, campaign_cardinality),
+        "Channel": rng.choice(np.asarray(CHANNELS, dtype=object), n),
+        "Platform": rng.choice(np.asarray(PLATFORMS, dtype=object), n),
+        "Region": rng.choice(np.asarray(REGIONS, dtype=object), n),
+        "Spend": _blank("$" + _with_commas(spend, 2), rng),
+        "Impressions": _blank(_with_commas(impressions, 0), rng),
+        "Clicks": _blank(_with_commas(clicks, 0), rng),
+        "Conversions": conversions,
+        "Revenue": _blank(_with_commas(revenue, 2), rng),
+        "CTR %": _blank(np.char.add(np.round(ctr * 100, 2).astype(str), "%").astype(object), rng),
+        "CPC": np.round(cpc, 2),
+        "ROAS": np.round(roas, 3),
+    }
+    for i in range(extra_metrics):
+        label, kind = EXTRA_METRICS[i % len(EXTRA_METRICS)]
+        name = label if i < len(EXTRA_METRICS) else f"{label} {i // len(EXTRA_METRICS) + 1}"
+        if kind == "volume":
+            columns[name] = _blank(_with_commas(rng.lognormal(7, 1.0, n).round(), 0), rng)
+        elif kind == "rate":
+            columns[name] = np.round(rng.beta(2, 30, n), 4)
+        elif kind == "money":
+            columns[name] = _blank(_with_commas(rng.gamma(2.0, 40.0, n), 2), rng)
+        else:
+            columns[name] = np.round(rng.gamma(1.5, 1.5, n), 2)
+    return pd.DataFrame(columns)
+
+
+def iter_marketing_chunks(
+    rows: int,
+    seed: int = 0,
+    extra_metrics: int = 0,
+    campaign_cardinality: Optional[int] = None,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """
+    Raw ad-performance data as it arrives in uploads, `chunk_rows` at a time:
+    comma/$/%-formatted numbers stored as text, four date formats mixed row by
+    row, blank cells, Zipf-distributed campaign names and `extra_metrics`
+    additional metric columns. The same seed always yields the same data.
+    """
+    rng = np.random.default_rng(seed)
+    cardinality = campaign_cardinality or max(10, rows // 20)
+    for start in range(0, rows, chunk_rows):
+        yield _chunk(rng, min(chunk_rows, rows - start), extra_metrics, cardinality)
+
+
+def generate_marketing_data(rows: int, seed: int = 0, extra_metrics: int = 0,
+                            campaign_cardinality: Optional[int] = None) -> pd.DataFrame:
+    """All of iter_marketing_chunks as one frame."""
+    frame = pd.concat(list(iter_marketing_chunks(rows, seed, extra_metrics, campaign_cardinality)),
+                      ignore_index=True)
+    return frame
+
+
+def write_marketing_csv(path: str, rows: int, seed: int = 0, extra_metrics: int = 0,
+                        campaign_cardinality: Optional[int] = None) -> str:
+    """Streams the generated data to a CSV file (for upload and ingestion benchmarks)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    for i, chunk in enumerate(iter_marketing_chunks(rows, seed, extra_metrics, campaign_cardinality)):
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    return path
+
+
+def load_or_generate(rows: int, seed: int = 0, extra_metrics: int = 0, data_dir: Optional[str] = None) -> pd.DataFrame:
+    """
+    generate_marketing_data, kept as Parquet in `data_dir` between runs:
+    formatting millions of numbers as text is slower than the code under test.
+    """
+    if data_dir is None:
+        return generate_marketing_data(rows, seed, extra_metrics)
+    path = os.path.join(data_dir, f"marketing_{rows}_{seed}_{extra_metrics}.parquet")
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    frame = generate_marketing_data(rows, seed, extra_metrics)
+    os.makedirs(data_dir, exist_ok=True)
+    frame.to_parquet(path, index=False)
+    return frame
@@ -0,0 +1,101 @@
+# File: benchmarks/import_times.py
+"""
+Times cold imports of the backend modules, each in a fresh interpreter, and writes the results to JSON.
+
+    python -m benchmarks.import_times --repeats 5 --output import_times.json
+    python -m benchmarks.import_times src.Test_red.app_backend.pipeline --top 15
+"""
+
+import sys
+import json
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from typing import List, Optional
+
+# ────────────────────────────────────────────────────────────────────────────────
+# IMPORT BENCHMARK SETTINGS
+# ────────────────────────────────────────────────────────────────────────────────
+DEFAULT_REPEATS = 5
+MODULES = (
+    "src.Test_red.app_backend",
+    "src.Test_red.app_backend.api_clients",
+    "src.Test_red.app_backend.analysis_utils",
+    "src.Test_red.app_backend.sql_utils",
+    "src.Test_red.app_backend.pipeline",
+    "src.Test_red.app_backend.viz_utils",
+    "src.Test_red.app_backend.insight_engine",
+    "src.Test_red.app_backend.ingest",
+)
+# Dependencies the headless backend should only load on first use
+HEAVY = ("streamlit", "plotly", "google.generativeai", "requests", "pandas", "duckdb")
+
+_PROBE = """
+import sys, json, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(module: str, repeats: int = DEFAULT_REPEATS) -> dict:
+    """Median and min wall time of `import module` over `repeats` fresh interpreters, plus the heavy deps it loaded."""
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY)],
+                             capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    times = [run["seconds"] for run in runs]
+    return {
+        "seconds_median": round(statistics.median(times), 4),
+        "seconds_min": round(min(times), 4),
+        "loaded": runs[-1]["loaded"],
+    }
+
+
+def slowest_imports(module: str, top: int) -> List[tuple]:
+    """The `top` imports with the largest cumulative time (µs) under `python -X importtime`."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=list(MODULES))
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--top", type=int, default=0, help="also list each module's N slowest imports")
+    parser.add_argument("--output", default="import_times.json")
+    args = parser.parse_args(argv)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeats": args.repeats,
+        "modules": {},
+    }
+    for module in args.modules:
+        result = time_import(module, args.repeats)
+        report["modules"][module] = result
+        print(f"{module:<45} {result['seconds_median']:>7.3f}s  loads: {', '.join(result['loaded']) or '-'}",
+              flush=True)
+        if args.top:
+            for micros, name in slowest_imports(module, args.top):
+                print(f"    {micros / 1e6:>7.3f}s  {name}")
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# File: benchmarks/loadtest.py
+"""
+Replays concurrent analyst sessions through the backend against a mock (or real) LLM endpoint.
+
+    python -m benchmarks.loadtest --sessions 20 --questions 3 --rows 50000 --output loadtest.json
+    python -m benchmarks.loadtest --server http://127.0.0.1:8765 --stream
+"""
+
+import os
+import io
+import json
+import time
+import argparse
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .datagen import generate_marketing_data
+from .mock_llm import MockLLMServer, MockSettings
+
+# ────────────────────────────────────────────────────────────────────────────────
+# LOAD TEST SETTINGS
+# ────────────────────────────────────────────────────────────────────────────────
+STAGES      = ("upload", "clean", "profile", "analysis", "polish", "sql", "sql_execute", "question", "session")
+PERCENTILES = (50, 95, 99)
+QUESTIONS = (
+    "Which month had the best ROAS?",
+    "Compare spend and revenue by channel",
+    "Why did clicks drop in March?",
+    "Which campaigns should get more budget?",
+)
+
+
+def _point_backend_at(url: str, trace_log: str) -> None:
+    """The backend reads its endpoints, keys and log targets at import time, so this runs before importing it."""
+    os.environ["TOGETHER_API_URL"] = f"{url}/v1/chat/completions"
+    os.environ["GEMINI_API_ENDPOINT"] = url
+    os.environ["GROWIFY_TRACE_LOG"] = trace_log
+    os.environ.setdefault("TOGETHER_API_KEY", "loadtest")
+    os.environ.setdefault("GEMINI_API_KEY", "loadtest")
+
+
+@dataclass
+class SessionLog:
+    """Stage timings of one replayed session (seconds, one entry per occurrence)."""
+    timings: Dict[str, List[float]] = field(default_factory=dict)
+    first_token: Dict[str, List[float]] = field(default_factory=dict)
+    errors: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.timings.setdefault(stage, []).append(seconds)
+
+    def fail(self, stage: str) -> None:
+        self.errors[stage] = self.errors.get(stage, 0) + 1
+
+
+def _failed(result) -> bool:
+    # The API clients report failures as text instead of raising
+    return isinstance(result, str) and result.startswith("Error")
+
+
+def run_session(session_id: int, csv_bytes: bytes, questions: List[str], stream: bool) -> SessionLog:
+    """upload → clean → profile, then analysis/polish/SQL (and SQL execution) for every question."""
+    import duckdb
+    from src.Test_red.app_backend.analysis_utils import _clean_and_prepare_data
+    from src.Test_red.app_backend.data_utils import detect_column_types
+    from src.Test_red.app_backend.ingest import create_table_from_frame, normalize_column_names, read_uploaded_file
+    from src.Test_red.app_backend.pipeline import run_question_pipeline, stream_question_pipeline
+    from src.Test_red.app_backend.profile_utils import profile_dataframe
+    from src.Test_red.app_backend.sql_utils import guarded_execute, restrict_connection
+
+    log = SessionLog()
+    session_start = time.perf_counter()
+
+    started = time.perf_counter()
+    raw = normalize_column_names(read_uploaded_file(csv_bytes, f"session_{session_id}.csv"))
+    log.record("upload", time.perf_counter() - started)
+
+    started = time.perf_counter()
+    df = _clean_and_prepare_data(raw)
+    log.record("clean", time.perf_counter() - started)
+
+    started = time.perf_counter()
+    profile = profile_dataframe(df)
+    column_analysis = detect_column_types(df, profile)
+    log.record("profile", time.perf_counter() - started)
+
+    conn = duckdb.connect()
+    create_table_from_frame(conn, df)
+    restrict_connection(conn)  # as the app's workspaces
+    summary_text = f"The dataset has {len(df)} rows and columns like {', '.join(df.columns[:5])}."
+    try:
+        for question in questions:
+            question_start = time.perf_counter()
+            sql = None
+            if stream:
+                first_seen = set()
+                for event in stream_question_pipeline(df, question, summary_text, column_analysis, profile):
+                    if event.kind == "token":
+                        if event.stage not in first_seen:
+                            first_seen.add(event.stage)
+                            log.first_token.setdefault(event.stage, []).append(event.seconds)
+                    elif event.kind == "error" or _failed(event.text):
+                        log.fail(event.stage)
+                    else:
+                        log.record(event.stage, event.seconds)
+                        sql = event.text if event.stage == "sql" else sql
+            else:
+                for stage in run_question_pipeline(df, question, summary_text, column_analysis, profile):
+                    if stage.error is not None or _failed(stage.result):
+                        log.fail(stage.name)
+                    else:
+                        log.record(stage.name, stage.seconds)
+                        sql = stage.result if stage.name == "sql" else sql
+            if sql:
+                started = time.perf_counter()
+                try:
+                    guarded_execute(conn, sql)
+                    log.record("sql_execute", time.perf_counter() - started)
+                except Exception:
+                    log.fail("sql_execute")
+            log.record("question", time.perf_counter() - question_start)
+    finally:
+        conn.close()
+    log.record("session", time.perf_counter() - session_start)
+    return log
+
+
+def summarize(logs: List[SessionLog], wall_seconds: float) -> dict:
+    """p50/p95/p99 per stage (and per stage's first token when streaming) plus overall throughput."""
+    def percentiles(values: List[float]) -> dict:
+        array = np.asarray(values)
+        stats = {f"p{p}": round(float(np.percentile(array, p)), 4) for p in PERCENTILES}
+        stats.update({"max": round(float(array.max()), 4), "count": len(values)})
+        return stats
+
+    stages, first_tokens, errors = {}, {}, {}
+    for stage in STAGES:
+        values = [t for log in logs for t in log.timings.get(stage, [])]
+        if values:
+            stages[stage] = percentiles(values)
+        firsts = [t for log in logs for t in log.first_token.get(stage, [])]
+        if firsts:
+            first_tokens[stage] = percentiles(firsts)
+        failed = sum(log.errors.get(stage, 0) for log in logs)
+        if failed:
+            errors[stage] = failed
+    completed = sum(len(log.timings.get("question", [])) for log in logs)
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "sessions": len(logs),
+        "questions": completed,
+        "throughput": {
+            "questions_per_second": round(completed / wall_seconds, 3) if wall_seconds else 0.0,
+            "sessions_per_minute": round(60 * len(logs) / wall_seconds, 2) if wall_seconds else 0.0,
+        },
+        "stages": stages,
+        "first_token": first_tokens,
+        "errors": errors,
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"\n{report['sessions']} sessions, {report['questions']} questions in {report['wall_seconds']:.1f}s "
+          f"({report['throughput']['questions_per_second']:.2f} questions/s, "
+          f"{report['throughput']['sessions_per_minute']:.1f} sessions/min)")
+    print(f"{'stage':<18}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'count':>7}{'errors':>8}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<18}{stats['p50']:>8.2f}s{stats['p95']:>8.2f}s{stats['p99']:>8.2f}s{stats['max']:>8.2f}s"
+              f"{stats['count']:>7}{report['errors'].get(stage, 0):>8}")
+    for stage, stats in report["first_token"].items():
+        print(f"{stage + ' 1st token':<18}{stats['p50']:>8.2f}s{stats['p95']:>8.2f}s{stats['p99']:>8.2f}s"
+              f"{stats['max']:>8.2f}s{stats['count']:>7}")
+
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent analyst sessions")
+    parser.add_argument("--questions", type=int, default=2, help="questions asked per session")
+    parser.add_argument("--rows", type=int, default=20_000, help="rows per uploaded dataset")
+    parser.add_argument("--extra-metrics", type=int, default=4)
+    parser.add_argument("--same-upload", action="store_true", help="every session uploads the same file")
+    parser.add_argument("--stream", action="store_true", help="use the streaming pipeline (records first-token latency)")
+    parser.add_argument("--server", help="existing LLM endpoint base URL; default: start the mock in-process")
+    defaults = MockSettings()
+    parser.add_argument("--latency", type=float, default=defaults.latency)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--max-tokens", type=int, default=defaults.max_tokens)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="loadtest_results.json")
+    parser.add_argument("--trace-log", default="loadtest_trace.jsonl", help="JSON span log of every session")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.server is None:
+        server = MockLLMServer(MockSettings(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                                            max_tokens=args.max_tokens, error_rate=args.error_rate, seed=args.seed))
+        server.__enter__()
+    _point_backend_at(args.server or server.url, args.trace_log)
+    # Every session must reach the server, not the shared response cache
+    from src.Test_red.app_backend.llm_cache import llm_cache_bypass
+
+    print(f"Generating {args.sessions if not args.same_upload else 1} upload(s) of {args.rows:,} rows", flush=True)
+    uploads = {}
+    for i in range(1 if args.same_upload else args.sessions):
+        buffer = io.StringIO()
+        generate_marketing_data(args.rows, args.seed + i, args.extra_metrics).to_csv(buffer, index=False)
+        uploads[i] = buffer.getvalue().encode("utf-8")
+
+    questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.questions)]
+    logs: List[SessionLog] = []
+    lock = threading.Lock()
+
+    def session(i: int) -> None:
+        log = run_session(i, uploads[0 if args.same_upload else i], questions, args.stream)
+        with lock:
+            logs.append(log)
+
+    print(f"Replaying {args.sessions} sessions × {args.questions} questions", flush=True)
+    try:
+        with llm_cache_bypass():
+            context = contextvars.copy_context()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+                for future in [pool.submit(context.copy().run, session, i) for i in range(args.sessions)]:
+                    future.result()
+            wall = time.perf_counter() - started
+    finally:
+        if server is not None:
+            server.__exit__(None, None, None)
+
+    report = summarize(logs, wall)
+    report.update({
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "trace_log")},
+        "server": server.stats() if server is not None else None,
+    })
+    print_report(report)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
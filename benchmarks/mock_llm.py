@@ -0,0 +1,253 @@
+# File: benchmarks/mock_llm.py
+"""
+Local stand-in for the Together and Gemini APIs, for load tests without API keys or costs.
+
+    python -m benchmarks.mock_llm --port 8765 --latency 0.8 --tokens-per-second 60 --error-rate 0.02
+
+Point the app at it with:
+    TOGETHER_API_URL=http://127.0.0.1:8765/v1/chat/completions
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8765
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from dataclasses import dataclass, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List, Optional
+
+# ────────────────────────────────────────────────────────────────────────────────
+# MOCK SETTINGS
+# ────────────────────────────────────────────────────────────────────────────────
+DEFAULT_PORT = 8765
+GEMINI_PATH = re.compile(r"^/v1(?:beta)?/models/(?P<model>[^:/]+):(?P<method>generateContent|streamGenerateContent)")
+
+# Mirrors the section headings the analysis prompt asks for, one per line, so an opt-in
+# early-polish marker triggers as in production
+ANALYSIS_REPLY = "\n".join(
+    f"Step {i}: {heading}. Spend rose while ROAS held steady across the strongest channels, "
+    f"and the weakest campaigns lagged on conversion rate."
+    for i, heading in enumerate(
+        ["Data overview", "Key metrics", "Trends", "Segments", "Anomalies", "Drivers", "Recommendations", "Next steps"],
+        start=1,
+    )
+)
+POLISH_REPLY = ("Overall performance improved: spend grew, returns held steady and two campaigns drove "
+                "most conversions. Shift budget toward them and fix the laggards' landing pages. ") * 4
+SQL_REPLY = "SELECT COUNT(*) AS row_count FROM marketing_data"
+
+
+@dataclass
+class MockSettings:
+    """Behaviour of the mock: time to first byte, streaming speed, reply length and injected failures."""
+    latency: float = 0.5                 # seconds before the first byte
+    jitter: float = 0.2                  # ± uniform share of `latency`
+    tokens_per_second: float = 50.0      # streaming and non-streaming alike (0 = instant)
+    max_tokens: int = 300                # words per reply, capped by the request's max_tokens
+    error_rate: float = 0.0              # share of requests answered with `error_status`
+    error_status: int = 503
+    seed: Optional[int] = None
+
+
+def _reply_for(prompt: str) -> str:
+    if "Generate a SQL query" in prompt:
+        return SQL_REPLY
+    if "polish" in prompt.lower() or "rewrite" in prompt.lower():
+        return POLISH_REPLY
+    return ANALYSIS_REPLY
+
+
+def _words(text: str, limit: int) -> List[str]:
+    words = text.split(" ")[:max(1, limit)]
+    return [w + " " for w in words[:-1]] + words[-1:]
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, so the pooled clients behave as against the real APIs
+    server: "MockLLMServer"
+
+    def log_message(self, format, *args) -> None:  # one line per request is too noisy under load
+        pass
+
+    # ── transport helpers ──────────────────────────────────────────────────────
+    def _send_json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunks(self, content_type: str, chunks: Iterator[bytes]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _paced(self, words: List[str]) -> Iterator[str]:
+        delay = 1.0 / self.server.settings.tokens_per_second if self.server.settings.tokens_per_second > 0 else 0.0
+        for word in words:
+            if delay:
+                time.sleep(delay)
+            yield word
+
+    # ── request handling ───────────────────────────────────────────────────────
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") == "/stats":
+            self._send_json(200, self.server.stats())
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Request body is not JSON"}})
+            return
+
+        path = self.path.split("?", 1)[0]
+        gemini = GEMINI_PATH.match(path)
+        if path.endswith("/chat/completions"):
+            route = "together_stream" if body.get("stream") else "together"
+        elif gemini:
+            route = "gemini_stream" if gemini.group("method") == "streamGenerateContent" else "gemini"
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {path}"}})
+            return
+
+        self.server.wait_first_byte()
+        if self.server.inject_error(route):
+            status = self.server.settings.error_status
+            self._send_json(status, {"error": {"code": status, "message": "Injected failure", "status": "UNAVAILABLE"}})
+            return
+
+        if route.startswith("together"):
+            prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+            limit = min(self.server.settings.max_tokens, int(body.get("max_tokens") or self.server.settings.max_tokens))
+            words = _words(_reply_for(prompt), limit)
+            if route == "together_stream":
+                self._together_stream(words)
+            else:
+                self._send_json(200, {
+                    "id": "mock", "object": "chat.completion", "model": body.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(self._paced(words))},
+                                 "finish_reason": "stop"}],
+                })
+        else:
+            prompt = "".join(part.get("text", "") for content in body.get("contents", [])
+                             for part in content.get("parts", []))
+            words = _words(_reply_for(prompt), self.server.settings.max_tokens)
+            if route == "gemini_stream":
+                self._gemini_stream(words)
+            else:
+                self._send_json(200, self._gemini_response("".join(self._paced(words))))
+
+    def _together_stream(self, words: List[str]) -> None:
+        def frames() -> Iterator[bytes]:
+            for word in self._paced(words):
+                delta = {"choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+                yield f"data: {json.dumps(delta)}\n\n".encode("utf-8")
+            yield b"data: [DONE]\n\n"
+        self._send_chunks("text/event-stream", frames())
+
+    @staticmethod
+    def _gemini_response(text: str) -> dict:
+        return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]},
+                                "finish_reason": "STOP", "index": 0}]}
+
+    def _gemini_stream(self, words: List[str]) -> None:
+        # REST streaming without alt=sse is one JSON array, sent element by element
+        def elements() -> Iterator[bytes]:
+            for i, word in enumerate(self._paced(words)):
+                yield (("[" if i == 0 else ",\r\n") + json.dumps(self._gemini_response(word))).encode("utf-8")
+            yield b"]" if words else b"[]"
+        self._send_chunks("application/json", elements())
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """Threaded mock server with request/error counters; usable as a context manager running in the background."""
+    daemon_threads = True
+
+    def __init__(self, settings: Optional[MockSettings] = None, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), MockLLMHandler)
+        self.settings = settings or MockSettings()
+        self.requests = {}
+        self.errors = {}
+        self._random = random.Random(self.settings.seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def wait_first_byte(self) -> None:
+        with self._lock:
+            spread = self._random.uniform(-self.settings.jitter, self.settings.jitter)
+        time.sleep(max(0.0, self.settings.latency * (1 + spread)))
+
+    def inject_error(self, route: str) -> bool:
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            failed = self._random.random() < self.settings.error_rate
+            if failed:
+                self.errors[route] = self.errors.get(route, 0) + 1
+            return failed
+
+    def handle_error(self, request, client_address) -> None:
+        # Clients dropping idle keep-alive connections is normal, not worth a traceback
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": dict(self.requests), "errors": dict(self.errors), "settings": asdict(self.settings)}
+
+    def __enter__(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    defaults = MockSettings()
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="seconds to first byte")
+    parser.add_argument("--jitter", type=float, default=defaults.jitter)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--max-tokens", type=int, default=defaults.max_tokens)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--error-status", type=int, default=defaults.error_status)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    settings = MockSettings(args.latency, args.jitter, args.tokens_per_second, args.max_tokens,
+                            args.error_rate, args.error_status, args.seed)
+    server = MockLLMServer(settings, args.host, args.port)
+    print(f"Mock LLM server on {server.url} (Together: {server.url}/v1/chat/completions, Gemini: {server.url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# File: benchmarks/run_benchmarks.py
+"""
+Times the data hot paths on generated datasets and writes the results to JSON.
+
+    python -m benchmarks.run_benchmarks --rows 10000 100000 1000000 --output bench.json
+    python -m benchmarks.compare baseline.json bench.json
+"""
+
+import os
+import gc
+import json
+import time
+import argparse
+import platform
+import threading
+import statistics
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import duckdb
+import psutil
+
+from src.Test_red.app_backend.analysis_utils import (
+    _clean_and_prepare_data,
+    build_structured_analysis_prompt_full,
+    summarize_full_dataframe,
+)
+from src.Test_red.app_backend.compact_utils import compact_dataframe, compaction_report
+from src.Test_red.app_backend.data_utils import clean_numeric_data, detect_column_types
+from src.Test_red.app_backend.ingest import create_table_from_frame
+from src.Test_red.app_backend.prompt_utils import estimate_tokens
+from src.Test_red.app_backend.viz_utils import create_dynamic_visualizations
+
+from .datagen import load_or_generate
+
+# ────────────────────────────────────────────────────────────────────────────────
+# BENCHMARK SETTINGS
+# ────────────────────────────────────────────────────────────────────────────────
+DEFAULT_ROWS     = (10_000, 100_000, 1_000_000)
+DEFAULT_REPEATS  = 3
+RSS_SAMPLE_SECONDS = 0.005
+DATA_DIR         = os.getenv("GROWIFY_BENCH_DATA_DIR", os.path.join(os.path.dirname(__file__), ".data"))
+QUESTIONS = (
+    "Which month had the best ROAS?",
+    "Compare spend and revenue by channel over the last quarter",
+    "Why did clicks drop in March?",
+)
+
+
+class PeakRSS:
+    """Samples the process RSS on a background thread; `peak` is the highest value seen."""
+
+    def __init__(self, interval: float = RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.baseline = self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __enter__(self) -> "PeakRSS":
+        self.baseline = self.peak = self.process.memory_info().rss
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+
+def measure(fn: Callable[[], object], repeats: int) -> dict:
+    """Wall time of every run (after one untimed warm-up when repeats > 1) and the peak RSS over all of them."""
+    times = []
+    output = None
+    with PeakRSS() as rss:
+        if repeats > 1:
+            fn()
+        for _ in range(repeats):
+            gc.collect()
+            started = time.perf_counter()
+            output = fn()
+            times.append(time.perf_counter() - started)
+    return {
+        "seconds_min": round(min(times), 6),
+        "seconds_median": round(statistics.median(times), 6),
+        "seconds_all": [round(t, 6) for t in times],
+        "peak_rss_mb": round(rss.peak / 2**20, 1),
+        "rss_growth_mb": round((rss.peak - rss.baseline) / 2**20, 1),
+        "_output": output,
+    }
+
+
+def _register_in_duckdb(df) -> int:
+    conn = duckdb.connect()
+    try:
+        create_table_from_frame(conn, df, "marketing_data")
+        return conn.execute("SELECT COUNT(*) FROM marketing_data").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def run_dataset(rows: int, seed: int, extra_metrics: int, repeats: int, data_dir: Optional[str],
+                only: Optional[List[str]] = None) -> Dict[str, dict]:
+    """Runs every benchmark (or those in `only`) on one generated dataset."""
+    raw = load_or_generate(rows, seed, extra_metrics, data_dir)
+    clean = _clean_and_prepare_data(raw)
+    column_analysis = detect_column_types(clean)
+    full_summary = summarize_full_dataframe(clean)
+    summary_text = f"The dataset has {len(clean)} rows and columns like {', '.join(clean.columns[:5])}."
+
+    def build_prompts():
+        return [build_structured_analysis_prompt_full(q, full_summary, summary_text, column_analysis)
+                for q in QUESTIONS]
+
+    benchmarks = {
+        "clean_and_prepare_data": lambda: _clean_and_prepare_data(raw),
+        "clean_numeric_data": lambda: clean_numeric_data(raw),
+        "detect_column_types": lambda: detect_column_types(clean),
+        "summarize_full_dataframe": lambda: summarize_full_dataframe(clean),
+        "build_analysis_prompt": build_prompts,
+        "create_dynamic_visualizations": lambda: create_dynamic_visualizations(clean, column_analysis),
+        "duckdb_register": lambda: _register_in_duckdb(clean),
+        "compact_dataframe": lambda: compact_dataframe(clean, column_analysis),
+    }
+    results = {}
+    for name, fn in benchmarks.items():
+        if only and name not in only:
+            continue
+        result = measure(fn, repeats)
+        output = result.pop("_output")
+        if name == "build_analysis_prompt":
+            result["prompt_chars"] = [len(p) for p in output]
+            result["prompt_tokens"] = [estimate_tokens(p) for p in output]
+        elif name == "create_dynamic_visualizations":
+            result["figures"] = len(output)
+            result["figure_json_kb"] = round(sum(len(f.to_json()) for f in output) / 1024, 1)
+        elif name == "compact_dataframe":
+            report = compaction_report(output)
+            result["frame_mb_before"] = round(report.bytes_before / 2**20, 1)
+            result["frame_mb_after"] = round(report.bytes_after / 2**20, 1)
+        results[name] = result
+        print(f"  {name:<30} {result['seconds_median']:>9.3f}s  peak {result['peak_rss_mb']:>8.1f} MB", flush=True)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=list(DEFAULT_ROWS),
+                        help="dataset sizes to run (10k .. 10M rows)")
+    parser.add_argument("--extra-metrics", type=int, default=12, help="additional metric columns (wide datasets)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--only", nargs="+", help="benchmark names to run")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where generated datasets are kept ('' to disable)")
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args(argv)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {"seed": args.seed, "extra_metrics": args.extra_metrics, "repeats": args.repeats},
+        "datasets": {},
+    }
+    for rows in args.rows:
+        print(f"{rows:,} rows", flush=True)
+        report["datasets"][str(rows)] = run_dataset(rows, args.seed, args.extra_metrics, args.repeats,
+                                                    args.data_dir or None, args.only)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
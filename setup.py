@@ -24,7 +24,7 @@ setup(
     version='0.0.1',
     author='Naman',
     author_email='namankumar4499@gmail.com',
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
     install_requires=get_requirements('requirements.txt')
     
 )
\ No newline at end of file
@@ -1,4 +1,44 @@
 # src/Test_red/app_backend/__init__.py
 
 # Package: app_backend
-# (This file intentionally left nearly blank to declare the package.)
+# Headless analysis backend: importable without Streamlit (e.g. from batch jobs).
+# The names below resolve lazily on first access (PEP 562), so importing the
+# package costs nothing and `from src.Test_red.app_backend import load_dataset`
+# only loads the modules that name needs.
+import importlib
+
+_EXPORTS = {
+    "read_uploaded_file": "ingest",
+    "load_dataset": "ingest",
+    "append_dataset": "append_utils",
+    "create_table_from_frame": "ingest",
+    "detect_column_types": "data_utils",
+    "profile_dataframe": "profile_utils",
+    "summarize_full_dataframe": "analysis_utils",
+    "build_analysis_prompt": "analysis_utils",
+    "analyze_marketing_question": "analysis_utils",
+    "polish_with_gemini": "analysis_utils",
+    "build_sql_prompt": "sql_utils",
+    "guarded_execute": "sql_utils",
+    "run_question_pipeline": "pipeline",
+    "stream_question_pipeline": "pipeline",
+    "create_dynamic_visualizations": "viz_utils",
+    "answer_question": "insight_engine",
+    "missing_api_keys": "api_clients",
+    "set_error_handler": "api_clients",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,110 +1,149 @@
 # analysis_utils.py
 
 import json
+from typing import Dict, Iterator, Optional, Tuple
+
 import pandas as pd
 import numpy as np
-from .api_clients import call_together_ai, call_gemini # Assuming these are defined elsewhere and accessible
+from .api_clients import call_together_ai, call_gemini, stream_together_ai, stream_gemini # Assuming these are defined elsewhere and accessible
+from ..logger import logger
+from .data_utils import detect_column_types
+from .inference_utils import ColumnDecision, convert_dataframe
+from .profile_utils import DatasetProfile, profile_dataframe
+from .prompt_utils import ANALYSIS_PROMPT_TOKENS, estimate_tokens, pack_columns, rank_columns
+from .trace_utils import span
 
 def _clean_and_prepare_data(df: pd.DataFrame) -> pd.DataFrame:
     """
     Automatically clean and prepare a DataFrame for analysis.
-    - Converts object columns with comma-separated numbers to numeric.
+    - Converts object columns with comma/$/%-formatted numbers to numeric.
     - Converts object columns with date-like strings to datetime.
+    Types are decided from a sample and each column is converted once (see inference_utils).
     """
-    df_clean = df.copy()
-    for col in df_clean.columns:
-        if df_clean[col].dtype == 'object':
-            # Attempt to convert to numeric after removing commas
-            try:
-                series_no_commas = df_clean[col].str.replace(',', '', regex=False)
-                numeric_series = pd.to_numeric(series_no_commas, errors='coerce')
-                
-                if numeric_series.notna().mean() > 0.8: 
-                    df_clean[col] = numeric_series
-                    continue 
-            except AttributeError:
-                pass
-
-            try:
-                datetime_series = pd.to_datetime(df_clean[col], errors='coerce')
-                if datetime_series.notna().mean() > 0.8: 
-                    df_clean[col] = datetime_series
-            except (ValueError, TypeError):
-                pass
-                
-    return df_clean
+    return clean_with_decisions(df)[0]
 
-def summarize_full_dataframe(df: pd.DataFrame, max_categories: int = 5) -> dict:
+def clean_with_decisions(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, ColumnDecision]]:
+    """_clean_and_prepare_data plus the per-column decisions, so later rows can be cleaned the same way."""
+    with span("clean", rows=len(df), columns=len(df.columns)) as clean_span:
+        df_clean, decisions = convert_dataframe(df, numeric_threshold=0.8, parse_dates=True)
+        clean_span.set(converted=sum(1 for d in decisions.values() if d.kind != "keep"))
+    return df_clean, decisions
+
+def summarize_full_dataframe(
+    df: pd.DataFrame,
+    max_categories: int = 5,
+    profile: Optional[DatasetProfile] = None,
+) -> dict:
     """
     Compute essential summary statistics for all columns in a cleaned DataFrame.
     This is a significantly lighter version for prompt efficiency.
+    Pass a precomputed `profile` to avoid rescanning the data.
     """
+    if profile is None:
+        profile = profile_dataframe(df, max_categories=max_categories)
     summary = {}
-    n = len(df)
-    for col in df.columns:
-        col_data = df[col]
-        null_count = int(col_data.isnull().sum())
-        null_pct = (null_count / n * 100) if n > 0 else 0.0
+    for col, p in profile.columns.items():
         col_summary = {
-            "dtype": str(col_data.dtype),
-            "null_pct": round(null_pct, 2),
+            "dtype": p.dtype,
+            "null_pct": round(profile.null_percentage(col), 2),
         }
         
         # Numeric columns (only essential stats)
-        if pd.api.types.is_numeric_dtype(col_data):
-            ser = col_data.dropna()
-            if not ser.empty:
-                desc = ser.describe(percentiles=[0.25, 0.5, 0.75]).to_dict()
+        if p.kind == "numeric":
+            if p.count:
                 col_summary.update({
-                    "count": int(desc.get("count", 0)),
-                    "min": float(desc.get("min", 0)),
-                    "25%": float(desc.get("25%", 0)),
-                    "50%": float(desc.get("50%", 0)),
-                    "75%": float(desc.get("75%", 0)),
-                    "max": float(desc.get("max", 0)),
-                    "mean": float(desc.get("mean", 0)),
-                    "std": float(desc.get("std", 0)),
+                    "count": p.count,
+                    "min": p.min,
+                    "25%": p.q25,
+                    "50%": p.median,
+                    "75%": p.q75,
+                    "max": p.max,
+                    "mean": p.mean,
+                    "std": p.std,
                 })
             else:
                 col_summary["note"] = "no non-null numeric values"
 
         # Datetime columns (only essential stats)
-        elif pd.api.types.is_datetime64_any_dtype(col_data):
-            ser = col_data.dropna()
-            if not ser.empty:
-                years = ser.dt.year.value_counts().sort_index().to_dict()
+        elif p.kind == "datetime":
+            if p.count:
                 col_summary.update({
-                    "min_date": str(ser.min()),
-                    "max_date": str(ser.max()),
-                    "year_counts_top": years, # Keep all years to avoid issues with top_n for small sets
+                    "min_date": p.min_date,
+                    "max_date": p.max_date,
+                    "year_counts_top": p.year_counts, # Keep all years to avoid issues with top_n for small sets
                 })
             else:
                 col_summary["note"] = "no valid datetime values"
                 
         # Categorical/text columns (only essential stats)
         else:
-            ser = col_data.astype("string").dropna()
-            unique_count = ser.nunique()
-            col_summary["unique_count"] = int(unique_count)
-            top = ser.value_counts().head(max_categories).to_dict()
-            col_summary["top_categories"] = {str(k): int(v) for k, v in top.items()}
-            if unique_count > max_categories:
-                col_summary["note"] = f"{unique_count - max_categories} more categories"
+            col_summary["unique_count"] = p.unique_count
+            col_summary["top_categories"] = dict(list(p.top_categories.items())[:max_categories])
+            if p.unique_count > max_categories:
+                col_summary["note"] = f"{p.unique_count - max_categories} more categories"
                 
         summary[col] = col_summary
     return summary
 
+def _compact_column_line(col: str, col_summary: dict, purpose: str) -> str:
+    """One-line description of a column for the low-relevance part of the prompt."""
+    line = f"{col}: {col_summary.get('dtype')}, {purpose}, {col_summary.get('null_pct')}% null"
+    if "min" in col_summary:
+        line += f", {col_summary['min']}..{col_summary['max']}"
+    elif "min_date" in col_summary:
+        line += f", {col_summary['min_date']}..{col_summary['max_date']}"
+    elif "unique_count" in col_summary:
+        line += f", {col_summary['unique_count']} unique"
+    return line
+
 def build_structured_analysis_prompt_full(
     question: str,
     full_summary: dict,
     summary_text: str,
+    column_analysis: Optional[dict] = None,
+    token_budget: int = ANALYSIS_PROMPT_TOKENS,
+    rollup_context: str = "",
 ) -> str:
     """
     Builds a very light prompt using essential summary statistics.
     Designed for maximum prompt efficiency while maintaining a structured analysis.
+    Columns are ranked by relevance to the question: the top ones get full stats,
+    the rest one-liners, so the prompt stays within `token_budget` tokens.
+    `rollup_context` (exact pre-aggregated figures, see rollup_utils) is always included;
+    its tokens are reserved before the columns are packed.
     """
+    column_analysis = column_analysis or {col: {} for col in full_summary}
+    purposes = {col: column_analysis.get(col, {}).get('likely_purpose', 'unknown') for col in full_summary}
+    rollup_section = ""
+    if rollup_context:
+        rollup_section = ("\nPre-aggregated figures computed over the FULL dataset (exact; use these numbers "
+                          "for period and segment comparisons):\n" + rollup_context.strip() + "\n")
+    overhead = estimate_tokens(_render_analysis_prompt(question, summary_text, "{}", "", rollup_section))
+    packed = pack_columns(
+        rank_columns(question, {col: {'likely_purpose': purposes[col]} for col in full_summary}),
+        full_text=lambda col: json.dumps({col: full_summary[col]}, separators=(',', ':'), default=str),
+        compact_text=lambda col: _compact_column_line(col, full_summary[col], purposes[col]) + "\n",
+        budget=max(0, token_budget - overhead),
+    )
+
     # Use compressed JSON
-    columns_section = json.dumps(full_summary, separators=(',', ':'))
+    columns_section = json.dumps({col: full_summary[col] for col in packed.full},
+                                 separators=(',', ':'), default=str)
+    other_section = ""
+    if packed.compact or packed.omitted:
+        other_section = "\nOther columns, less relevant to this question (name: dtype, purpose, null %, range):\n"
+        other_section += "\n".join(_compact_column_line(col, full_summary[col], purposes[col]) for col in packed.compact)
+        if packed.omitted:
+            other_section += f"\n({len(packed.omitted)} more columns omitted to fit the prompt budget)"
+    prompt = _render_analysis_prompt(question, summary_text, columns_section, other_section, rollup_section)
+    logger.info(
+        f"Analysis prompt: ~{estimate_tokens(prompt)} tokens "
+        f"({len(packed.full)} full, {len(packed.compact)} compact, {len(packed.omitted)} omitted columns)"
+    )
+    return prompt
+
+def _render_analysis_prompt(question: str, summary_text: str, columns_section: str, other_section: str,
+                            rollup_section: str = "") -> str:
     summary_one_line = summary_text.strip().replace("\n", " ")
     
     prompt = f"""
@@ -116,7 +155,7 @@ High-level dataset summary (for quick context): {summary_one_line}
 
 Full-column summary with key statistics (use this to understand data types, ranges, and basic distributions. Perform all calculations and reasoning based on these statistics):
 {columns_section}
-
+{other_section}{rollup_section}
 Please analyze the question step by step following these phases:
 1. UNDERSTAND & DECOMPOSE:
     - Restate intent, identify key metrics, filters, timeframes, segments.
@@ -154,26 +193,60 @@ Return the full detailed reasoning, including code snippets, ending with the emo
 """
     return prompt
 
+def build_analysis_prompt(
+    df: pd.DataFrame,
+    question: str,
+    summary_text: str,
+    profile: Optional[DatasetProfile] = None,
+    column_analysis: Optional[dict] = None,
+    rollup_context: str = "",
+) -> str:
+    """
+    Cleans the data, computes a full summary and builds the analysis prompt.
+    When the caller passes the dataset `profile`, the data is already cleaned and profiled.
+    """
+    if profile is None:
+        cleaned_df = _clean_and_prepare_data(df)
+        profile = profile_dataframe(cleaned_df)
+    if column_analysis is None:
+        column_analysis = detect_column_types(df, profile)
+    full_summary = summarize_full_dataframe(df, profile=profile)
+    return build_structured_analysis_prompt_full(question, full_summary, summary_text, column_analysis,
+                                                 rollup_context=rollup_context)
+
 def analyze_marketing_question(
     df: pd.DataFrame,
     question: str,
-    summary_text: str
+    summary_text: str,
+    profile: Optional[DatasetProfile] = None,
+    column_analysis: Optional[dict] = None,
+    rollup_context: str = "",
 ) -> str:
     """
     Main analysis function: Cleans the data, computes a full summary, 
     builds a prompt, and calls the analysis AI.
     """
-    cleaned_df = _clean_and_prepare_data(df)
-    full_summary = summarize_full_dataframe(cleaned_df)
-    prompt = build_structured_analysis_prompt_full(question, full_summary, summary_text)
+    prompt = build_analysis_prompt(df, question, summary_text, profile=profile, column_analysis=column_analysis,
+                                   rollup_context=rollup_context)
     return call_together_ai(prompt, max_tokens=1500) # Uncommented this line
     # return prompt # Commented out this line
 
-def polish_with_gemini(question: str, together_analysis: str, summary: str) -> str:
-    """
-    Takes the technical analysis and polishes it into an executive report using Gemini.
-    """
-    prompt = f"""
+def stream_marketing_question(
+    df: pd.DataFrame,
+    question: str,
+    summary_text: str,
+    profile: Optional[DatasetProfile] = None,
+    column_analysis: Optional[dict] = None,
+    rollup_context: str = "",
+) -> Iterator[str]:
+    """Same as analyze_marketing_question, but yields the analysis token by token."""
+    prompt = build_analysis_prompt(df, question, summary_text, profile=profile, column_analysis=column_analysis,
+                                   rollup_context=rollup_context)
+    return stream_together_ai(prompt, max_tokens=1500)
+
+def build_polish_prompt(question: str, together_analysis: str, summary: str) -> str:
+    """Prompt asking Gemini to turn the technical analysis into an executive report."""
+    return f"""
 You are a senior marketing consultant preparing a polished, executive-ready report. The user question: "{question}"
 
 Technical Analysis (detailed step-by-step with code) from Together AI:
@@ -209,5 +282,16 @@ Please transform into a clean report with sections labeled as below, using emoji
 
 Ensure a professional, concise tone. Return only the markdown content of the report.
 """
+
+def polish_with_gemini(question: str, together_analysis: str, summary: str) -> str:
+    """
+    Takes the technical analysis and polishes it into an executive report using Gemini.
+    """
+    prompt = build_polish_prompt(question, together_analysis, summary)
     return call_gemini(prompt) # Uncommented this line
     # return prompt # Commented out this line
+
+def stream_polish_with_gemini(question: str, together_analysis: str, summary: str) -> Iterator[str]:
+    """Same as polish_with_gemini, but yields the report as Gemini writes it."""
+    prompt = build_polish_prompt(question, together_analysis, summary)
+    return stream_gemini(prompt)
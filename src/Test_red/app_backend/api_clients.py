@@ -1,11 +1,19 @@
 # File: src/Test_red/app_backend/api_client.py
 
 import os
-import requests
+import time
+import contextvars
 import json
-import streamlit as st
+import threading
+from typing import Callable, Iterator, List
 from dotenv import load_dotenv
-import google.generativeai as genai
+
+from ..exception import CircuitOpenError, ConfigurationError, ModelAPIError
+from ..logger import logger
+from .http_client import get_http_client
+from .llm_cache import LLMResponseCache, get_llm_cache, is_cache_bypassed
+from .prompt_utils import estimate_tokens
+from .trace_utils import span
 
 # ────────────────────────────────────────────────────────────────────────────────
 # 1) LOAD ENV VARS AND STRIP WHITESPACE
@@ -14,75 +22,297 @@ load_dotenv()
 
 TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
 GEMINI_API_KEY   = os.getenv("GEMINI_API_KEY")
+# GEMINI_API_ENDPOINT points the SDK at another host over REST (e.g. the load-test mock server)
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
 
 
 # ────────────────────────────────────────────────────────────────────────────────
-# 2) VALIDATE PRESENCE OF BOTH KEYS
+# 2) VALIDATE KEYS ON DEMAND (the UI checks them up front, batch jobs on first call)
 # ────────────────────────────────────────────────────────────────────────────────
-if not TOGETHER_API_KEY:
-    st.error("❌ Missing or empty TOGETHER_API_KEY in environment variables")
-    st.stop()
+def missing_api_keys() -> List[str]:
+    """Names of the required API keys that are missing or empty."""
+    return [name for name, value in (("TOGETHER_API_KEY", TOGETHER_API_KEY), ("GEMINI_API_KEY", GEMINI_API_KEY))
+            if not value]
+
+
+def _require_key(name: str, value) -> str:
+    if not value:
+        raise ConfigurationError(f"Missing or empty {name} in environment variables")
+    return value
+
+
+# Where provider errors are reported, per context so concurrent sessions keep their own;
+# the Streamlit app collects them for its script run, batch jobs keep the log
+_error_handler: contextvars.ContextVar[Callable[[str], None]] = contextvars.ContextVar(
+    "api_error_handler", default=logger.error)
+
+
+def set_error_handler(handler: Callable[[str], None]) -> None:
+    """Routes API error messages to `handler` instead of the log, for the current thread/context."""
+    _error_handler.set(handler)
+
+
+def _report_error(message: str) -> None:
+    _error_handler.get()(message)
 
-if not GEMINI_API_KEY:
-    st.error("❌ Missing or empty GEMINI_API_KEY in environment variables")
-    st.stop()
 
 # ────────────────────────────────────────────────────────────────────────────────
-# 3) CONFIGURE GEMINI (do this once)
+# 3) CONFIGURE GEMINI (once, on first use: the SDK alone takes about a second to import)
 # ────────────────────────────────────────────────────────────────────────────────
-genai.configure(api_key=GEMINI_API_KEY)
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def _gemini_model():
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            api_key = _require_key("GEMINI_API_KEY", GEMINI_API_KEY)
+            import google.generativeai as genai
+            if GEMINI_API_ENDPOINT:
+                genai.configure(api_key=api_key, transport="rest",
+                                client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+            else:
+                genai.configure(api_key=api_key)
+            _genai = genai
+    return _genai.GenerativeModel(GEMINI_MODEL)
 
 # ────────────────────────────────────────────────────────────────────────────────
 # 4) DEFINE TOGETHER ENDPOINT & MODEL
 # ────────────────────────────────────────────────────────────────────────────────
 MODEL_NAME       = "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free"
-TOGETHER_API_URL = "https://api.together.xyz/v1/chat/completions"
+TOGETHER_API_URL = os.getenv("TOGETHER_API_URL", "https://api.together.xyz/v1/chat/completions")
+GEMINI_MODEL     = "gemini-2.0-flash-exp"
+
+
+def _usage_tokens(span, prompt: str, completion: str, prompt_tokens=None, completion_tokens=None) -> None:
+    """Records token counts on the LLM span: the provider's usage figures, else our estimate."""
+    span.set(prompt_tokens=prompt_tokens if prompt_tokens is not None else estimate_tokens(prompt),
+             completion_tokens=completion_tokens if completion_tokens is not None else estimate_tokens(completion))
 
 
 def call_together_ai(prompt: str, max_tokens: int = 512, temperature: float = 0.1) -> str:
     """
     Sends a POST to Together’s chat/completions endpoint with the given prompt.
     Returns the assistant’s reply, or an error message if something goes wrong.
+    Successful replies are served from the response cache on repeat calls.
     """
-    headers = {
-        "Authorization": f"Bearer {TOGETHER_API_KEY}",
-        "Content-Type":  "application/json"
-    }
-    payload = {
-        "model":       MODEL_NAME,
-        "messages":   [{"role": "user", "content": prompt}],
-        "max_tokens":  max_tokens,
-        "temperature": temperature
-    }
-
-    try:
-        response = requests.post(TOGETHER_API_URL, headers=headers, json=payload)
-        response.raise_for_status()
-        result = response.json()
-        # The “choices” array always exists on a successful call
-        return result["choices"][0]["message"]["content"].strip()
-    except requests.exceptions.HTTPError as http_err:
-        # If Together returns a JSON error, show it in Streamlit
+    with span("llm", provider="together", model=MODEL_NAME, stream=False) as llm_span:
+        cache_key = LLMResponseCache.make_key(MODEL_NAME, prompt, max_tokens, temperature)
+        if not is_cache_bypassed():
+            cached = get_llm_cache().get(cache_key)
+            if cached is not None:
+                llm_span.set(cached=True)
+                return cached
+
+        headers = {
+            "Authorization": f"Bearer {_require_key('TOGETHER_API_KEY', TOGETHER_API_KEY)}",
+            "Content-Type":  "application/json"
+        }
+        payload = {
+            "model":       MODEL_NAME,
+            "messages":   [{"role": "user", "content": prompt}],
+            "max_tokens":  max_tokens,
+            "temperature": temperature
+        }
+
+        import requests
         try:
-            error_json = response.json()
-            st.error(f"Together AI API error {response.status_code}: {error_json}")
-        except Exception:
-            st.error(f"Together AI HTTP error: {http_err}")
-        return "Error generating response"
-    except Exception as e:
-        st.error(f"Together AI unexpected error: {e}")
-        return "Error generating response"
+            # Pooled keep-alive session with timeouts, backoff on 429/5xx and a circuit breaker
+            response = get_http_client("together").post(TOGETHER_API_URL, headers, payload)
+            response.raise_for_status()
+            result = response.json()
+            # The “choices” array always exists on a successful call
+            content = result["choices"][0]["message"]["content"].strip()
+            usage = result.get("usage") or {}
+            _usage_tokens(llm_span, prompt, content, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+            if not is_cache_bypassed():
+                get_llm_cache().put(cache_key, MODEL_NAME, content)
+            return content
+        except requests.exceptions.HTTPError as http_err:
+            llm_span.status = "error"
+            llm_span.set(http_status=response.status_code)
+            # If Together returns a JSON error, report it
+            try:
+                error_json = response.json()
+                _report_error(f"Together AI API error {response.status_code}: {error_json}")
+            except Exception:
+                _report_error(f"Together AI HTTP error: {http_err}")
+            return "Error generating response"
+        except CircuitOpenError as e:
+            llm_span.status = "error"
+            llm_span.set(error="circuit open")
+            _report_error(f"Together AI is unavailable right now: {e}")
+            return "Error generating response"
+        except Exception as e:
+            llm_span.status = "error"
+            llm_span.set(error=f"{type(e).__name__}: {e}"[:300])
+            _report_error(f"Together AI unexpected error: {e}")
+            return "Error generating response"
 
 
 def call_gemini(prompt: str) -> str:
     """
     Sends the given prompt to Gemini (gemini-2.0-flash-exp) for polishing.
     Returns Gemini’s reply text, or an error message if it fails.
+    Successful replies are served from the response cache on repeat calls.
     """
-    try:
-        model = genai.GenerativeModel("gemini-2.0-flash-exp")
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        st.error(f"Gemini API error: {e}")
-        return "Error generating polished response"
\ No newline at end of file
+    with span("llm", provider="gemini", model=GEMINI_MODEL, stream=False) as llm_span:
+        cache_key = LLMResponseCache.make_key(GEMINI_MODEL, prompt)
+        if not is_cache_bypassed():
+            cached = get_llm_cache().get(cache_key)
+            if cached is not None:
+                llm_span.set(cached=True)
+                return cached
+
+        try:
+            model = _gemini_model()
+            response = model.generate_content(prompt)
+            usage = getattr(response, "usage_metadata", None)
+            _usage_tokens(llm_span, prompt, response.text, getattr(usage, "prompt_token_count", None),
+                          getattr(usage, "candidates_token_count", None))
+            if not is_cache_bypassed():
+                get_llm_cache().put(cache_key, GEMINI_MODEL, response.text)
+            return response.text
+        except Exception as e:
+            llm_span.status = "error"
+            llm_span.set(error=f"{type(e).__name__}: {e}"[:300])
+            _report_error(f"Gemini API error: {e}")
+            return "Error generating polished response"
+
+
+def stream_together_ai(prompt: str, max_tokens: int = 512, temperature: float = 0.1) -> Iterator[str]:
+    """
+    Streaming variant of call_together_ai: yields text deltas as Together sends
+    them over server-sent events (`stream: true`). Shares the response cache with
+    call_together_ai; a cached reply is yielded as a single chunk. Failures before
+    the first delta yield the usual error text; once text has been yielded they
+    raise ModelAPIError, so partial replies are never taken for complete ones.
+    """
+    with span("llm", provider="together", model=MODEL_NAME, stream=True) as llm_span:
+        cache_key = LLMResponseCache.make_key(MODEL_NAME, prompt, max_tokens, temperature)
+        if not is_cache_bypassed():
+            cached = get_llm_cache().get(cache_key)
+            if cached is not None:
+                llm_span.set(cached=True)
+                yield cached
+                return
+
+        headers = {
+            "Authorization": f"Bearer {_require_key('TOGETHER_API_KEY', TOGETHER_API_KEY)}",
+            "Content-Type":  "application/json",
+            "Accept":        "text/event-stream"
+        }
+        payload = {
+            "model":       MODEL_NAME,
+            "messages":   [{"role": "user", "content": prompt}],
+            "max_tokens":  max_tokens,
+            "temperature": temperature,
+            "stream":      True
+        }
+
+        import requests
+        parts = []
+        usage = {}
+        complete = False   # set by `[DONE]` or a finish_reason; a stream cut short is never cached
+        started = time.perf_counter()
+        try:
+            response = get_http_client("together").post(TOGETHER_API_URL, headers, payload, stream=True)
+            with response:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    # SSE frames look like `data: {...}`; the stream ends with `data: [DONE]`
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        complete = True
+                        break
+                    frame = json.loads(data)
+                    usage = frame.get("usage") or usage
+                    choices = frame.get("choices") or [{}]
+                    complete = complete or bool(choices[0].get("finish_reason"))
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        if not parts:
+                            llm_span.set(first_token_seconds=round(time.perf_counter() - started, 4))
+                        parts.append(delta)
+                        yield delta
+        except requests.exceptions.HTTPError as http_err:
+            llm_span.status = "error"
+            llm_span.set(http_status=http_err.response.status_code if http_err.response is not None else None)
+            _report_error(f"Together AI HTTP error: {http_err}")
+            yield "Error generating response"
+            return
+        except CircuitOpenError as e:
+            llm_span.status = "error"
+            llm_span.set(error="circuit open")
+            _report_error(f"Together AI is unavailable right now: {e}")
+            yield "Error generating response"
+            return
+        except Exception as e:
+            llm_span.status = "error"
+            llm_span.set(error=f"{type(e).__name__}: {e}"[:300])
+            _report_error(f"Together AI unexpected error: {e}")
+            if parts:
+                raise ModelAPIError(f"Together AI stream failed after partial output: {e}") from e
+            yield "Error generating response"
+            return
+
+        if not complete:
+            llm_span.status = "error"
+            llm_span.set(error="stream ended before completion")
+            _report_error("Together AI stream ended before the response was complete")
+            if parts:
+                raise ModelAPIError("Together AI stream ended before the response was complete")
+            yield "Error generating response"
+            return
+
+        text = "".join(parts).strip()
+        _usage_tokens(llm_span, prompt, text, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        if not is_cache_bypassed():
+            get_llm_cache().put(cache_key, MODEL_NAME, text)
+
+
+def stream_gemini(prompt: str) -> Iterator[str]:
+    """
+    Streaming variant of call_gemini: yields text as Gemini generates it.
+    Shares the response cache with call_gemini. As with stream_together_ai,
+    a failure after the first chunk raises ModelAPIError.
+    """
+    with span("llm", provider="gemini", model=GEMINI_MODEL, stream=True) as llm_span:
+        cache_key = LLMResponseCache.make_key(GEMINI_MODEL, prompt)
+        if not is_cache_bypassed():
+            cached = get_llm_cache().get(cache_key)
+            if cached is not None:
+                llm_span.set(cached=True)
+                yield cached
+                return
+
+        parts = []
+        usage = None
+        started = time.perf_counter()
+        try:
+            model = _gemini_model()
+            for chunk in model.generate_content(prompt, stream=True):
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                text = chunk.text
+                if text:
+                    if not parts:
+                        llm_span.set(first_token_seconds=round(time.perf_counter() - started, 4))
+                    parts.append(text)
+                    yield text
+        except Exception as e:
+            llm_span.status = "error"
+            llm_span.set(error=f"{type(e).__name__}: {e}"[:300])
+            _report_error(f"Gemini API error: {e}")
+            if parts:
+                raise ModelAPIError(f"Gemini stream failed after partial output: {e}") from e
+            yield "Error generating polished response"
+            return
+
+        text = "".join(parts)
+        _usage_tokens(llm_span, prompt, text, getattr(usage, "prompt_token_count", None),
+                      getattr(usage, "candidates_token_count", None))
+        if not is_cache_bypassed():
+            get_llm_cache().put(cache_key, GEMINI_MODEL, text)
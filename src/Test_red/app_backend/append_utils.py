@@ -0,0 +1,242 @@
+# File: src/Test_red/app_backend/append_utils.py
+
+import os
+import json
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from ..exception import DataIngestionError
+from ..logger import logger
+from .cache_utils import hash_bytes
+from .compact_utils import append_compacted, compaction_report, logical_dtype, to_logical_dtypes
+from .excel_utils import SHEET_COLUMN
+from .ingest import (
+    MANIFEST_DIR, STREAM_CHUNK_ROWS, TABLE_NAME, DatasetManifest, cache_dataset, dataset_key,
+    get_cached_dataset, load_manifest, normalize_column_names, read_uploaded_file, save_manifest,
+)
+from .inference_utils import ColumnDecision, apply_column_decisions
+from .profile_utils import DatasetProfile, StreamingProfiler, remember_profile
+from .rollup_utils import column_types, refresh_rollups
+from .sql_utils import quote_identifier
+from .trace_utils import span
+from .workspace import get_workspace_manager
+
+# Share of a column's new non-null values allowed to fail conversion to its stored type
+# (the complement of the 0.8 parse rate cleaning requires)
+APPEND_MAX_FAILED = float(os.getenv("GROWIFY_APPEND_MAX_FAILED", "0.2"))
+
+
+@dataclass
+class AppendResult:
+    """A new dataset version: `base_key`'s rows followed by the cleaned `rows` of one appended file."""
+    version: str
+    base_key: str
+    df: pd.DataFrame
+    rows: pd.DataFrame
+    profile: DatasetProfile
+
+
+def _conform(series: pd.Series, dtype: str) -> pd.Series:
+    """A cleaned column of the new file in the stored dataset's dtype family."""
+    if str(series.dtype) == dtype:
+        return series
+    if dtype.startswith("datetime64"):
+        return pd.to_datetime(series, errors="coerce")
+    if dtype.startswith(("int", "uint", "float")):
+        # Integer columns with blanks in the new rows widen to float, as a full re-upload would
+        return pd.to_numeric(series, errors="coerce")
+    if dtype == "object" and series.dtype != object:
+        return series.where(series.isna(), series.astype(str)).astype(object)
+    return series
+
+
+def conform_rows(raw: pd.DataFrame, manifest: DatasetManifest, filename: str) -> pd.DataFrame:
+    """
+    Validates a new file's columns against the stored dataset and cleans its rows
+    with the stored decisions (no type inference). Raises DataIngestionError when
+    columns are missing or unexpected, or too many values no longer parse as their column's type.
+    """
+    missing = [col for col in manifest.columns if col not in raw.columns]
+    unexpected = [col for col in raw.columns if col not in manifest.columns]
+    if missing or unexpected:
+        details = []
+        if missing:
+            details.append(f"missing columns: {', '.join(missing)}")
+        if unexpected:
+            details.append(f"unexpected columns: {', '.join(map(str, unexpected))}")
+        raise DataIngestionError(f"{filename} does not match the dataset ({'; '.join(details)})")
+
+    raw = raw[list(manifest.columns)]
+    decisions = {col: ColumnDecision.from_dict(d) for col, d in manifest.decisions.items()}
+    rows = apply_column_decisions(raw, decisions)
+    for col, dtype in manifest.columns.items():
+        rows[col] = _conform(rows[col], dtype)
+        present = raw[col].notna()
+        failed = int((present & rows[col].isna()).sum())
+        if failed and failed > APPEND_MAX_FAILED * int(present.sum()):
+            raise DataIngestionError(
+                f"Column '{col}' of {filename} no longer matches its stored type ({dtype}): "
+                f"{failed:,} of {int(present.sum()):,} values do not convert"
+            )
+    return rows
+
+
+def check_new_periods(base_df: pd.DataFrame, rows: pd.DataFrame, manifest: DatasetManifest, filename: str) -> None:
+    """
+    Raises DataIngestionError when the new rows reach back into the stored data: on the
+    dataset's first datetime column they must all come after its latest stored value,
+    otherwise re-uploading an overlapping export would count those periods twice.
+    """
+    time_column = next((col for col, dtype in manifest.columns.items() if dtype.startswith("datetime64")), None)
+    if time_column is None or rows.empty:
+        return
+    stored_max = base_df[time_column].max()
+    if pd.isna(stored_max):
+        return
+    overlapping = int((rows[time_column] <= stored_max).sum())
+    if overlapping:
+        raise DataIngestionError(
+            f"{filename} overlaps the loaded data: {overlapping:,} of its {len(rows):,} rows have a {time_column} "
+            f"on or before {stored_max}, the latest one already loaded. Append only newer periods, "
+            f"or upload the combined file as a new dataset"
+        )
+
+
+def get_appended_dataset(key: str) -> Optional[pd.DataFrame]:
+    """
+    Cleaned frame of any dataset version: a cache lookup, or after a restart the
+    version's partitions read back from the ingestion cache and concatenated.
+    """
+    df = get_cached_dataset(key)
+    if df is not None:
+        return df
+    manifest = load_manifest(key)
+    if manifest is None or len(manifest.partitions) < 2:
+        return None
+    parts = [get_cached_dataset(partition) for partition in manifest.partitions]
+    if any(part is None for part in parts):
+        return None
+    df = parts[0]
+    for part in parts[1:]:
+        df = append_compacted(df, part) if compaction_report(df) else pd.concat([df, part], ignore_index=True)
+    cache_dataset(key, df, persist=False)
+    return df
+
+
+def _profile_state_path(key: str) -> str:
+    return os.path.join(MANIFEST_DIR, f"{key}.profile.json")
+
+
+def _json_value(value):
+    # Sample values of numpy types become Python numbers; timestamps and anything else strings
+    return value.item() if isinstance(value, (np.integer, np.floating, np.bool_)) else str(value)
+
+
+def _load_profile_state(key: str) -> Optional[StreamingProfiler]:
+    # Plain JSON (never pickle): the cache directory may be writable by other users
+    try:
+        with open(_profile_state_path(key)) as f:
+            return StreamingProfiler.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _profile_state(key: str, df: pd.DataFrame) -> StreamingProfiler:
+    """
+    Mergeable sketches of a version's profile, saved with each appended version.
+    For a dataset appended to for the first time they are seeded with one pass over its rows.
+    """
+    profiler = _load_profile_state(key)
+    if profiler is not None and profiler.n_rows == len(df):
+        return profiler
+    profiler = StreamingProfiler()
+    for start in range(0, len(df), STREAM_CHUNK_ROWS):
+        profiler.update(to_logical_dtypes(df.iloc[start:start + STREAM_CHUNK_ROWS]))
+    return profiler
+
+
+def _save_profile_state(key: str, profiler: StreamingProfiler) -> None:
+    path = _profile_state_path(key)
+    try:
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(profiler.to_dict(), f, default=_json_value)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        logger.warning(f"Could not save profile sketches for {key[:12]}: {e}")
+
+
+def append_dataset(base_key: str, data: bytes, filename: str) -> AppendResult:
+    """
+    Appends the rows of an uploaded file to a loaded dataset version, as a new version.
+    Only the new rows are parsed and cleaned (with the stored decisions); they are kept
+    as their own partition in the ingestion cache, and the profile is updated from
+    sketches instead of rescanning the history. Appending the same file to the same
+    version again only re-reads the new rows.
+    """
+    with span("append", bytes=len(data)) as append_span:
+        manifest = load_manifest(base_key)
+        base_df = get_appended_dataset(base_key)
+        if manifest is None or base_df is None:
+            raise DataIngestionError("The loaded dataset has no stored schema yet; upload the full file once more "
+                                     "before appending to it")
+        version = hash_bytes(base_key.encode("utf-8"), dataset_key(data, filename, manifest.settings))
+        partition = hash_bytes(version.encode("utf-8"), "partition")
+
+        raw = read_uploaded_file(data, filename, manifest.settings.get("excel_sheet"))
+        if manifest.settings.get("normalize_columns", True):
+            raw = normalize_column_names(raw)
+        if SHEET_COLUMN in manifest.columns and SHEET_COLUMN not in raw.columns:
+            raw[SHEET_COLUMN] = os.path.splitext(os.path.basename(filename))[0]  # a CSV appended to a sheet union
+        rows = conform_rows(raw, manifest, filename)
+        check_new_periods(base_df, rows, manifest, filename)
+        append_span.set(rows=len(rows), base_rows=len(base_df))
+
+        df = get_appended_dataset(version)
+        if df is None:
+            if compaction_report(base_df):
+                df = append_compacted(base_df, rows)
+            else:
+                df = pd.concat([base_df, rows], ignore_index=True)
+            cache_dataset(partition, rows)
+            cache_dataset(version, df, persist=False)
+
+        profiler = _load_profile_state(version)
+        if profiler is None or profiler.n_rows != len(df):
+            profiler = _profile_state(base_key, base_df)
+            profiler.update(rows)
+            _save_profile_state(version, profiler)
+        profile = profiler.snapshot()
+        for col, column_profile in profile.columns.items():
+            column_profile.dtype = logical_dtype(df[col].dtype)
+        remember_profile(version, profile)
+
+        save_manifest(DatasetManifest(
+            version, manifest.settings, {col: logical_dtype(dtype) for col, dtype in df.dtypes.items()},
+            manifest.decisions, len(df), manifest.partitions + [partition], manifest.sources + [filename],
+            base_key,
+        ))
+    return AppendResult(version, base_key, df, rows, profile)
+
+
+def extend_workspace(result: AppendResult, table: str = TABLE_NAME) -> bool:
+    """
+    Builds the new version's DuckDB workspace from the base version's: the new rows
+    are inserted into `table` and only the rollup periods they touch are recomputed.
+    False when the base workspace was never built (the caller then builds from the full frame).
+    """
+    def update(conn):
+        # Integer columns the new rows widened to float (blanks) become DOUBLE, as a fresh build would make them
+        types = column_types(conn, table)
+        for col in result.rows.columns:
+            if pd.api.types.is_float_dtype(result.rows[col]) and types.get(col, "").endswith("INT"):
+                conn.execute(f"ALTER TABLE {quote_identifier(table)} ALTER {quote_identifier(col)} TYPE DOUBLE")
+        conn.register("appended_rows", result.rows)
+        try:
+            conn.execute(f"INSERT INTO {quote_identifier(table)} BY NAME SELECT * FROM appended_rows")
+            refresh_rollups(conn, table, "appended_rows")
+        finally:
+            conn.unregister("appended_rows")
+    return get_workspace_manager().derive(result.version, result.base_key, update)
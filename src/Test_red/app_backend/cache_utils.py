@@ -0,0 +1,187 @@
+# File: src/Test_red/app_backend/cache_utils.py
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from ..logger import logger
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# ────────────────────────────────────────────────────────────────────────────────
+# CACHE LOCATION & LIMITS (overridable through environment variables)
+# ────────────────────────────────────────────────────────────────────────────────
+CACHE_DIR           = os.getenv("GROWIFY_CACHE_DIR", os.path.join(tempfile.gettempdir(), "growify_cache"))
+CACHE_MAX_MEMORY_MB = int(os.getenv("GROWIFY_CACHE_MAX_MEMORY_MB", "1024"))
+
+
+def hash_bytes(data: bytes, *parts) -> str:
+    """
+    Returns a stable SHA-256 hex digest of `data` plus any extra JSON-serializable parts
+    (file extension, cleaning settings, ...), so a change in any of them yields a new key.
+    """
+    return hash_chunks([data], *parts)
+
+
+def hash_chunks(chunks: Iterable[bytes], *parts) -> str:
+    """Same digest as hash_bytes, computed incrementally so large files never sit in memory."""
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def frame_nbytes(df: "pd.DataFrame") -> int:
+    """Deep memory footprint of a DataFrame in bytes."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class FrameCache:
+    """
+    Two-level DataFrame cache: an in-process LRU bounded by memory,
+    backed by Parquet files on local disk that survive process restarts.
+    With `max_disk_mb` set, the least recently used files are deleted once
+    the directory grows past that size.
+    """
+
+    def __init__(self, directory: str, max_memory_mb: int = CACHE_MAX_MEMORY_MB,
+                 max_disk_mb: Optional[int] = None):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self.max_disk_bytes = None if max_disk_mb is None else max_disk_mb * 1024 * 1024
+        self._entries = OrderedDict()  # key -> (df, nbytes)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def get(self, key: str) -> Optional["pd.DataFrame"]:
+        """Returns the cached frame for `key`, promoting disk entries into memory, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        path = self._path(key)
+        if os.path.exists(path):
+            import pandas as pd  # hashing and the LLM cache's settings don't need pandas
+            from .compact_utils import restore_arrow_strings
+            try:
+                df = restore_arrow_strings(pd.read_parquet(path))
+            except Exception as e:
+                logger.warning(f"Discarding unreadable cache file {path}: {e}")
+                self._remove_file(path)
+            else:
+                os.utime(path)
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, df)
+                return df
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, df: "pd.DataFrame", persist: bool = True) -> None:
+        """
+        Stores `df` in memory and writes it to disk as Parquet (best effort).
+        With persist=False the entry is memory-only, for frames cheaper to rebuild than to store.
+        """
+        self._remember(key, df)
+        if not persist:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            # Mixed-type object columns cannot always be written as Parquet;
+            # the in-memory entry still serves this process.
+            logger.warning(f"Could not persist cache entry {key[:12]} to disk: {e}")
+            self._remove_file(tmp_path)
+        else:
+            self._evict_disk()
+
+    def _disk_files(self) -> list:
+        """(mtime, size, path) of every cached Parquet file, least recently used first."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".parquet"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(files)
+
+    def _evict_disk(self) -> None:
+        if self.max_disk_bytes is None:
+            return
+        files = self._disk_files()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            self._remove_file(path)
+            total -= size
+
+    def drop_prefix(self, prefix: str) -> int:
+        """Removes every entry whose key starts with `prefix` from memory and disk; returns the count."""
+        with self._lock:
+            removed = {k for k in self._entries if k.startswith(prefix)}
+            for key in removed:
+                self._memory_bytes -= self._entries.pop(key)[1]
+        for _, _, path in self._disk_files():
+            name = os.path.basename(path)
+            if name.startswith(prefix):
+                self._remove_file(path)
+                removed.add(name[:-len(".parquet")])
+        return len(removed)
+
+    def _remember(self, key: str, df: "pd.DataFrame") -> None:
+        nbytes = frame_nbytes(df)
+        with self._lock:
+            if key in self._entries:
+                self._memory_bytes -= self._entries.pop(key)[1]
+            if nbytes > self.max_memory_bytes:
+                return
+            self._entries[key] = (df, nbytes)
+            self._memory_bytes += nbytes
+            while self._memory_bytes > self.max_memory_bytes and self._entries:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self._memory_bytes -= evicted_bytes
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current memory usage."""
+        disk_bytes = sum(size for _, size, _ in self._disk_files())
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memory_mb": round(self._memory_bytes / (1024 * 1024), 2),
+                "disk_mb": round(disk_bytes / (1024 * 1024), 2),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,177 @@
+# File: src/Test_red/app_backend/compact_utils.py
+
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .cache_utils import frame_nbytes
+from .trace_utils import span
+
+# ────────────────────────────────────────────────────────────────────────────────
+# COMPACTION SETTINGS (overridable through environment variables)
+# ────────────────────────────────────────────────────────────────────────────────
+COMPACT_DTYPES      = os.getenv("GROWIFY_COMPACT_DTYPES", "1") == "1"
+CATEGORY_MAX_RATIO  = float(os.getenv("GROWIFY_CATEGORY_MAX_RATIO", "0.5"))  # unique values / rows
+CATEGORY_MAX_UNIQUE = int(os.getenv("GROWIFY_CATEGORY_MAX_UNIQUE", "100000"))
+
+# Integers stop at 32 bits: narrower types wrap around in element-wise arithmetic (clicks * 100)
+INT32_RANGE  = (np.iinfo(np.int32).min, np.iinfo(np.int32).max)
+ARROW_STRING = pd.StringDtype("pyarrow_numpy")  # NaN for missing values, like object columns
+
+# Storage dtypes compaction produces, mapped back to the dtype the cleaned frame had (and its DuckDB type)
+_LOGICAL_DTYPES = {"float32": "float64", "int32": "int64", "category": "object", "string": "object"}
+DUCKDB_LOGICAL_TYPES = {"float32": "DOUBLE", "int32": "BIGINT", "category": "VARCHAR"}
+
+
+def logical_dtype(dtype) -> str:
+    """
+    Dtype name as the data was cleaned, independent of compact storage, so profiles,
+    prompts (and therefore LLM cache keys) are the same with and without compaction.
+    """
+    name = str(dtype)
+    return _LOGICAL_DTYPES.get(name, name)
+
+
+def to_logical_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    `df` with compact columns widened back to their cleaned dtypes, for pandas
+    computations (group sums, sorting) that must match the uncompacted results.
+    Meant for the few columns a computation selects, not whole frames.
+    """
+    widened = {col: logical_dtype(dtype) for col, dtype in df.dtypes.items() if logical_dtype(dtype) != str(dtype)}
+    return df.astype(widened) if widened else df
+
+
+@dataclass
+class CompactionReport:
+    """Memory of a frame before and after compaction, and what happened to each changed column."""
+    bytes_before: int
+    bytes_after: int
+    columns: Dict[str, str] = field(default_factory=dict)   # column -> "float64 → float32"
+
+    @property
+    def saved_ratio(self) -> float:
+        return 1 - self.bytes_after / self.bytes_before if self.bytes_before else 0.0
+
+    def describe(self) -> str:
+        return (f"{self.bytes_before / 2**20:,.1f} MB → {self.bytes_after / 2**20:,.1f} MB "
+                f"({self.saved_ratio:.0%} smaller, {len(self.columns)} columns compacted)")
+
+
+def _downcast_integer(series: pd.Series) -> pd.Series:
+    if series.dtype != np.int64 or series.empty:
+        return series
+    if INT32_RANGE[0] <= series.min() and series.max() <= INT32_RANGE[1]:
+        return series.astype(np.int32)
+    return series
+
+
+def _downcast_float(series: pd.Series) -> pd.Series:
+    # Only when every value survives the round trip, so sums and quantiles (taken in float64) don't move
+    if series.dtype != np.float64:
+        return series
+    narrow = series.astype(np.float32)
+    if np.array_equal(narrow.to_numpy(dtype=np.float64), series.to_numpy(), equal_nan=True):
+        return narrow
+    return series
+
+
+def _is_text(series: pd.Series) -> bool:
+    return series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) == "string"
+
+
+def _encode_text(series: pd.Series, unique_count: Optional[int]) -> pd.Series:
+    if not _is_text(series):
+        return series  # mixed-type columns keep their Python objects
+    if unique_count is None:
+        unique_count = series.nunique(dropna=True)
+    if unique_count <= min(CATEGORY_MAX_UNIQUE, len(series) * CATEGORY_MAX_RATIO):
+        # Categories in order of first appearance, so value_counts ties break as before
+        return series.astype(pd.CategoricalDtype(series.dropna().unique()))
+    return series.astype(ARROW_STRING)
+
+
+def compact_dataframe(df: pd.DataFrame, column_analysis: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Returns a copy of a cleaned frame in compact storage: integers that fit in
+    int32, floats that are exact in float32, low-cardinality text as categoricals
+    (the `unique_count` from detect_column_types decides) and other text as
+    Arrow-backed strings. Values are unchanged; the CompactionReport is kept in
+    `df.attrs["compaction"]` as a dict.
+    """
+    column_analysis = column_analysis or {}
+    with span("compact", rows=len(df), columns=len(df.columns)) as compact_span:
+        before = frame_nbytes(df)
+        compacted, changes = {}, {}
+        for col in df.columns:
+            series = df[col]
+            if pd.api.types.is_integer_dtype(series):
+                new = _downcast_integer(series)
+            elif pd.api.types.is_float_dtype(series):
+                new = _downcast_float(series)
+            else:
+                new = _encode_text(series, column_analysis.get(col, {}).get("unique_count"))
+            compacted[col] = new
+            if new.dtype != series.dtype:
+                changes[col] = f"{series.dtype} → {new.dtype}"
+        result = pd.DataFrame(compacted, index=df.index)
+        report = CompactionReport(before, frame_nbytes(result), changes)
+        result.attrs = {**df.attrs, "compaction": asdict(report)}
+        compact_span.set(bytes_before=report.bytes_before, bytes_after=report.bytes_after,
+                         compacted=len(changes))
+    return result
+
+
+def append_compacted(df: pd.DataFrame, rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    A compact_dataframe result with cleaned `rows` appended, without re-encoding the
+    existing values: new categories go after the existing ones (the first-appearance
+    order compacting the whole frame would give) and new values take each column's
+    compact dtype when they fit in it; otherwise the column is widened.
+    """
+    report = compaction_report(df) or CompactionReport(frame_nbytes(df), frame_nbytes(df))
+    columns = {}
+    for col in df.columns:
+        old, new = df[col], rows[col]
+        if isinstance(old.dtype, pd.CategoricalDtype) and (_is_text(new) or new.isna().all()):
+            added = pd.Index(new.dropna().unique()).difference(old.cat.categories, sort=False)
+            categories = old.cat.categories.append(added)
+            if len(categories) <= CATEGORY_MAX_UNIQUE:
+                old, new = old.cat.set_categories(categories), new.astype(pd.CategoricalDtype(categories))
+            else:
+                old, new = old.astype(ARROW_STRING), new.astype(ARROW_STRING)
+        elif old.dtype == ARROW_STRING and (_is_text(new) or new.isna().all()):
+            new = new.astype(ARROW_STRING)
+        elif old.dtype == np.int32:
+            new = _downcast_integer(new)
+            if new.dtype != np.int32:
+                old = old.astype(np.int64)
+        elif old.dtype == np.float32:
+            new = _downcast_float(new)
+            if new.dtype != np.float32:
+                old = old.astype(np.float64)
+        columns[col] = pd.concat([old, new], ignore_index=True)
+    result = pd.DataFrame(columns)
+    changes = {col: f"{logical_dtype(dtype)} → {dtype}" for col, dtype in result.dtypes.items()
+               if logical_dtype(dtype) != str(dtype)}
+    appended = CompactionReport(report.bytes_before + frame_nbytes(rows), frame_nbytes(result), changes)
+    result.attrs = {**df.attrs, "compaction": asdict(appended)}
+    return result
+
+
+def compaction_report(df: pd.DataFrame) -> Optional[CompactionReport]:
+    """The report compact_dataframe attached to `df` (it survives the Parquet cache), or None."""
+    stored = df.attrs.get("compaction")
+    return CompactionReport(**stored) if stored else None
+
+
+def restore_arrow_strings(df: pd.DataFrame) -> pd.DataFrame:
+    """Parquet keeps only the logical string type; this brings back the Arrow storage after a read."""
+    python_strings = [col for col, dtype in df.dtypes.items()
+                      if isinstance(dtype, pd.StringDtype) and dtype.storage == "python"]
+    for col in python_strings:
+        df[col] = df[col].astype(ARROW_STRING)
+    return df
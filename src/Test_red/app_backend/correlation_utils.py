@@ -0,0 +1,124 @@
+# File: src/Test_red/app_backend/correlation_utils.py
+
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+# ────────────────────────────────────────────────────────────────────────────────
+# CORRELATION SETTINGS (overridable through environment variables)
+# ────────────────────────────────────────────────────────────────────────────────
+CORR_SAMPLE_ROWS   = int(os.getenv("GROWIFY_CORR_SAMPLE_ROWS", "200000"))
+CORR_MAX_CELLS     = int(os.getenv("GROWIFY_CORR_MAX_CELLS", "900"))   # 30 × 30 heatmap
+CORR_TOP_PAIRS     = int(os.getenv("GROWIFY_CORR_TOP_PAIRS", "10"))
+CORR_CACHE_SIZE    = 16
+# Cell labels are only readable on small heatmaps
+CORR_LABEL_MAX_COLUMNS = 12
+
+
+def correlation_matrix(
+    df: pd.DataFrame,
+    columns: List[str],
+    sample_rows: Optional[int] = CORR_SAMPLE_ROWS,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Pairwise Pearson correlation of `columns` in one vectorized pass.
+
+    Same semantics as DataFrame.corr() (pairwise-complete observations, NaN for
+    constant columns), computed with float32 matrix products over standardized
+    values and a NaN mask. Frames longer than `sample_rows` are sampled first.
+    """
+    if sample_rows is not None and len(df) > sample_rows:
+        df = df.sample(n=sample_rows, random_state=seed)
+    values = df[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+    mask = ~np.isnan(values)
+
+    # Standardizing in float64 first keeps the float32 products well conditioned
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.nanstd(values, axis=0)
+        x = (values - np.nanmean(values, axis=0)) / np.where(std > 0, std, 1.0)
+    x = np.where(mask, x, 0.0).astype(np.float32)
+
+    if mask.all():
+        n = float(len(x))
+        cov = (x.T @ x) / n
+        sums = x.sum(axis=0, dtype=np.float64) / n
+        cov = cov - np.outer(sums, sums)
+        var = np.diag(cov)
+        denominator = np.sqrt(np.outer(var, var))
+    else:
+        m = mask.astype(np.float32)
+        n = m.T @ m                        # rows where both columns are present
+        sx = x.T @ m                       # sum of column i over rows where j is present
+        sxx = (x * x).T @ m
+        sxy = x.T @ x
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = sxy - sx * sx.T / n
+            var_i = sxx - sx * sx / n
+            denominator = np.sqrt(var_i * var_i.T)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = np.clip(cov / denominator, -1.0, 1.0).astype(np.float64)
+    corr[~np.isfinite(corr) | (denominator <= 1e-12)] = np.nan
+    constant = (std == 0) | ~mask.any(axis=0)
+    np.fill_diagonal(corr, np.where(constant, np.nan, 1.0))
+    return pd.DataFrame(corr, index=columns, columns=columns)
+
+
+_corr_cache = OrderedDict()
+_corr_lock = threading.Lock()
+
+
+def get_correlation_matrix(df: pd.DataFrame, columns: List[str], dataset_key: Optional[str] = None) -> pd.DataFrame:
+    """Memoized correlation_matrix: computed once per dataset version and column set."""
+    if dataset_key is None:
+        return correlation_matrix(df, columns)
+    cache_key = (dataset_key, tuple(columns))
+    with _corr_lock:
+        if cache_key in _corr_cache:
+            _corr_cache.move_to_end(cache_key)
+            return _corr_cache[cache_key]
+    corr = correlation_matrix(df, columns)
+    with _corr_lock:
+        _corr_cache[cache_key] = corr
+        while len(_corr_cache) > CORR_CACHE_SIZE:
+            _corr_cache.popitem(last=False)
+    return corr
+
+
+def top_correlated_pairs(corr: pd.DataFrame, k: int = CORR_TOP_PAIRS) -> pd.DataFrame:
+    """The k strongest off-diagonal pairs by |r|, one row per unordered pair."""
+    values = corr.to_numpy()
+    i, j = np.triu_indices(len(values), k=1)
+    r = values[i, j]
+    valid = ~np.isnan(r)
+    i, j, r = i[valid], j[valid], r[valid]
+    order = np.argsort(-np.abs(r), kind="stable")[:k]
+    return pd.DataFrame({
+        "metric_a": corr.index[i[order]],
+        "metric_b": corr.columns[j[order]],
+        "correlation": r[order],
+    })
+
+
+def order_for_heatmap(corr: pd.DataFrame, max_cells: int = CORR_MAX_CELLS) -> pd.DataFrame:
+    """
+    Caps the heatmap at `max_cells` cells by keeping the most strongly
+    correlated columns, then reorders them so correlated columns sit next to
+    each other (angular order of the first two eigenvectors).
+    """
+    strength = corr.abs().fillna(0.0)
+    max_columns = max(2, int(np.sqrt(max_cells)))
+    if len(corr) > max_columns:
+        # Strongest columns by total |r| with the others (the diagonal contributes 1 to each)
+        keep = strength.sum(axis=1).sort_values(ascending=False, kind="stable").index[:max_columns]
+        corr, strength = corr.loc[keep, keep], strength.loc[keep, keep]
+    if len(corr) < 3:
+        return corr
+    _, vectors = np.linalg.eigh(strength.to_numpy())
+    angle = np.arctan2(vectors[:, -2], vectors[:, -1])
+    order = corr.index[np.argsort(angle, kind="stable")]
+    return corr.loc[order, order]
@@ -1,42 +1,32 @@
+from typing import Optional
+
 import pandas as pd
-import re
+
+from .inference_utils import convert_dataframe
+from .profile_utils import DatasetProfile, profile_dataframe
 
 
 def clean_numeric_data(df: pd.DataFrame) -> pd.DataFrame:
     """Clean and convert numeric columns, handling commas and other formatting"""
-    df_clean = df.copy()
-    for col in df_clean.columns:
-        if df_clean[col].dtype == 'object':
-            try:
-                sample_values = df_clean[col].dropna().astype(str).head(10)
-                if any(bool(re.search(r'[\d,.$%]', str(val))) for val in sample_values):
-                    cleaned_series = (
-                        df_clean[col].astype(str)
-                            .str.replace(',', '', regex=False)
-                            .str.replace('$', '', regex=False)
-                            .str.replace('%', '', regex=False)
-                            .str.replace(' ', '', regex=False)
-                            .str.strip()
-                    )
-                    numeric_series = pd.to_numeric(cleaned_series, errors='coerce')
-                    if numeric_series.notna().sum() > len(df_clean) * 0.7:
-                        df_clean[col] = numeric_series
-            except Exception:
-                continue
+    # Spaces are stripped as well, as this helper always has ("1 234" and "$ 3,000" are numbers)
+    df_clean, _ = convert_dataframe(df, numeric_threshold=0.7, parse_dates=False, strip_spaces=True)
     return df_clean
 
 
-def detect_column_types(df: pd.DataFrame) -> dict:
+def detect_column_types(df: pd.DataFrame, profile: Optional[DatasetProfile] = None) -> dict:
     """Analyze columns and detect their purpose and characteristics"""
+    if profile is None:
+        profile = profile_dataframe(df)
+    n_rows = profile.n_rows
     column_analysis = {}
-    for col in df.columns:
+    for col, p in profile.columns.items():
         info = {
             'name': col,
-            'dtype': str(df[col].dtype),
-            'null_count': df[col].isnull().sum(),
-            'null_percentage': (df[col].isnull().sum() / len(df)) * 100,
-            'unique_count': df[col].nunique(),
-            'sample_values': df[col].dropna().head(5).tolist(),
+            'dtype': p.dtype,
+            'null_count': p.null_count,
+            'null_percentage': profile.null_percentage(col),
+            'unique_count': p.unique_count,
+            'sample_values': p.sample_values,
             'likely_purpose': 'unknown'
         }
         col_lower = col.lower()
@@ -50,20 +40,17 @@ def detect_column_types(df: pd.DataFrame) -> dict:
             info['likely_purpose'] = 'volume_metric'
         elif any(k in col_lower for k in ['campaign', 'channel', 'source', 'medium', 'platform', 'category']):
             info['likely_purpose'] = 'categorical'
-        elif df[col].dtype == 'object' and info['unique_count'] < len(df) * 0.5:
+        elif p.dtype == 'object' and info['unique_count'] < n_rows * 0.5:
             info['likely_purpose'] = 'categorical'
-        elif pd.api.types.is_numeric_dtype(df[col]):
+        elif p.kind == 'numeric':
             info['likely_purpose'] = 'numeric'
-        if pd.api.types.is_numeric_dtype(df[col]):
-            try:
-                info.update({
-                    'min': float(df[col].min()),
-                    'max': float(df[col].max()),
-                    'mean': float(df[col].mean()),
-                    'median': float(df[col].median()),
-                    'std': float(df[col].std())
-                })
-            except Exception:
-                info.update({ 'min': None, 'max': None, 'mean': None, 'median': None, 'std': None })
+        if p.kind == 'numeric':
+            info.update({
+                'min': p.min,
+                'max': p.max,
+                'mean': p.mean,
+                'median': p.median,
+                'std': p.std
+            })
         column_analysis[col] = info
-    return column_analysis
\ No newline at end of file
+    return column_analysis
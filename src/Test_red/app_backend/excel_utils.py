@@ -0,0 +1,222 @@
+# File: src/Test_red/app_backend/excel_utils.py
+
+import io
+import os
+import json
+import threading
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from ..exception import DataIngestionError
+from ..logger import logger
+from .cache_utils import CACHE_DIR, FrameCache, hash_bytes
+from .trace_utils import span
+
+# ────────────────────────────────────────────────────────────────────────────────
+# EXCEL INGESTION SETTINGS (overridable through environment variables)
+# ────────────────────────────────────────────────────────────────────────────────
+EXCEL_ENGINE          = os.getenv("GROWIFY_EXCEL_ENGINE", "auto")   # auto | calamine | openpyxl | xlrd
+EXCEL_SHEET           = os.getenv("GROWIFY_EXCEL_SHEET", "first")   # first | all | <sheet name>
+EXCEL_WORKERS         = int(os.getenv("GROWIFY_EXCEL_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXCEL_PARALLEL_MIN_MB = float(os.getenv("GROWIFY_EXCEL_PARALLEL_MIN_MB", "2"))
+EXCEL_CACHE_DIR       = os.getenv("GROWIFY_EXCEL_CACHE_DIR", os.path.join(CACHE_DIR, "excel"))
+EXCEL_CACHE_DISK_MB   = int(os.getenv("GROWIFY_EXCEL_CACHE_DISK_MB", "2048"))
+
+# Bump EXCEL_CACHE_VERSION whenever sheet parsing changes so stale Parquet conversions are ignored.
+EXCEL_CACHE_VERSION = 1
+SHEET_COLUMN        = "source_sheet"   # added when sheets are unioned
+
+_XLSX_MAGIC = b"PK\x03\x04"                          # zip container (.xlsx, .xlsm)
+_XLS_MAGIC  = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"    # OLE2 compound document (legacy .xls)
+
+# Sheets are only ever read from the Parquet conversions after the first parse, so the
+# memory level stays off: the ingestion cache already holds the cleaned frame.
+_sheet_cache = FrameCache(EXCEL_CACHE_DIR, max_memory_mb=0, max_disk_mb=EXCEL_CACHE_DISK_MB)
+
+
+def is_excel_file(filename: str) -> bool:
+    return filename.lower().endswith((".xlsx", ".xlsm", ".xls"))
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def workbook_format(data: bytes) -> str:
+    """'xlsx', 'xls' or 'text', from the file's leading bytes rather than its extension."""
+    if data.startswith(_XLSX_MAGIC):
+        return "xlsx"
+    if data.startswith(_XLS_MAGIC):
+        return "xls"
+    # Many ".xls" downloads from ad platforms are really tab-separated text
+    return "text"
+
+
+def resolve_engine(fmt: str) -> str:
+    """
+    pandas engine for a workbook format: calamine (Rust, reads both formats several
+    times faster than openpyxl) when python-calamine is installed, else openpyxl
+    for .xlsx and xlrd for legacy .xls. GROWIFY_EXCEL_ENGINE forces one.
+    """
+    if EXCEL_ENGINE != "auto":
+        return EXCEL_ENGINE
+    if _installed("python_calamine"):
+        return "calamine"
+    if fmt == "xls":
+        if _installed("xlrd"):
+            return "xlrd"
+        raise DataIngestionError(
+            "Legacy .xls workbooks need python-calamine or xlrd installed; "
+            "alternatively save the file as .xlsx or CSV."
+        )
+    return "openpyxl"
+
+
+def _parquet_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Column names as strings and mixed-type object columns (numbers and text in one
+    column) as text, which is how the same sheet exported to CSV would be read;
+    missing values stay missing. Without this such sheets could not be cached as Parquet.
+    """
+    df.columns = [str(col) for col in df.columns]
+    for col in df.columns[df.dtypes == object]:
+        series = df[col]
+        if pd.api.types.infer_dtype(series, skipna=True) not in ("string", "empty"):
+            df[col] = series.where(series.isna(), series.astype(str))
+    return df
+
+
+def _parse_sheet(data: bytes, engine: str, sheet: str) -> pd.DataFrame:
+    """Worker entry point: one sheet of the workbook, parsed with `engine`."""
+    return _parquet_safe(pd.read_excel(io.BytesIO(data), sheet_name=sheet, engine=engine))
+
+
+def _parse_text(data: bytes) -> pd.DataFrame:
+    # Delimiter sniffed from the first lines: tab for most exports, comma or semicolon otherwise
+    return _parquet_safe(pd.read_csv(io.BytesIO(data), sep=None, engine="python"))
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Shared process pool for sheet parsing (spawn: safe from Streamlit's threads)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(EXCEL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _parse_in_parallel(data: bytes, sheets: List[str]) -> bool:
+    # Worker startup costs ~0.5s; small workbooks and batch workers (already one process per file) parse inline
+    return (len(sheets) > 1 and EXCEL_WORKERS > 1 and len(data) >= EXCEL_PARALLEL_MIN_MB * 1024 * 1024
+            and multiprocessing.parent_process() is None)
+
+
+def _workbook_key(data: bytes) -> str:
+    return hash_bytes(data, "excel", EXCEL_CACHE_VERSION)
+
+
+def _manifest_path(workbook_key: str) -> str:
+    return os.path.join(EXCEL_CACHE_DIR, f"{workbook_key}.json")
+
+
+def list_sheets(data: bytes, filename: str = "", workbook_key: Optional[str] = None) -> List[str]:
+    """Sheet names in workbook order (one unnamed sheet for text exports); cached next to the conversions."""
+    workbook_key = workbook_key or _workbook_key(data)
+    path = _manifest_path(workbook_key)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    fmt = workbook_format(data)
+    if fmt == "text":
+        sheets = [os.path.splitext(os.path.basename(filename))[0] or "Sheet1"]
+    else:
+        try:
+            with pd.ExcelFile(io.BytesIO(data), engine=resolve_engine(fmt)) as workbook:
+                sheets = [str(name) for name in workbook.sheet_names]
+        except DataIngestionError:
+            raise
+        except Exception as e:
+            raise DataIngestionError(f"Could not open workbook {filename}: {e}") from e
+    try:
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(sheets, f)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        logger.warning(f"Could not write sheet manifest for {filename}: {e}")
+    return sheets
+
+
+def read_sheets(data: bytes, filename: str, sheets: List[str],
+                workbook_key: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Raw frames for `sheets`. Each sheet is converted to Parquet once, keyed by the
+    workbook's content hash, so later reads of the same bytes are columnar reads;
+    sheets not yet converted are parsed together, in worker processes for large workbooks.
+    """
+    workbook_key = workbook_key or _workbook_key(data)
+    frames = {}
+    with span("excel", bytes=len(data), sheets=len(sheets)) as excel_span:
+        for sheet in sheets:
+            df = _sheet_cache.get(hash_bytes(workbook_key.encode(), sheet))
+            if df is not None:
+                frames[sheet] = df
+        missing = [sheet for sheet in sheets if sheet not in frames]
+        excel_span.set(cached=len(frames), parsed=len(missing))
+        if missing:
+            fmt = workbook_format(data)
+            try:
+                if fmt == "text":
+                    parsed = {missing[0]: _parse_text(data)}
+                else:
+                    engine = resolve_engine(fmt)
+                    parallel = _parse_in_parallel(data, missing)
+                    excel_span.set(engine=engine, parallel=parallel)
+                    if parallel:
+                        futures = {sheet: _get_pool().submit(_parse_sheet, data, engine, sheet) for sheet in missing}
+                        parsed = {sheet: future.result() for sheet, future in futures.items()}
+                    else:
+                        parsed = {sheet: _parse_sheet(data, engine, sheet) for sheet in missing}
+            except DataIngestionError:
+                raise
+            except Exception as e:
+                raise DataIngestionError(f"Could not parse {filename}: {e}") from e
+            for sheet, df in parsed.items():
+                _sheet_cache.put(hash_bytes(workbook_key.encode(), sheet), df)
+            frames.update(parsed)
+    return {sheet: frames[sheet] for sheet in sheets}
+
+
+def read_workbook(data: bytes, filename: str, sheet: Optional[str] = None) -> pd.DataFrame:
+    """
+    Raw frame of an Excel upload. `sheet` (default GROWIFY_EXCEL_SHEET) is "first",
+    "all" to union every non-empty sheet with a `source_sheet` column (columns aligned
+    by name, missing ones left empty), or the name of one sheet.
+    """
+    sheet = sheet or EXCEL_SHEET
+    workbook_key = _workbook_key(data)
+    available = list_sheets(data, filename, workbook_key)
+    if not available:
+        raise DataIngestionError(f"{filename} contains no sheets")
+    if sheet == "first":
+        return read_sheets(data, filename, available[:1], workbook_key)[available[0]]
+    if sheet != "all":
+        if sheet not in available:
+            raise DataIngestionError(f"Sheet '{sheet}' not found in {filename}; available: {', '.join(available)}")
+        return read_sheets(data, filename, [sheet], workbook_key)[sheet]
+
+    frames = [df.assign(**{SHEET_COLUMN: name})
+              for name, df in read_sheets(data, filename, available, workbook_key).items() if len(df.columns)]
+    if not frames:
+        return pd.DataFrame()
+    return _parquet_safe(pd.concat(frames, ignore_index=True, sort=False))
@@ -0,0 +1,185 @@
+# File: src/Test_red/app_backend/http_client.py
+
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Dict, Optional
+
+from ..exception import CircuitOpenError
+from ..logger import logger
+from .trace_utils import record_retry
+
+if TYPE_CHECKING:
+    import requests
+
+# ────────────────────────────────────────────────────────────────────────────────
+# HTTP SETTINGS (overridable through environment variables)
+# ────────────────────────────────────────────────────────────────────────────────
+CONNECT_TIMEOUT   = float(os.getenv("GROWIFY_HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT      = float(os.getenv("GROWIFY_HTTP_READ_TIMEOUT", "120"))
+MAX_RETRIES       = int(os.getenv("GROWIFY_HTTP_MAX_RETRIES", "4"))
+BACKOFF_BASE      = float(os.getenv("GROWIFY_HTTP_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX       = float(os.getenv("GROWIFY_HTTP_BACKOFF_MAX", "20"))
+POOL_SIZE         = int(os.getenv("GROWIFY_HTTP_POOL_SIZE", "16"))
+BREAKER_FAILURES  = int(os.getenv("GROWIFY_BREAKER_FAILURES", "5"))
+BREAKER_RESET     = float(os.getenv("GROWIFY_BREAKER_RESET_SECONDS", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls and rejects calls
+    for `reset_timeout` seconds; then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+def retry_after_seconds(response: "requests.Response") -> Optional[float]:
+    """Parses a Retry-After header given either in seconds or as an HTTP date."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class PooledHTTPClient:
+    """
+    Shared requests.Session with keep-alive connection pooling, connect/read timeouts,
+    exponential backoff with full jitter on 429/5xx (honoring Retry-After) and a
+    circuit breaker that fails fast while the provider is down.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        read_timeout: float = READ_TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_max: float = BACKOFF_MAX,
+        pool_size: int = POOL_SIZE,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        # requests loads with the first client, not with the module
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.retries = 0
+
+    def _backoff(self, attempt: int, response: Optional["requests.Response"] = None) -> float:
+        if response is not None:
+            retry_after = retry_after_seconds(response)
+            if retry_after is not None:
+                return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def post(self, url: str, headers: Dict[str, str], payload: dict, stream: bool = False) -> "requests.Response":
+        """
+        POSTs JSON, retrying connection errors, timeouts and retryable statuses.
+        Returns the final response (the caller checks its status); raises the last
+        exception if every attempt failed to connect, or CircuitOpenError when open.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open; failing fast")
+
+        import requests
+        last_error: Optional[Exception] = None
+        response: Optional["requests.Response"] = None
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    delay = self._backoff(attempt - 1, response)
+                    self.retries += 1
+                    record_retry(self.name)
+                    logger.warning(f"{self.name}: retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                    time.sleep(delay)
+                try:
+                    response = self.session.post(url, headers=headers, json=payload,
+                                                 timeout=self.timeout, stream=stream)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    last_error, response = e, None
+                    continue
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                if attempt < self.max_retries:
+                    response.close()
+        except BaseException:
+            # Any other error (a broken stream, an interrupt) still ends a half-open trial;
+            # otherwise the breaker would reject every later call
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_failure()
+        if response is not None:
+            return response
+        raise last_error
+
+
+_clients: Dict[str, PooledHTTPClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_http_client(name: str) -> PooledHTTPClient:
+    """One pooled client (and circuit breaker) per provider, shared by all sessions."""
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = PooledHTTPClient(name)
+        return _clients[name]
@@ -0,0 +1,198 @@
+# File: src/Test_red/app_backend/inference_utils.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+# ────────────────────────────────────────────────────────────────────────────────
+# INFERENCE SETTINGS
+# ────────────────────────────────────────────────────────────────────────────────
+SAMPLE_SIZE = 2000               # rows inspected per column to decide its type
+THOUSANDS_SEPARATOR = ','
+OPTIONAL_SYMBOLS = ('$', '%')    # stripped only when seen in the sample
+PARALLEL_MIN_CELLS = 200_000     # below this, threads cost more than they save
+
+
+@dataclass
+class ColumnDecision:
+    """How a raw text column is converted: kept as-is, parsed as numeric, or as datetime."""
+    kind: str = "keep"                  # "keep" | "numeric" | "datetime"
+    strip_symbols: str = ""             # characters removed before numeric parsing
+    date_format: Optional[str] = None   # explicit strptime format; None means mixed formats
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ColumnDecision":
+        return cls(**data)
+
+
+def _is_text_column(series: pd.Series) -> bool:
+    return series.dtype == 'object' or isinstance(series.dtype, pd.StringDtype)
+
+
+def _sample(series: pd.Series, sample_size: int) -> pd.Series:
+    """Evenly spaced rows (nulls included, so parse rates match the full column)."""
+    if len(series) <= sample_size:
+        return series
+    positions = np.linspace(0, len(series) - 1, sample_size).astype(np.int64)
+    return series.iloc[positions]
+
+
+def _to_numeric(series: pd.Series, strip_symbols: str) -> pd.Series:
+    if series.dtype == 'object':
+        # Mixed cells (Excel/API frames: 1, '2,000', 3.5): .str would turn the non-strings into NaN
+        series = series.where(series.isna(), series.astype(str))
+    # Literal replaces are several times faster than one regex over object strings
+    for symbol in strip_symbols:
+        series = series.str.replace(symbol, '', regex=False)
+    return pd.to_numeric(series, errors='coerce')
+
+
+def _symbols_in(sample: pd.Series, strip_spaces: bool = False) -> str:
+    text = ''.join(sample.dropna().astype(str))
+    symbols = OPTIONAL_SYMBOLS + (' ',) if strip_spaces else OPTIONAL_SYMBOLS
+    return THOUSANDS_SEPARATOR + ''.join(symbol for symbol in symbols if symbol in text)
+
+
+def _to_datetime(series: pd.Series, date_format: Optional[str]) -> pd.Series:
+    return pd.to_datetime(series, format=date_format or 'mixed', errors='coerce')
+
+
+def _infer_date_format(series: pd.Series, sample: pd.Series, threshold: float) -> Optional[ColumnDecision]:
+    """
+    Guesses the format from the first non-null value (what pandas itself does)
+    and accepts it only if it parses enough of the sample; otherwise, as when no
+    single format is recognized, per-element parsing is tried on the sample.
+    """
+    first_index = series.first_valid_index()
+    if first_index is None:
+        return None
+    first_value = series.loc[first_index]
+    if not isinstance(first_value, str):
+        return None
+    date_format = guess_datetime_format(first_value.strip())
+    if date_format is not None:
+        parsed = pd.to_datetime(sample, format=date_format, errors='coerce')
+        if parsed.notna().mean() > threshold:
+            return ColumnDecision("datetime", date_format=date_format)
+    # No single format fits: only fall back to per-element parsing if the sample proves it pays off
+    try:
+        parsed = _to_datetime(sample, None)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    return ColumnDecision("datetime") if parsed.notna().mean() > threshold else None
+
+
+def infer_column_type(
+    series: pd.Series,
+    numeric_threshold: float = 0.8,
+    parse_dates: bool = True,
+    sample_size: int = SAMPLE_SIZE,
+    strip_spaces: bool = False,
+) -> ColumnDecision:
+    """
+    Decides a column's type from a bounded sample; non-text columns are kept as-is.
+    `strip_spaces` also removes inner spaces before numeric parsing ("1 234" -> 1234).
+    """
+    if not _is_text_column(series):
+        return ColumnDecision()
+    sample = _sample(series, sample_size)
+    try:
+        strip_symbols = _symbols_in(sample, strip_spaces)
+        if _to_numeric(sample, strip_symbols).notna().mean() > numeric_threshold:
+            return ColumnDecision("numeric", strip_symbols=strip_symbols)
+    except AttributeError:
+        # Not a string column after all (e.g. only nulls or mixed Python objects)
+        return ColumnDecision()
+    if parse_dates:
+        decision = _infer_date_format(series, sample, numeric_threshold)
+        if decision is not None:
+            return decision
+    return ColumnDecision()
+
+
+def convert_column(series: pd.Series, decision: ColumnDecision) -> pd.Series:
+    """Applies a decision to the full column in a single pass."""
+    if decision.kind == "numeric":
+        return _to_numeric(series, decision.strip_symbols)
+    if decision.kind == "datetime":
+        return _to_datetime(series, decision.date_format)
+    return series
+
+
+def _infer_and_convert(
+    series: pd.Series,
+    numeric_threshold: float,
+    parse_dates: bool,
+    sample_size: int,
+    strip_spaces: bool,
+) -> Tuple[ColumnDecision, Optional[pd.Series]]:
+    decision = infer_column_type(series, numeric_threshold, parse_dates, sample_size, strip_spaces)
+    if decision.kind == "keep":
+        return decision, None
+    try:
+        converted = convert_column(series, decision)
+    except (ValueError, TypeError, OverflowError, AttributeError):
+        return ColumnDecision(), None
+    # The sample may be unrepresentative: confirm on the full column before committing
+    if converted.notna().mean() <= numeric_threshold and decision.kind == "datetime" and decision.date_format:
+        # The guessed format fits the sample but not later rows: parse element by element instead
+        decision = ColumnDecision("datetime")
+        try:
+            converted = convert_column(series, decision)
+        except (ValueError, TypeError, OverflowError):
+            return ColumnDecision(), None
+    if converted.notna().mean() <= numeric_threshold:
+        return ColumnDecision(), None
+    return decision, converted
+
+
+def convert_dataframe(
+    df: pd.DataFrame,
+    numeric_threshold: float = 0.8,
+    parse_dates: bool = True,
+    sample_size: int = SAMPLE_SIZE,
+    max_workers: Optional[int] = None,
+    strip_spaces: bool = False,
+) -> Tuple[pd.DataFrame, Dict[str, ColumnDecision]]:
+    """
+    Infers and converts every text column of `df` exactly once.
+    Returns a new frame that shares unconverted columns with `df`, plus the
+    per-column decisions so the same conversion can be replayed on new data.
+    """
+    columns = [col for col in df.columns if _is_text_column(df[col])]
+    decisions = {col: ColumnDecision() for col in df.columns}
+    if not columns:
+        return df.copy(deep=False), decisions
+
+    args = (numeric_threshold, parse_dates, sample_size, strip_spaces)
+    if max_workers is None:
+        max_workers = min(len(columns), os.cpu_count() or 1)
+    if max_workers > 1 and len(df) * len(columns) >= PARALLEL_MIN_CELLS:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(lambda col: _infer_and_convert(df[col], *args), columns))
+    else:
+        results = [_infer_and_convert(df[col], *args) for col in columns]
+
+    df_clean = df.copy(deep=False)
+    for col, (decision, converted) in zip(columns, results):
+        decisions[col] = decision
+        if converted is not None:
+            df_clean[col] = converted
+    return df_clean, decisions
+
+
+def apply_column_decisions(df: pd.DataFrame, decisions: Dict[str, ColumnDecision]) -> pd.DataFrame:
+    """Replays stored decisions on a new frame without re-inferring any types."""
+    df_clean = df.copy(deep=False)
+    for col, decision in decisions.items():
+        if col in df_clean.columns and decision.kind != "keep" and _is_text_column(df_clean[col]):
+            df_clean[col] = convert_column(df_clean[col], decision)
+    return df_clean
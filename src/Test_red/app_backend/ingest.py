@@ -0,0 +1,359 @@
+# File: src/Test_red/app_backend/ingest.py
+
+import io
+import os
+import json
+from dataclasses import asdict, dataclass, field
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import duckdb
+import pandas as pd
+
+from ..exception import DataIngestionError
+from ..logger import logger
+from .analysis_utils import clean_with_decisions
+from .cache_utils import CACHE_DIR, FrameCache, hash_bytes, hash_chunks
+from .compact_utils import COMPACT_DTYPES, DUCKDB_LOGICAL_TYPES, compact_dataframe, logical_dtype
+from .data_utils import detect_column_types
+from .excel_utils import EXCEL_SHEET, is_excel_file, read_workbook
+from .inference_utils import SAMPLE_SIZE, ColumnDecision, apply_column_decisions, convert_dataframe, infer_column_type
+from .profile_utils import DatasetProfile, StreamingProfiler, get_dataset_profile
+from .sql_utils import quote_identifier, quote_literal
+from .trace_utils import span, traced
+
+# Bump CLEANING_VERSION whenever the cleaning logic changes so stale cache entries are ignored.
+CLEANING_VERSION = 3
+DEFAULT_CLEANING_SETTINGS = {"normalize_columns": True, "compact_dtypes": COMPACT_DTYPES}
+
+_ingestion_cache = FrameCache(os.path.join(CACHE_DIR, "ingest"))
+MANIFEST_DIR = os.path.join(CACHE_DIR, "datasets")
+
+# ────────────────────────────────────────────────────────────────────────────────
+# DUCKDB-NATIVE INGESTION (files larger than RAM)
+# ────────────────────────────────────────────────────────────────────────────────
+TABLE_NAME           = "marketing_data"
+SPILL_DIR            = os.path.join(CACHE_DIR, "uploads")
+SPILL_CHUNK_BYTES    = 16 * 1024 * 1024
+LARGE_FILE_MB        = float(os.getenv("GROWIFY_DUCKDB_INGEST_MB", "200"))
+PREVIEW_ROWS         = 100_000
+STREAM_CHUNK_ROWS    = int(os.getenv("GROWIFY_STREAM_CHUNK_ROWS", "250000"))
+STREAMING_INGEST     = os.getenv("GROWIFY_STREAMING_INGEST", "0") == "1"
+
+
+def normalize_column_name(name) -> str:
+    """Strips whitespace from a header and replaces inner spaces with underscores."""
+    return str(name).strip().replace(' ', '_')
+
+
+def normalize_column_names(df: pd.DataFrame) -> pd.DataFrame:
+    """Strips whitespace from headers and replaces inner spaces with underscores."""
+    df.columns = df.columns.astype(str).str.strip().str.replace(' ', '_')
+    return df
+
+
+@traced("parse")
+def read_uploaded_file(data: bytes, filename: str, sheet: Optional[str] = None) -> pd.DataFrame:
+    """
+    Parses raw CSV/Excel bytes into a DataFrame without any cleaning.
+    For workbooks, `sheet` picks "first", "all" (union) or a sheet by name (see excel_utils).
+    """
+    if not filename.lower().endswith('.csv'):
+        return read_workbook(data, filename, sheet)
+    try:
+        return pd.read_csv(io.BytesIO(data))
+    except Exception as e:
+        raise DataIngestionError(f"Could not parse {filename}: {e}") from e
+
+
+def dataset_key(data: bytes, filename: str, settings: Optional[dict] = None) -> str:
+    """Cache key for an upload: hash of its bytes, its format and the cleaning settings."""
+    settings = settings or DEFAULT_CLEANING_SETTINGS
+    extension = os.path.splitext(filename)[1].lower()
+    return hash_bytes(data, extension, settings, CLEANING_VERSION)
+
+
+@dataclass
+class DatasetManifest:
+    """
+    What appending to a loaded dataset needs: the cleaning settings, each column's
+    stored decision and cleaned dtype, and the ingestion-cache keys of its partitions.
+    """
+    key: str
+    settings: dict
+    columns: Dict[str, str]                 # cleaned column -> dtype before compaction
+    decisions: Dict[str, dict]              # column -> ColumnDecision.to_dict()
+    n_rows: int
+    partitions: List[str] = field(default_factory=list)   # oldest first
+    sources: List[str] = field(default_factory=list)      # file name of each partition
+    base_key: Optional[str] = None          # the version this one appended to
+
+
+def save_manifest(manifest: DatasetManifest) -> None:
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    path = os.path.join(MANIFEST_DIR, f"{manifest.key}.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(asdict(manifest), f)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_manifest(key: str) -> Optional[DatasetManifest]:
+    """The manifest written when `key` was loaded or appended to, or None."""
+    try:
+        with open(os.path.join(MANIFEST_DIR, f"{key}.json")) as f:
+            return DatasetManifest(**json.load(f))
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def load_dataset(data: bytes, filename: str, settings: Optional[dict] = None) -> Tuple[str, pd.DataFrame]:
+    """
+    Returns (dataset_key, cleaned DataFrame) for an uploaded file.
+    Parsing and cleaning only happen on a cache miss; later calls are lookups.
+    Workbooks are read per `settings["excel_sheet"]` (default GROWIFY_EXCEL_SHEET).
+    """
+    settings = settings or DEFAULT_CLEANING_SETTINGS
+    if is_excel_file(filename):
+        # The sheet choice is part of the key: every selection is its own cleaned dataset
+        settings = {**settings, "excel_sheet": settings.get("excel_sheet") or EXCEL_SHEET}
+    with span("ingest", source="upload", bytes=len(data)) as ingest_span:
+        key = dataset_key(data, filename, settings)
+        df = _ingestion_cache.get(key)
+        ingest_span.set(cached=df is not None)
+        if df is not None:
+            return key, df
+
+        df_raw = read_uploaded_file(data, filename, settings.get("excel_sheet"))
+        if settings.get("normalize_columns", True):
+            df_raw = normalize_column_names(df_raw)
+        df, decisions = clean_with_decisions(df_raw)
+        save_manifest(DatasetManifest(
+            key, settings, {col: logical_dtype(dtype) for col, dtype in df.dtypes.items()},
+            {col: decision.to_dict() for col, decision in decisions.items()}, len(df), [key], [filename],
+        ))
+        if settings.get("compact_dtypes"):
+            # Profiled before compaction; the memoized profile then serves every later lookup of this key
+            df = compact_dataframe(df, detect_column_types(df, get_dataset_profile(df, key)))
+        _ingestion_cache.put(key, df)
+        ingest_span.set(rows=len(df), columns=len(df.columns))
+    return key, df
+
+
+def get_cached_dataset(key: str) -> Optional[pd.DataFrame]:
+    """Returns the cleaned frame for a previously loaded dataset key, or None."""
+    return _ingestion_cache.get(key)
+
+
+def cache_dataset(key: str, df: pd.DataFrame, persist: bool = True) -> None:
+    """Stores a cleaned frame under `key`; persist=False keeps it in memory only (see FrameCache.put)."""
+    _ingestion_cache.put(key, df, persist)
+
+
+def ingestion_cache_stats() -> dict:
+    """Hit/miss counters of the ingestion cache, for display in the UI."""
+    return _ingestion_cache.stats()
+
+
+def is_large_upload(size_bytes: int) -> bool:
+    """Uploads above GROWIFY_DUCKDB_INGEST_MB are loaded through DuckDB instead of pandas."""
+    return size_bytes > LARGE_FILE_MB * 1024 * 1024
+
+
+def spill_upload(fileobj: BinaryIO, filename: str, settings: Optional[dict] = None) -> Tuple[str, str]:
+    """
+    Streams an upload to a temp file in fixed-size chunks, hashing as it goes.
+    Returns (dataset_key, path); the key matches dataset_key() for the same bytes.
+    """
+    settings = settings or DEFAULT_CLEANING_SETTINGS
+    extension = os.path.splitext(filename)[1].lower()
+    os.makedirs(SPILL_DIR, exist_ok=True)
+    fileobj.seek(0)
+    tmp_path = os.path.join(SPILL_DIR, f"incoming-{os.getpid()}-{id(fileobj)}{extension}")
+
+    def copy_chunks(dst):
+        while True:
+            chunk = fileobj.read(SPILL_CHUNK_BYTES)
+            if not chunk:
+                return
+            dst.write(chunk)
+            yield chunk
+
+    with open(tmp_path, "wb") as dst:
+        key = hash_chunks(copy_chunks(dst), extension, settings, CLEANING_VERSION)
+    path = os.path.join(SPILL_DIR, f"{key}{extension}")
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    return key, path
+
+
+def create_table_from_frame(conn: duckdb.DuckDBPyConnection, df: pd.DataFrame, table: str = TABLE_NAME) -> None:
+    """Materializes an already-cleaned frame as a DuckDB table."""
+    # Compact columns get their cleaned types back: categoricals would become ENUMs (sorted by
+    # category order) and FLOAT arithmetic would round differently from DOUBLE
+    casts = [f"CAST({quote_identifier(col)} AS {DUCKDB_LOGICAL_TYPES[str(dtype)]}) AS {quote_identifier(col)}"
+             for col, dtype in df.dtypes.items() if str(dtype) in DUCKDB_LOGICAL_TYPES]
+    replace = f" REPLACE ({', '.join(casts)})" if casts else ""
+    conn.register("cleaned_frame", df)
+    try:
+        conn.execute(f"CREATE OR REPLACE TABLE {quote_identifier(table)} AS SELECT *{replace} FROM cleaned_frame")
+    finally:
+        conn.unregister("cleaned_frame")
+
+
+def _raw_source(conn: duckdb.DuckDBPyConnection, path: str, all_varchar: bool = False) -> str:
+    """SQL relation reading the spilled file without materializing it in pandas."""
+    if path.lower().endswith('.csv'):
+        options = ", all_varchar=true" if all_varchar else ""
+        return f"read_csv({quote_literal(path)}, header=true{options})"
+    if path.lower().endswith('.xlsx'):
+        try:
+            conn.execute("INSTALL excel; LOAD excel;")
+            return f"read_xlsx({quote_literal(path)}, header=true, all_varchar={'true' if all_varchar else 'false'})"
+        except duckdb.Error as e:
+            logger.warning(f"DuckDB excel extension unavailable ({e}); reading workbook with pandas")
+    # Legacy .xls (which read_xlsx cannot open) and the fallback: sheets are capped at ~1M rows,
+    # so the parsed frame stays bounded, and its Parquet conversion is cached by content hash
+    with open(path, "rb") as f:
+        conn.register("raw_upload", read_workbook(f.read(), os.path.basename(path), "first"))
+        return "raw_upload"
+
+
+def _cast_expression(column: str, decision: ColumnDecision) -> str:
+    """SQL equivalent of inference_utils.convert_column."""
+    quoted = quote_identifier(column)
+    if decision.kind == "numeric":
+        expr = f"TRIM(CAST({quoted} AS VARCHAR))"
+        for symbol in decision.strip_symbols:
+            expr = f"REPLACE({expr}, {quote_literal(symbol)}, '')"
+        return f"TRY_CAST({expr} AS DOUBLE)"
+    if decision.kind == "datetime":
+        if decision.date_format:
+            return f"TRY_STRPTIME(TRIM(CAST({quoted} AS VARCHAR)), {quote_literal(decision.date_format)})"
+        return f"TRY_CAST({quoted} AS TIMESTAMP)"
+    return quoted
+
+
+def _create_clean_table(conn, source: str, decisions: Dict[str, ColumnDecision], table: str) -> None:
+    select_list = ", ".join(
+        f"{_cast_expression(col, decision)} AS {quote_identifier(normalize_column_name(col))}"
+        for col, decision in decisions.items()
+    )
+    conn.execute(f"CREATE OR REPLACE TABLE {quote_identifier(table)} AS SELECT {select_list} FROM {source}")
+
+
+@traced("ingest")
+def load_file_into_duckdb(
+    conn: duckdb.DuckDBPyConnection,
+    path: str,
+    table: str = TABLE_NAME,
+    numeric_threshold: float = 0.8,
+) -> Dict[str, ColumnDecision]:
+    """
+    Loads a CSV/Excel file into a DuckDB table, cleaning it in SQL.
+    Text columns are typed by the same sample-driven inference as the pandas path
+    (on a reservoir sample); only the sample is ever materialized in pandas.
+    Returns the per-column decisions, keyed by raw column name.
+    """
+    source = _raw_source(conn, path)
+    try:
+        sample = conn.execute(
+            f"SELECT * FROM {source} USING SAMPLE reservoir({SAMPLE_SIZE} ROWS) REPEATABLE (42)"
+        ).df()
+    except duckdb.Error:
+        # The type sniffer guessed wrong further down the file: read everything as text
+        source = _raw_source(conn, path, all_varchar=True)
+        sample = conn.execute(
+            f"SELECT * FROM {source} USING SAMPLE reservoir({SAMPLE_SIZE} ROWS) REPEATABLE (42)"
+        ).df()
+
+    decisions = {col: infer_column_type(sample[col], numeric_threshold) for col in sample.columns}
+    _create_clean_table(conn, source, decisions, table)
+
+    # The sample may be unrepresentative: confirm parse rates on the full table
+    converted = [col for col, decision in decisions.items() if decision.kind != "keep"]
+    if converted:
+        counts = conn.execute(
+            "SELECT count(*), " + ", ".join(
+                f"count({quote_identifier(normalize_column_name(col))})" for col in converted
+            ) + f" FROM {quote_identifier(table)}"
+        ).fetchone()
+        total = counts[0]
+        failed = [col for col, count in zip(converted, counts[1:]) if total and count / total <= numeric_threshold]
+        if failed:
+            for col in failed:
+                decisions[col] = ColumnDecision()
+            _create_clean_table(conn, source, decisions, table)
+    if source == "raw_upload":
+        conn.unregister("raw_upload")
+    return decisions
+
+
+def read_preview(conn: duckdb.DuckDBPyConnection, table: str = TABLE_NAME, rows: int = PREVIEW_ROWS) -> pd.DataFrame:
+    """Bounded random sample of a DuckDB table for charts and previews."""
+    total = conn.execute(f"SELECT count(*) FROM {quote_identifier(table)}").fetchone()[0]
+    if total <= rows:
+        return conn.execute(f"SELECT * FROM {quote_identifier(table)}").df()
+    return conn.execute(
+        f"SELECT * FROM {quote_identifier(table)} USING SAMPLE reservoir({int(rows)} ROWS) REPEATABLE (42)"
+    ).df()
+
+
+def _sql_type(series: pd.Series) -> str:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "TIMESTAMP"
+    if pd.api.types.is_numeric_dtype(series):
+        return "DOUBLE"
+    return "VARCHAR"
+
+
+def stream_csv_into_duckdb(
+    conn: duckdb.DuckDBPyConnection,
+    path: str,
+    table: str = TABLE_NAME,
+    chunk_rows: int = STREAM_CHUNK_ROWS,
+    numeric_threshold: float = 0.8,
+) -> Iterator[Tuple[DatasetProfile, Dict[str, ColumnDecision]]]:
+    """
+    Reads a CSV in fixed-size chunks, cleans each chunk, appends it to a DuckDB
+    table and folds it into a StreamingProfiler. Yields (profile so far, decisions)
+    after every chunk, so callers can update the UI while the file is still loading.
+
+    Column types are inferred on the first chunk and replayed on every later one,
+    which keeps the table schema stable; numerics are always stored as DOUBLE.
+    Peak memory is one chunk plus the fixed-size sketches. A file without data
+    rows raises DataIngestionError rather than leaving no table behind.
+    """
+    with span("ingest", source="stream") as ingest_span:
+        profiler = StreamingProfiler()
+        decisions = None
+        table_sql = quote_identifier(table)
+        try:
+            chunks = pd.read_csv(path, chunksize=chunk_rows, dtype=str)
+        except pd.errors.EmptyDataError as e:
+            raise DataIngestionError("The CSV file is empty") from e
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            chunk = normalize_column_names(chunk)
+            if decisions is None:
+                chunk, decisions = convert_dataframe(chunk, numeric_threshold=numeric_threshold)
+            else:
+                chunk = apply_column_decisions(chunk, decisions)
+            for col, decision in decisions.items():
+                if decision.kind == "numeric":
+                    chunk[col] = chunk[col].astype("float64")
+
+            conn.register("incoming_chunk", chunk)
+            try:
+                if profiler.n_rows == 0:
+                    columns_sql = ", ".join(f"{quote_identifier(col)} {_sql_type(chunk[col])}" for col in chunk.columns)
+                    conn.execute(f"CREATE OR REPLACE TABLE {table_sql} ({columns_sql})")
+                conn.execute(f"INSERT INTO {table_sql} SELECT * FROM incoming_chunk")
+            finally:
+                conn.unregister("incoming_chunk")
+            profiler.update(chunk)
+            yield profiler.snapshot(), decisions
+        if profiler.n_rows == 0:
+            raise DataIngestionError("The CSV file has a header but no data rows")
+        ingest_span.set(rows=profiler.n_rows)
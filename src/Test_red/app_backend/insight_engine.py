@@ -0,0 +1,338 @@
+# File: src/Test_red/app_backend/insight_engine.py
+
+import re
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+import duckdb
+import pandas as pd
+from ..logger import logger
+from .api_clients import stream_gemini
+from .prompt_utils import tokenize
+from .query_cache import get_query_cache
+from .rollup_utils import GRAIN_WORDS, NUMERIC_TYPES, column_types, find_time_column
+from .sql_utils import guarded_execute, quote_identifier, quote_literal
+from .trace_utils import traced
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# ────────────────────────────────────────────────────────────────────────────────
+# FAST-PATH ANSWERS
+# Templated questions (monthly totals, best/worst month, top N, period-over-period
+# change) are recognized from the column tags and answered with one DuckDB query;
+# open-ended questions still go to the LLM pipeline.
+# ────────────────────────────────────────────────────────────────────────────────
+DEFAULT_TOP_N = 5
+
+OPEN_ENDED_WORDS = {"why", "explain", "reason", "cause", "because", "recommend", "should", "suggest",
+                    "improve", "strategy", "predict", "forecast"}
+CHANGE_WORDS     = {"change", "growth", "grow", "grew", "mom", "wow", "increase", "decrease", "delta"}
+TOP_WORDS        = {"top", "best", "highest", "most", "largest", "biggest", "max", "maximum", "peak"}
+BOTTOM_WORDS     = {"bottom", "worst", "lowest", "least", "smallest", "min", "minimum"}
+AVERAGE_WORDS    = {"average", "avg", "mean", "typical"}
+TOTAL_WORDS      = {"total", "sum", "overall", "cumulative"}
+PERIOD_PHRASES   = re.compile(r"\b(?:per|by|each|every|over)\s+(day|week|month)s?\b|\bover time\b")
+
+# Questions that restrict the rows go to the LLM: the templates always aggregate the whole table
+RELATIVE_WORDS   = {"last", "this", "previous", "past", "current", "recent", "latest", "ytd", "today", "yesterday",
+                    "quarter", "quarterly"}
+FILTER_WORDS     = {"only", "excluding", "except", "without", "where", "between", "since", "until", "before",
+                    "after", "during"}
+YEAR_PATTERN     = re.compile(r"\b(?:19|20)\d{2}\b|\bq[1-4]\b")
+MONTH_PATTERN    = re.compile(r"\b(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|june?|july?|aug(?:ust)?|"
+                              r"sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b"
+                              r"|\b(?:in|of|for|during|since|until|from|to|through)\s+may\b")
+FOR_VALUE        = re.compile(r"\bfor\s+(?!(?:each|every|all|the|a|an|per)\b)\w")
+FILTER_VALUE_LIMIT = 200   # categorical columns with more distinct values are not searched for literal mentions
+
+METRIC_PURPOSES = ('financial', 'performance_metric', 'volume_metric', 'numeric')
+SUMMED_PURPOSES = ('financial', 'volume_metric', 'numeric')
+
+# Ratio metrics derived from their components when the dataset has no such column:
+# name -> (label, numerator words, denominator words, subtract denominator from numerator)
+DERIVED_METRICS = {
+    "roas": ("ROAS", {"revenue", "sale", "income"}, {"spend", "cost"}, False),
+    "roi": ("ROI", {"revenue", "sale", "income"}, {"spend", "cost"}, True),
+    "ctr": ("CTR", {"click"}, {"impression"}, False),
+    "cpc": ("CPC", {"spend", "cost"}, {"click"}, False),
+}
+
+
+@dataclass
+class Metric:
+    label: str
+    sql: str            # aggregate expression over the base table
+    higher_is_better: bool = True
+
+
+@dataclass
+class Intent:
+    """A recognized question shape: `kind` is trend, extreme_period, top_n or period_change."""
+    kind: str
+    metric: Metric
+    grain: str = "month"
+    dimension: Optional[str] = None
+    n: int = DEFAULT_TOP_N
+    descending: bool = True
+
+
+@dataclass
+class InsightResult:
+    question: str
+    intent: Intent
+    sql: str
+    table: pd.DataFrame
+    summary: str
+    figure: "go.Figure"
+    seconds: float
+    cached: bool = False
+
+
+def _name_score(question_tokens: set, column: str) -> int:
+    """Whole-word (2) and prefix (1) matches between the question and a column name."""
+    name_tokens = set(tokenize(column))
+    score = 2 * len(question_tokens & name_tokens)
+    score += sum(1 for q in question_tokens - name_tokens for n in name_tokens
+                 if len(q) >= 3 and len(n) >= 3 and (n.startswith(q) or q.startswith(n)))
+    return score
+
+
+def _find_column(question_tokens: set, candidates: List[str]) -> Optional[str]:
+    scored = [(_name_score(question_tokens, col), -i, col) for i, col in enumerate(candidates)]
+    best = max(scored, default=(0, 0, None))
+    return best[2] if best[0] > 0 else None
+
+
+def _column_with(words: set, candidates: List[str]) -> Optional[str]:
+    return next((col for col in candidates if set(tokenize(col)) & words), None)
+
+
+def _resolve_metric(question_tokens: set, column_analysis: dict, numeric: List[str]) -> Optional[Metric]:
+    """The metric column the question names, or a ratio derived from its components."""
+    average = bool(question_tokens & AVERAGE_WORDS)
+    total = bool(question_tokens & TOTAL_WORDS)
+    column = _find_column(question_tokens, numeric)
+    derived = next((name for name in DERIVED_METRICS if name in question_tokens), None)
+    if derived and (column is None or derived not in set(tokenize(column))):
+        label, numerator_words, denominator_words, subtract = DERIVED_METRICS[derived]
+        numerator = _column_with(numerator_words, numeric)
+        denominator = _column_with(denominator_words, numeric)
+        if numerator and denominator:
+            num, den = f"SUM({quote_identifier(numerator)})", f"SUM({quote_identifier(denominator)})"
+            expression = f"({num} - {den})" if subtract else num
+            return Metric(label, f"{expression} / NULLIF({den}, 0)", higher_is_better=derived != "cpc")
+    if column is None:
+        return None
+    summed = column_analysis[column]['likely_purpose'] in SUMMED_PURPOSES
+    func = "AVG" if average or (not total and not summed) else "SUM"
+    label = f"{'avg' if func == 'AVG' else 'total'}_{column}"
+    lower_is_better = bool(set(tokenize(column)) & {"cost", "cpc", "cpm", "cpa", "bounce"})
+    return Metric(label, f"{func}({quote_identifier(column)})", higher_is_better=not lower_is_better)
+
+
+def _mentions_value(lowered: str, value: str, column_words: set) -> bool:
+    value = str(value).strip().lower()
+    # Short, numeric or column-name-like values ("3", "total") say nothing about a filter
+    if len(value) < 3 or value.replace(".", "").isdigit() or value in column_words:
+        return False
+    return re.search(rf"(?<![a-z0-9]){re.escape(value)}(?![a-z0-9])", lowered) is not None
+
+
+def mentions_filter(question: str, values: Optional[Dict[str, List[str]]] = None) -> bool:
+    """
+    True when the question restricts the rows: a year or quarter, a month name,
+    a relative period ("last", "this", "previous"), "only"/"for <value>", or a
+    literal value of a categorical column (`values`: column -> distinct values).
+    """
+    lowered = question.lower()
+    if set(re.findall(r"[a-z]+", lowered)) & (RELATIVE_WORDS | FILTER_WORDS):
+        return True
+    if YEAR_PATTERN.search(lowered) or MONTH_PATTERN.search(lowered) or FOR_VALUE.search(lowered):
+        return True
+    column_words = {w for col in (values or {}) for w in re.findall(r"[a-z0-9]+", str(col).lower())}
+    return any(_mentions_value(lowered, value, column_words)
+               for column_values in (values or {}).values() for value in column_values)
+
+
+def match_intent(question: str, column_analysis: dict, types: dict,
+                 values: Optional[Dict[str, List[str]]] = None) -> Optional[Intent]:
+    """
+    Recognizes templated question shapes against the column tags; returns None
+    for open-ended questions, questions that filter the rows (see mentions_filter)
+    or when the data lacks the columns the shape needs.
+    `types` maps columns to their DuckDB types (see rollup_utils.column_types).
+    """
+    lowered = question.lower()
+    question_tokens = set(tokenize(question)) | {w for w in re.findall(r"[a-z]+", lowered)}
+    if question_tokens & OPEN_ENDED_WORDS or mentions_filter(question, values):
+        return None
+
+    numeric = [col for col, info in column_analysis.items()
+               if info['likely_purpose'] in METRIC_PURPOSES and NUMERIC_TYPES.match(types.get(col, ''))]
+    metric = _resolve_metric(question_tokens, column_analysis, numeric)
+    if metric is None:
+        return None
+
+    categorical = [col for col, info in column_analysis.items() if info['likely_purpose'] == 'categorical']
+    dimension = _find_column(question_tokens, categorical)
+    time_column = find_time_column(types, column_analysis)
+    asked_grains = [grain for grain, words in GRAIN_WORDS.items() if question_tokens & words]
+    phrase = PERIOD_PHRASES.search(lowered)
+    grain = asked_grains[0] if asked_grains else (phrase.group(1) if phrase and phrase.group(1) else "month")
+    ranked = bool(question_tokens & (TOP_WORDS | BOTTOM_WORDS))
+    descending = not (question_tokens & BOTTOM_WORDS)
+    if not metric.higher_is_better and question_tokens & {"best", "worst"}:
+        descending = not descending
+
+    if "over" in lowered and re.search(r"\b(day|week|month)[- ]over[- ]\1\b", lowered):
+        grain = re.search(r"\b(day|week|month)[- ]over[- ]\1\b", lowered).group(1)
+        return Intent("period_change", metric, grain) if time_column else None
+    if question_tokens & CHANGE_WORDS and time_column:
+        return Intent("period_change", metric, grain)
+    if ranked and dimension:
+        n = next((int(w) for w in re.findall(r"\b(\d{1,3})\b", lowered) if 0 < int(w) <= 100), DEFAULT_TOP_N)
+        return Intent("top_n", metric, dimension=dimension, n=n, descending=descending)
+    if ranked and asked_grains and time_column:
+        return Intent("extreme_period", metric, grain, descending=descending)
+    if (asked_grains or phrase) and time_column:
+        return Intent("trend", metric, grain)
+    return None
+
+
+def build_intent_sql(intent: Intent, table: str, time_column: Optional[str]) -> str:
+    metric = f"{intent.metric.sql} AS {quote_identifier(intent.metric.label)}"
+    if intent.kind == "top_n":
+        dimension = quote_identifier(intent.dimension)
+        order = "DESC" if intent.descending else "ASC"
+        return (f"SELECT {dimension}, {metric} FROM {quote_identifier(table)} WHERE {dimension} IS NOT NULL "
+                f"GROUP BY 1 ORDER BY 2 {order} NULLS LAST LIMIT {intent.n}")
+    time_sql = quote_identifier(time_column)
+    period = f"CAST(date_trunc({quote_literal(intent.grain)}, {time_sql}) AS DATE)"
+    return (f"SELECT {period} AS period, {metric} FROM {quote_identifier(table)} "
+            f"WHERE {time_sql} IS NOT NULL GROUP BY 1 ORDER BY 1")
+
+
+def _fmt(value) -> str:
+    return "n/a" if pd.isna(value) else f"{value:,.2f}"
+
+
+def _summarize(intent: Intent, table: pd.DataFrame) -> str:
+    label = intent.metric.label
+    if table.empty:
+        return "No rows matched this question."
+    values = table[label]
+    if intent.kind == "top_n":
+        first = table.iloc[0]
+        which = "Top" if intent.descending else "Bottom"
+        return (f"**{which} {len(table)} {intent.dimension} by {label}.** "
+                f"#1 is **{first[intent.dimension]}** with {_fmt(first[label])}.")
+    periods = table["period"].astype(str)
+    if intent.kind == "extreme_period":
+        best = values.idxmax() if intent.descending else values.idxmin()
+        other = values.idxmin() if intent.descending else values.idxmax()
+        which, opposite = ("Highest", "lowest") if intent.descending else ("Lowest", "highest")
+        return (f"**{which} {intent.grain}: {periods[best]}** with {label} = {_fmt(values[best])} "
+                f"({opposite}: {periods[other]}, {_fmt(values[other])}).")
+    if intent.kind == "period_change":
+        if len(table) < 2:
+            return f"Only one {intent.grain} of data; no change to report."
+        last, previous = table.iloc[-1], table.iloc[-2]
+        return (f"**{label}: {_fmt(last[label])} in {periods.iloc[-1]}** vs {_fmt(previous[label])} in "
+                f"{periods.iloc[-2]} ({_fmt(last['change_pct'])}% {intent.grain}-over-{intent.grain}).")
+    return (f"**{label} per {intent.grain}** across {len(table)} periods: mean {_fmt(values.mean())}, "
+            f"peak {_fmt(values.max())} in {periods[values.idxmax()]}.")
+
+
+def _figure(intent: Intent, table: pd.DataFrame) -> "go.Figure":
+    import plotly.graph_objects as go  # plotly loads with the first chart, not with the backend
+    label = intent.metric.label
+    if intent.kind == "top_n":
+        fig = go.Figure(go.Bar(x=table[label][::-1], y=table[intent.dimension].astype(str)[::-1], orientation='h'))
+        fig.update_layout(title=f"{label} by {intent.dimension}", xaxis_title=label)
+        return fig
+    if intent.kind == "extreme_period" and not table.empty:
+        best = table[label].idxmax() if intent.descending else table[label].idxmin()
+        colors = ['#d62728' if i == best else '#1f77b4' for i in table.index]
+        fig = go.Figure(go.Bar(x=table["period"], y=table[label], marker_color=colors))
+    else:
+        fig = go.Figure(go.Scatter(x=table["period"], y=table[label], mode='lines+markers', name=label))
+    fig.update_layout(title=f"{label} per {intent.grain}", xaxis_title="period", yaxis_title=label)
+    return fig
+
+
+def category_values(conn: duckdb.DuckDBPyConnection, table: str, column_analysis: dict,
+                    dataset_key: Optional[str] = None) -> Dict[str, List[str]]:
+    """Distinct values of the low-cardinality categorical columns, for spotting filters in questions."""
+    columns = [col for col, info in column_analysis.items()
+               if info['likely_purpose'] == 'categorical' and 0 < (info.get('unique_count') or 0) <= FILTER_VALUE_LIMIT]
+    if not columns:
+        return {}
+    sql = " UNION ALL ".join(
+        f"(SELECT {quote_literal(col)} AS column_name, CAST({quote_identifier(col)} AS VARCHAR) AS value "
+        f"FROM {quote_identifier(table)} WHERE {quote_identifier(col)} IS NOT NULL "
+        f"GROUP BY 2 LIMIT {FILTER_VALUE_LIMIT})"
+        for col in columns
+    )
+    if dataset_key is not None:
+        result = get_query_cache().execute(conn, sql, dataset_key)[0]
+    else:
+        result = conn.execute(sql).df()
+    return {col: group["value"].tolist() for col, group in result.groupby("column_name")}
+
+
+@traced("fast_answer")
+def answer_question(
+    conn: duckdb.DuckDBPyConnection,
+    question: str,
+    column_analysis: dict,
+    table: str = "marketing_data",
+    dataset_key: Optional[str] = None,
+) -> Optional[InsightResult]:
+    """
+    Answers a templated question directly from the dataset table, or returns
+    None when the question needs the LLM. Queries go through the SQL guard and,
+    with a `dataset_key`, the result cache.
+    """
+    started = time.perf_counter()
+    types = column_types(conn, table)
+    intent = match_intent(question, column_analysis, types)
+    # Category values are only looked up for questions that match a template otherwise
+    if intent is not None and mentions_filter(question, category_values(conn, table, column_analysis, dataset_key)):
+        intent = None
+    if intent is None:
+        return None
+    sql = build_intent_sql(intent, table, find_time_column(types, column_analysis))
+    if dataset_key is not None:
+        result, cached, _ = get_query_cache().execute(conn, sql, dataset_key, run=lambda: guarded_execute(conn, sql))
+    else:
+        result, cached = guarded_execute(conn, sql), False
+    result = result.copy()
+    if intent.kind == "period_change":
+        result["change_pct"] = result[intent.metric.label].pct_change() * 100
+    seconds = time.perf_counter() - started
+    logger.info(f"Fast path answered a {intent.kind} question in {seconds * 1000:.0f} ms")
+    return InsightResult(question, intent, sql, result, _summarize(intent, result), _figure(intent, result),
+                         seconds, cached)
+
+
+def build_narrative_prompt(result: InsightResult) -> str:
+    # Fixed decimals, not significant digits, so large totals stay as computed
+    figures = result.table.round(6).to_csv(index=False)
+    return f"""
+You are a senior marketing analyst. The user asked: "{result.question}"
+
+These figures were computed exactly from the full dataset; do not change or invent numbers:
+{figures}
+
+Headline: {result.summary}
+
+Write a short narrative (3–5 bullet points) explaining what the figures show, with the exact numbers,
+and one suggested next step. Return only markdown.
+"""
+
+
+def stream_narrative(result: InsightResult) -> Iterator[str]:
+    """Optional LLM narrative layered on top of the exact figures."""
+    return stream_gemini(build_narrative_prompt(result))
@@ -0,0 +1,159 @@
+# File: src/Test_red/app_backend/llm_cache.py
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+from .cache_utils import CACHE_DIR
+
+# ────────────────────────────────────────────────────────────────────────────────
+# CACHE SETTINGS (overridable through environment variables)
+# ────────────────────────────────────────────────────────────────────────────────
+LLM_CACHE_PATH        = os.getenv("GROWIFY_LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_cache.sqlite"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("GROWIFY_LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_MB      = float(os.getenv("GROWIFY_LLM_CACHE_MAX_MB", "256"))
+LLM_CACHE_BYPASS      = os.getenv("GROWIFY_LLM_CACHE_BYPASS", "0") == "1"
+
+# Responses the API clients return on failure; these must never be cached
+ERROR_RESPONSE_PREFIXES = ("Error generating",)
+
+_bypass = contextvars.ContextVar("llm_cache_bypass", default=LLM_CACHE_BYPASS)
+
+
+@contextmanager
+def llm_cache_bypass(enabled: bool = True):
+    """Skips cache reads and writes for LLM calls made inside the block (per thread/context)."""
+    token = _bypass.set(enabled)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def set_cache_bypass(enabled: bool) -> None:
+    """Turns the bypass on/off for the current thread/context (e.g. one Streamlit script run)."""
+    _bypass.set(enabled)
+
+
+def is_cache_bypassed() -> bool:
+    return _bypass.get()
+
+
+class LLMResponseCache:
+    """
+    SQLite-backed cache of LLM completions keyed by (model, prompt hash, max_tokens, temperature).
+    Entries expire after `ttl_seconds`; once the stored text exceeds `max_bytes`
+    the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+                 max_mb: float = LLM_CACHE_MAX_MB):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER,"
+                " created REAL, last_access REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation keeps the cache safe across Streamlit threads
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, max_tokens: Optional[int] = None,
+                 temperature: Optional[float] = None) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{model}|{prompt_hash}|{max_tokens}|{temperature}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if row is None else row[0]
+
+    def put(self, key: str, model: str, response: str) -> None:
+        if not response or response.startswith(ERROR_RESPONSE_PREFIXES):
+            return
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            if total - freed <= self.max_bytes:
+                break
+            stale.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": entries,
+                "size_mb": round(size / (1024 * 1024), 3),
+            }
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Process-wide response cache shared by all API clients."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache()
+        return _cache
@@ -0,0 +1,210 @@
+# File: src/Test_red/app_backend/pipeline.py
+
+import os
+import re
+import time
+import queue
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from .analysis_utils import (
+    analyze_marketing_question,
+    polish_with_gemini,
+    stream_marketing_question,
+    stream_polish_with_gemini,
+)
+from .profile_utils import DatasetProfile
+from .sql_utils import generate_sql_query
+from .trace_utils import span
+
+# Opt-in: once the streamed analysis reaches this heading (e.g. "Step 7"), the Gemini
+# polish starts from the partial text. Off by default because the polish report's root
+# cause, recommendation and risk sections draw on the later steps. Empty = wait for the full analysis.
+EARLY_POLISH_MARKER = os.getenv("GROWIFY_EARLY_POLISH_MARKER", "")
+
+
+@dataclass
+class PipelineTask:
+    """One node of the question DAG: `func` receives the results of `deps` as positional args."""
+    func: Callable[..., Any]
+    deps: List[str] = field(default_factory=list)
+
+
+@dataclass
+class StageResult:
+    name: str
+    result: Any = None
+    error: Optional[BaseException] = None
+    seconds: float = 0.0
+    first_token: Optional[float] = None
+
+
+def run_dag(tasks: Dict[str, PipelineTask], max_workers: int = 4) -> Iterator[StageResult]:
+    """
+    Runs independent tasks concurrently and starts each dependent task the moment
+    its inputs are ready. Yields a StageResult per task in completion order, so the
+    caller can render each one while the rest are still running. Tasks whose
+    dependencies failed are skipped and reported with the upstream error.
+
+    Tasks run in a copy of the caller's context, so context variables (such as the
+    LLM cache bypass and trace IDs) apply inside worker threads too.
+    Each task runs in a span named after it.
+    """
+    done: Dict[str, StageResult] = {}
+    finished: "queue.Queue[StageResult]" = queue.Queue()
+    started = set()
+    context = contextvars.copy_context()
+
+    def traced(name: str, func: Callable[..., Any], *args) -> Any:
+        with span(name):
+            return func(*args)
+
+    def execute(name: str) -> None:
+        task = tasks[name]
+        begin = time.perf_counter()
+        try:
+            result = context.copy().run(traced, name, task.func, *(done[dep].result for dep in task.deps))
+            finished.put(StageResult(name, result=result, seconds=time.perf_counter() - begin))
+        except BaseException as e:  # surfaced to the caller through StageResult.error
+            finished.put(StageResult(name, error=e, seconds=time.perf_counter() - begin))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        def submit_ready() -> None:
+            for name, task in tasks.items():
+                if name in started or not all(dep in done for dep in task.deps):
+                    continue
+                started.add(name)
+                failed = next((done[dep] for dep in task.deps if done[dep].error is not None), None)
+                if failed is not None:
+                    finished.put(StageResult(name, error=failed.error))
+                else:
+                    pool.submit(execute, name)
+
+        submit_ready()
+        while len(done) < len(tasks):
+            stage = finished.get()
+            done[stage.name] = stage
+            submit_ready()
+            yield stage
+
+
+def run_question_pipeline(
+    df: pd.DataFrame,
+    question: str,
+    summary_text: str,
+    column_analysis: dict,
+    profile: Optional[DatasetProfile] = None,
+    rollups: Optional[list] = None,
+    rollup_context: str = "",
+) -> Iterator[StageResult]:
+    """
+    The question flow as a DAG: analysis (Together) and SQL generation (Together)
+    run in parallel, and the Gemini polish starts as soon as the analysis lands.
+    Wall-clock time is max(analysis + polish, sql) instead of the sum of all three.
+    """
+    tasks = {
+        "analysis": PipelineTask(lambda: analyze_marketing_question(df, question, summary_text, profile=profile,
+                                                                    column_analysis=column_analysis,
+                                                                    rollup_context=rollup_context)),
+        "sql": PipelineTask(lambda: generate_sql_query(question, df, column_analysis, rollups)),
+        "polish": PipelineTask(lambda analysis: polish_with_gemini(question, analysis, summary_text), deps=["analysis"]),
+    }
+    return run_dag(tasks)
+
+
+@dataclass
+class StageEvent:
+    """
+    One update from the streaming pipeline: `token` carries a text delta,
+    `done` the stage's full result and `error` the exception that stopped it.
+    """
+    stage: str
+    kind: str
+    text: Any = None
+    seconds: float = 0.0
+
+
+def stream_question_pipeline(
+    df: pd.DataFrame,
+    question: str,
+    summary_text: str,
+    column_analysis: dict,
+    profile: Optional[DatasetProfile] = None,
+    rollups: Optional[list] = None,
+    rollup_context: str = "",
+    early_polish_marker: str = EARLY_POLISH_MARKER,
+) -> Iterator[StageEvent]:
+    """
+    Streaming counterpart of run_question_pipeline. The analysis and the polish
+    are streamed token by token while SQL generation runs in the background;
+    all updates arrive on one iterator so the caller renders them from a single
+    thread. The polish starts when the analysis completes, or, if `early_polish_marker`
+    is set, as soon as a line of the analysis starts with it (a heading, not a mention).
+    """
+    events: "queue.Queue[StageEvent]" = queue.Queue()
+    # The marker counts only at the start of a line, after optional markdown heading/bold characters
+    marker = re.compile(rf"^[ \t#*>]*{re.escape(early_polish_marker)}", re.MULTILINE) if early_polish_marker else None
+    context = contextvars.copy_context()
+    polish_started = threading.Event()
+
+    def run_stage(stage: str, body: Callable[[float], Any]) -> None:
+        begin = time.perf_counter()
+        try:
+            with span(stage):
+                result = body(begin)
+            events.put(StageEvent(stage, "done", result, time.perf_counter() - begin))
+        except BaseException as e:  # surfaced to the caller through the error event
+            events.put(StageEvent(stage, "error", e, time.perf_counter() - begin))
+
+    def start(stage: str, body: Callable[[float], Any]) -> None:
+        threading.Thread(target=context.copy().run, args=(run_stage, stage, body), daemon=True).start()
+
+    def polish(source: str) -> Callable[[float], str]:
+        def body(begin: float) -> str:
+            parts = []
+            for token in stream_polish_with_gemini(question, source, summary_text):
+                parts.append(token)
+                events.put(StageEvent("polish", "token", token, time.perf_counter() - begin))
+            return "".join(parts)
+        return body
+
+    def start_polish(source: str) -> None:
+        if not polish_started.is_set():
+            polish_started.set()
+            start("polish", polish(source))
+
+    def analysis(begin: float) -> str:
+        text = ""
+        try:
+            for token in stream_marketing_question(df, question, summary_text, profile=profile,
+                                                   column_analysis=column_analysis, rollup_context=rollup_context):
+                # Only the last line before this token can be completed into a heading by it
+                search_from = text.rfind("\n") + 1
+                text += token
+                events.put(StageEvent("analysis", "token", token, time.perf_counter() - begin))
+                if marker is not None and not polish_started.is_set():
+                    match = marker.search(text, search_from)
+                    if match and match.start() > 0:
+                        start_polish(text[:match.start()])
+        except BaseException as e:
+            if not polish_started.is_set():
+                polish_started.set()
+                events.put(StageEvent("polish", "error", e))
+            raise
+        start_polish(text)
+        return text
+
+    start("analysis", analysis)
+    start("sql", lambda begin: generate_sql_query(question, df, column_analysis, rollups))
+
+    pending = {"analysis", "sql", "polish"}
+    while pending:
+        event = events.get()
+        if event.kind != "token":
+            pending.discard(event.stage)
+        yield event
@@ -0,0 +1,437 @@
+# File: src/Test_red/app_backend/profile_utils.py
+
+import threading
+import warnings
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .compact_utils import logical_dtype
+from .sketch_utils import HyperLogLog, KLLSketch, SpaceSaving
+from .trace_utils import traced
+
+NUMERIC_BATCH_COLUMNS = 32   # numeric columns reduced together in one 2-D block
+SAMPLE_VALUES = 5
+PROFILE_CACHE_SIZE = 16
+
+
+@dataclass
+class ColumnProfile:
+    """All per-column statistics used by the sidebar, charts and LLM prompts."""
+    name: str
+    dtype: str
+    kind: str                               # "numeric" | "datetime" | "text"
+    null_count: int = 0
+    unique_count: int = 0
+    sample_values: list = field(default_factory=list)
+    count: int = 0
+    sum: Optional[float] = None
+    min: Optional[float] = None
+    q25: Optional[float] = None
+    median: Optional[float] = None
+    q75: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+    std: Optional[float] = None
+    min_date: Optional[str] = None
+    max_date: Optional[str] = None
+    year_counts: Dict[int, int] = field(default_factory=dict)
+    top_categories: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class DatasetProfile:
+    """Column profiles for one dataset version, computed once and shared by every consumer."""
+    n_rows: int
+    columns: Dict[str, ColumnProfile]
+
+    @property
+    def total_nulls(self) -> int:
+        return sum(p.null_count for p in self.columns.values())
+
+    def null_percentage(self, col: str) -> float:
+        return (self.columns[col].null_count / self.n_rows * 100) if self.n_rows > 0 else 0.0
+
+
+def _sample_values(series: pd.Series) -> list:
+    """First non-null values, looking only at the head of the column when possible."""
+    head = series.iloc[:1000].dropna()
+    if len(head) < SAMPLE_VALUES and len(series) > 1000:
+        head = series.dropna()
+    return head.head(SAMPLE_VALUES).tolist()
+
+
+def _sorted_stats(sorted_block: np.ndarray, counts: np.ndarray) -> dict:
+    """
+    Order statistics for every column of a block sorted along axis 0 with NaNs last:
+    min/max, linear-interpolated quartiles (as pandas describe) and distinct counts.
+    """
+    n_rows, n_cols = sorted_block.shape
+    cols = np.arange(n_cols)
+    has_values = counts > 0
+    last = np.maximum(counts - 1, 0)
+    stats = {
+        "min": np.where(has_values, sorted_block[0, cols], np.nan),
+        "max": np.where(has_values, sorted_block[last, cols], np.nan),
+    }
+    for name, q in (("q25", 0.25), ("median", 0.5), ("q75", 0.75)):
+        pos = last * q
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        lo_val = sorted_block[lo, cols]
+        hi_val = sorted_block[hi, cols]
+        stats[name] = np.where(has_values, lo_val + (hi_val - lo_val) * (pos - lo), np.nan)
+    if n_rows > 1:
+        changes = np.diff(sorted_block, axis=0) != 0
+        in_range = np.arange(n_rows - 1)[:, None] < last[None, :]
+        stats["unique"] = (changes & in_range).sum(axis=0) + has_values
+    else:
+        stats["unique"] = has_values.astype(np.int64)
+    return stats
+
+
+def _profile_numeric(df: pd.DataFrame, numeric_cols: List[str], profiles: Dict[str, ColumnProfile]) -> None:
+    n = len(df)
+    for start in range(0, len(numeric_cols), NUMERIC_BATCH_COLUMNS):
+        batch = numeric_cols[start:start + NUMERIC_BATCH_COLUMNS]
+        block = df[batch].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(block)
+        counts = valid.sum(axis=0)
+        sums = np.where(valid, block, 0.0).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+            sq_dev = np.where(valid, (block - means) ** 2, 0.0).sum(axis=0)
+            stds = np.sqrt(sq_dev / (counts - 1))
+        block.sort(axis=0)  # NaNs sort to the end
+        stats = _sorted_stats(block, counts)
+        for i, col in enumerate(batch):
+            p = profiles[col]
+            p.count = int(counts[i])
+            p.null_count = n - p.count
+            p.unique_count = int(stats["unique"][i])
+            if p.count:
+                p.sum = float(sums[i])
+                p.mean = float(means[i])
+                p.std = float(stds[i])
+                for name in ("min", "q25", "median", "q75", "max"):
+                    setattr(p, name, float(stats[name][i]))
+
+
+def _profile_datetime(series: pd.Series, p: ColumnProfile) -> None:
+    values = series.to_numpy(dtype='datetime64[ns]')
+    valid = ~np.isnat(values)
+    p.count = int(valid.sum())
+    p.null_count = len(series) - p.count
+    if not p.count:
+        return
+    ordinals = np.sort(values[valid].view(np.int64))
+    p.unique_count = int((np.diff(ordinals) != 0).sum() + 1)
+    p.min_date = str(pd.Timestamp(ordinals[0]))
+    p.max_date = str(pd.Timestamp(ordinals[-1]))
+    years = ordinals.astype('datetime64[ns]').astype('datetime64[Y]').astype(np.int64) + 1970
+    year_values, year_counts = np.unique(years, return_counts=True)
+    p.year_counts = {int(y): int(c) for y, c in zip(year_values, year_counts)}
+
+
+def _profile_text(series: pd.Series, p: ColumnProfile, max_categories: int) -> None:
+    counts = series.value_counts(dropna=True)
+    p.count = int(counts.sum())
+    p.null_count = len(series) - p.count
+    p.unique_count = int(len(counts))
+    p.top_categories = {str(k): int(v) for k, v in counts.head(max_categories).items()}
+
+
+@traced("profile")
+def profile_dataframe(df: pd.DataFrame, max_categories: int = 5) -> DatasetProfile:
+    """
+    Profiles every column of a cleaned DataFrame in one pass per column family:
+    numeric columns are reduced together as 2-D NumPy blocks (a single sort yields
+    min/max/quartiles/distinct counts), datetimes and text get one pass each.
+    """
+    profiles = {}
+    numeric_cols = []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series):
+            kind = "numeric"
+            numeric_cols.append(col)
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            kind = "datetime"
+        else:
+            kind = "text"
+        profiles[col] = ColumnProfile(name=col, dtype=logical_dtype(series.dtype), kind=kind,
+                                      sample_values=_sample_values(series))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        _profile_numeric(df, numeric_cols, profiles)
+    for col, p in profiles.items():
+        if p.kind == "datetime":
+            _profile_datetime(df[col], p)
+        elif p.kind == "text":
+            _profile_text(df[col], p, max_categories)
+    return DatasetProfile(n_rows=len(df), columns=profiles)
+
+
+_profile_cache = OrderedDict()
+_profile_lock = threading.Lock()
+
+
+def _memoized_profile(dataset_key: str, compute) -> DatasetProfile:
+    with _profile_lock:
+        if dataset_key in _profile_cache:
+            _profile_cache.move_to_end(dataset_key)
+            return _profile_cache[dataset_key]
+    profile = compute()
+    with _profile_lock:
+        _profile_cache[dataset_key] = profile
+        while len(_profile_cache) > PROFILE_CACHE_SIZE:
+            _profile_cache.popitem(last=False)
+    return profile
+
+
+def get_dataset_profile(df: pd.DataFrame, dataset_key: str) -> DatasetProfile:
+    """Memoized profile_dataframe: each dataset version is profiled only once per process."""
+    return _memoized_profile(dataset_key, lambda: profile_dataframe(df))
+
+
+def get_table_profile(conn, table: str, dataset_key: str) -> DatasetProfile:
+    """Memoized profile_duckdb_table, sharing the per-dataset-version cache."""
+    return _memoized_profile(dataset_key, lambda: profile_duckdb_table(conn, table))
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# STREAMING PROFILING (chunk by chunk, constant memory)
+# ────────────────────────────────────────────────────────────────────────────────
+class _StreamingColumn:
+    """Running statistics for one column; every field is mergeable across chunks."""
+
+    def __init__(self, name: str, dtype: str, kind: str):
+        self.profile = ColumnProfile(name=name, dtype=dtype, kind=kind)
+        self.distinct = HyperLogLog()
+        self.quantiles = KLLSketch() if kind == "numeric" else None
+        self.heavy_hitters = SpaceSaving() if kind == "text" else None
+        self.m2 = 0.0  # sum of squared deviations (Chan et al. parallel variance)
+        self.min_date = None
+        self.max_date = None
+
+    def update(self, series: pd.Series) -> None:
+        p = self.profile
+        valid = series.dropna()
+        p.null_count += len(series) - len(valid)
+        if len(p.sample_values) < SAMPLE_VALUES:
+            p.sample_values += valid.head(SAMPLE_VALUES - len(p.sample_values)).tolist()
+        self.distinct.update(valid)
+        if valid.empty:
+            return
+        if p.kind == "numeric":
+            values = valid.to_numpy(dtype=np.float64)
+            n_a, n_b = p.count, len(values)
+            mean_b = float(values.mean())
+            m2_b = float(((values - mean_b) ** 2).sum())
+            mean_a = p.mean or 0.0
+            delta = mean_b - mean_a
+            p.mean = mean_a + delta * n_b / (n_a + n_b)
+            self.m2 += m2_b + delta * delta * n_a * n_b / (n_a + n_b)
+            p.sum = (p.sum or 0.0) + float(values.sum())
+            p.min = float(values.min()) if p.min is None else min(p.min, float(values.min()))
+            p.max = float(values.max()) if p.max is None else max(p.max, float(values.max()))
+            self.quantiles.update(values)
+        elif p.kind == "datetime":
+            low, high = valid.min(), valid.max()
+            self.min_date = low if self.min_date is None else min(self.min_date, low)
+            self.max_date = high if self.max_date is None else max(self.max_date, high)
+            for year, count in valid.dt.year.value_counts().items():
+                p.year_counts[int(year)] = p.year_counts.get(int(year), 0) + int(count)
+        else:
+            self.heavy_hitters.update(valid)
+        p.count += len(valid)
+
+    def to_dict(self) -> dict:
+        """JSON-safe state (sample values of non-numeric types become strings)."""
+        return {
+            "profile": asdict(self.profile),
+            "distinct": self.distinct.to_dict(),
+            "quantiles": self.quantiles.to_dict() if self.quantiles is not None else None,
+            "heavy_hitters": self.heavy_hitters.to_dict() if self.heavy_hitters is not None else None,
+            "m2": self.m2,
+            "min_date": None if self.min_date is None else str(self.min_date),
+            "max_date": None if self.max_date is None else str(self.max_date),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "_StreamingColumn":
+        profile = ColumnProfile(**data["profile"])
+        profile.year_counts = {int(year): int(count) for year, count in profile.year_counts.items()}
+        column = cls(profile.name, profile.dtype, profile.kind)
+        column.profile = profile
+        column.distinct = HyperLogLog.from_dict(data["distinct"])
+        column.quantiles = KLLSketch.from_dict(data["quantiles"]) if data["quantiles"] is not None else None
+        column.heavy_hitters = SpaceSaving.from_dict(data["heavy_hitters"]) if data["heavy_hitters"] is not None else None
+        column.m2 = float(data["m2"])
+        column.min_date = None if data["min_date"] is None else pd.Timestamp(data["min_date"])
+        column.max_date = None if data["max_date"] is None else pd.Timestamp(data["max_date"])
+        return column
+
+    def snapshot(self, max_categories: int) -> ColumnProfile:
+        p = ColumnProfile(**{**self.profile.__dict__, "sample_values": list(self.profile.sample_values),
+                             "year_counts": dict(sorted(self.profile.year_counts.items()))})
+        p.unique_count = min(self.distinct.estimate(), p.count)
+        if p.kind == "numeric" and p.count:
+            p.std = float(np.sqrt(self.m2 / (p.count - 1))) if p.count > 1 else float("nan")
+            p.q25, p.median, p.q75 = self.quantiles.quantiles([0.25, 0.5, 0.75])
+        elif p.kind == "datetime" and p.count:
+            p.min_date, p.max_date = str(self.min_date), str(self.max_date)
+        elif p.kind == "text":
+            p.top_categories = self.heavy_hitters.top(max_categories)
+        return p
+
+
+class StreamingProfiler:
+    """
+    Profiles a dataset chunk by chunk with mergeable sketches: HyperLogLog for
+    distinct counts, KLL for quartiles and space-saving for top categories.
+    Memory stays constant however many chunks are fed in.
+    """
+
+    def __init__(self, max_categories: int = 5):
+        self.max_categories = max_categories
+        self.n_rows = 0
+        self._columns: Dict[str, _StreamingColumn] = {}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        for col in chunk.columns:
+            series = chunk[col]
+            if col not in self._columns:
+                if pd.api.types.is_numeric_dtype(series):
+                    kind = "numeric"
+                elif pd.api.types.is_datetime64_any_dtype(series):
+                    kind = "datetime"
+                else:
+                    kind = "text"
+                self._columns[col] = _StreamingColumn(col, str(series.dtype), kind)
+            self._columns[col].update(series)
+        self.n_rows += len(chunk)
+
+    def to_dict(self) -> dict:
+        """Sketch state as plain JSON types, so it can be stored without pickle."""
+        return {"max_categories": self.max_categories, "n_rows": self.n_rows,
+                "columns": {col: state.to_dict() for col, state in self._columns.items()}}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StreamingProfiler":
+        profiler = cls(int(data["max_categories"]))
+        profiler.n_rows = int(data["n_rows"])
+        profiler._columns = {col: _StreamingColumn.from_dict(state) for col, state in data["columns"].items()}
+        return profiler
+
+    def snapshot(self) -> DatasetProfile:
+        """Current profile of everything seen so far."""
+        return DatasetProfile(
+            n_rows=self.n_rows,
+            columns={col: state.snapshot(self.max_categories) for col, state in self._columns.items()},
+        )
+
+
+def remember_profile(dataset_key: str, profile: DatasetProfile) -> None:
+    """Seeds the per-dataset profile cache, e.g. with the final streaming snapshot."""
+    with _profile_lock:
+        _profile_cache[dataset_key] = profile
+        _profile_cache.move_to_end(dataset_key)
+        while len(_profile_cache) > PROFILE_CACHE_SIZE:
+            _profile_cache.popitem(last=False)
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# DUCKDB PROFILING (tables that never fit in pandas)
+# ────────────────────────────────────────────────────────────────────────────────
+_DUCKDB_DTYPES = {
+    "VARCHAR": "object", "BOOLEAN": "bool", "DOUBLE": "float64", "FLOAT": "float32",
+    "BIGINT": "int64", "INTEGER": "int32", "SMALLINT": "int16", "TINYINT": "int8",
+    "TIMESTAMP": "datetime64[ns]", "DATE": "datetime64[ns]",
+}
+_DUCKDB_NUMERIC_PREFIXES = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT",
+                            "USMALLINT", "UINTEGER", "UBIGINT", "FLOAT", "DOUBLE", "DECIMAL", "BOOLEAN")
+
+
+def _duckdb_kind(column_type: str) -> str:
+    if column_type.startswith(_DUCKDB_NUMERIC_PREFIXES):
+        return "numeric"
+    if column_type.startswith(("TIMESTAMP", "DATE")):
+        return "datetime"
+    return "text"
+
+
+@traced("profile")
+def profile_duckdb_table(conn, table: str, max_categories: int = 5) -> DatasetProfile:
+    """
+    Builds the same DatasetProfile from a DuckDB table with one aggregate query
+    (plus one grouped query for categories and years), so only aggregates reach pandas.
+    Distinct counts and quartiles use DuckDB's approximate aggregates to keep memory flat.
+    """
+    from .sql_utils import quote_identifier
+
+    table_sql = quote_identifier(table)
+    schema = conn.execute(f"DESCRIBE {table_sql}").fetchall()
+    profiles = {}
+    selects = ["count(*)"]
+    for name, column_type, *_ in schema:
+        kind = _duckdb_kind(column_type)
+        profiles[name] = ColumnProfile(name=name, dtype=_DUCKDB_DTYPES.get(column_type, column_type.lower()), kind=kind)
+        col = quote_identifier(name)
+        selects += [f"count({col})", f"approx_count_distinct({col})"]
+        if kind == "numeric":
+            value = f"CAST({col} AS DOUBLE)"
+            selects += [f"sum({value})", f"min({value})", f"max({value})", f"avg({value})",
+                        f"stddev_samp({value})", f"approx_quantile({value}, [0.25, 0.5, 0.75])"]
+        elif kind == "datetime":
+            selects += [f"CAST(min({col}) AS TIMESTAMP)", f"CAST(max({col}) AS TIMESTAMP)"]
+    row = list(conn.execute(f"SELECT {', '.join(selects)} FROM {table_sql}").fetchone())
+
+    n_rows = int(row.pop(0))
+    for p in profiles.values():
+        p.count, p.unique_count = int(row.pop(0)), int(row.pop(0))
+        p.null_count = n_rows - p.count
+        if p.kind == "numeric":
+            p.sum, p.min, p.max, p.mean, p.std, quartiles = (row.pop(0) for _ in range(6))
+            if quartiles is not None:
+                p.q25, p.median, p.q75 = (float(q) for q in quartiles)
+        elif p.kind == "datetime":
+            low, high = row.pop(0), row.pop(0)
+            if low is not None:
+                p.min_date, p.max_date = str(pd.Timestamp(low)), str(pd.Timestamp(high))
+
+    grouped = []
+    for name, p in profiles.items():
+        col = quote_identifier(name)
+        if p.kind == "text":
+            grouped.append(
+                f"(SELECT {len(grouped)} AS q, CAST({col} AS VARCHAR) AS k, count(*) AS n FROM {table_sql} "
+                f"WHERE {col} IS NOT NULL GROUP BY 2 ORDER BY 3 DESC, 2 LIMIT {int(max_categories)})"
+            )
+        elif p.kind == "datetime":
+            grouped.append(
+                f"(SELECT {len(grouped)} AS q, CAST(year({col}) AS VARCHAR) AS k, count(*) AS n FROM {table_sql} "
+                f"WHERE {col} IS NOT NULL GROUP BY 2 ORDER BY 2)"
+            )
+    if grouped:
+        targets = [p for p in profiles.values() if p.kind in ("text", "datetime")]
+        for q, key, count in conn.execute(" UNION ALL ".join(grouped)).fetchall():
+            p = targets[q]
+            if p.kind == "text":
+                p.top_categories[key] = int(count)
+            else:
+                p.year_counts[int(key)] = int(count)
+        for p in targets:
+            if p.kind == "text":
+                p.top_categories = dict(sorted(p.top_categories.items(), key=lambda kv: -kv[1]))
+            else:
+                p.year_counts = dict(sorted(p.year_counts.items()))
+
+    head = conn.execute(f"SELECT * FROM {table_sql} LIMIT 1000").df()
+    for name, p in profiles.items():
+        p.sample_values = _sample_values(head[name])
+    return DatasetProfile(n_rows=n_rows, columns=profiles)
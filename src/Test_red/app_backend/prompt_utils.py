@@ -0,0 +1,146 @@
+# File: src/Test_red/app_backend/prompt_utils.py
+
+import os
+import re
+import math
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Optional, Set
+
+# ────────────────────────────────────────────────────────────────────────────────
+# PROMPT BUDGETS (overridable through environment variables)
+# ────────────────────────────────────────────────────────────────────────────────
+ANALYSIS_PROMPT_TOKENS = int(os.getenv("GROWIFY_ANALYSIS_PROMPT_TOKENS", "6000"))
+SQL_PROMPT_TOKENS      = int(os.getenv("GROWIFY_SQL_PROMPT_TOKENS", "3000"))
+MAX_FULL_COLUMNS       = int(os.getenv("GROWIFY_PROMPT_MAX_FULL_COLUMNS", "25"))
+
+# Prompts are mostly JSON and column names, which tokenize denser than prose
+CHARS_PER_TOKEN = 3.5
+
+# Question words that point at a likely_purpose tag (see data_utils.detect_column_types)
+PURPOSE_KEYWORDS = {
+    'temporal': {
+        'date', 'time', 'day', 'daily', 'week', 'weekly', 'month', 'monthly', 'year', 'yearly',
+        'quarter', 'quarterly', 'q1', 'q2', 'q3', 'q4', 'trend', 'season', 'seasonal', 'when',
+        'period', 'over', 'growth', 'drop', 'decline', 'increase', 'ytd', 'mom', 'yoy',
+        'january', 'february', 'march', 'april', 'may', 'june', 'july', 'august',
+        'september', 'october', 'november', 'december',
+    },
+    'financial': {
+        'spend', 'cost', 'budget', 'price', 'revenue', 'sale', 'amount', 'money', 'profit',
+        'margin', 'expensive', 'cheap', 'earn', 'income', 'pay', 'paid', 'dollar', 'value',
+    },
+    'performance_metric': {
+        'roi', 'roas', 'ctr', 'cpc', 'cpm', 'cpa', 'conversion', 'convert', 'rate', 'ratio',
+        'performance', 'perform', 'efficient', 'efficiency', 'effective', 'best', 'worst',
+        'return', 'improve',
+    },
+    'volume_metric': {
+        'click', 'impression', 'view', 'lead', 'acquisition', 'traffic', 'reach', 'volume',
+        'engagement', 'visit', 'visitor', 'user', 'signup', 'order', 'many',
+    },
+    'categorical': {
+        'campaign', 'channel', 'source', 'medium', 'platform', 'category', 'segment', 'which',
+        'compare', 'comparison', 'breakdown', 'split', 'top', 'region', 'country', 'type', 'group',
+    },
+}
+
+STOPWORDS = {
+    'the', 'a', 'an', 'and', 'or', 'of', 'in', 'on', 'for', 'to', 'by', 'is', 'are', 'was',
+    'were', 'did', 'do', 'does', 'what', 'why', 'how', 'with', 'from', 'our', 'my', 'me',
+    'it', 'its', 'this', 'that', 'these', 'those', 'be', 'at', 'as', 'than', 'show', 'give',
+    'tell', 'us', 'we', 'i', 'all', 'per', 'vs', 'versus', 'between', 'most', 'least',
+}
+
+NAME_MATCH_WEIGHT    = 3.0
+PARTIAL_MATCH_WEIGHT = 1.5
+PURPOSE_MATCH_WEIGHT = 1.0
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budget decisions (no tokenizer dependency)."""
+    return int(math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def _stem(word: str) -> str:
+    for suffix in ('ing', 'es', 's'):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word stems, splitting snake_case, camelCase and digits apart."""
+    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', str(text))
+    words = re.findall(r'[a-z]+|\d+|%', text.lower())
+    return [_stem(w) for w in words if w not in STOPWORDS]
+
+
+def score_column(question_tokens: Set[str], column: str, purpose: str) -> float:
+    """
+    Lexical relevance of one column to the question: whole-word matches on the
+    column name, partial matches (prefixes such as "conv" ~ "conversion") and
+    question words associated with the column's likely_purpose.
+    """
+    name_tokens = set(tokenize(column))
+    score = NAME_MATCH_WEIGHT * len(question_tokens & name_tokens)
+    for q in question_tokens - name_tokens:
+        if len(q) >= 3 and any(n.startswith(q) or q.startswith(n) for n in name_tokens if len(n) >= 3):
+            score += PARTIAL_MATCH_WEIGHT
+    keywords = PURPOSE_KEYWORDS.get(purpose, ())
+    score += PURPOSE_MATCH_WEIGHT * sum(1 for q in question_tokens if q in keywords)
+    return score
+
+
+def rank_columns(question: str, column_analysis: dict) -> List[str]:
+    """Columns ordered by relevance to the question; ties keep the dataset's column order."""
+    question_tokens = set(tokenize(question))
+    scores = {
+        col: score_column(question_tokens, col, info.get('likely_purpose', 'unknown'))
+        for col, info in column_analysis.items()
+    }
+    order = {col: i for i, col in enumerate(column_analysis)}
+    return sorted(column_analysis, key=lambda col: (-scores[col], order[col]))
+
+
+@dataclass
+class ColumnBudget:
+    """How the columns of a prompt were packed into its token budget."""
+    full: List[str] = field(default_factory=list)
+    compact: List[str] = field(default_factory=list)
+    omitted: List[str] = field(default_factory=list)
+    tokens: int = 0
+
+
+def pack_columns(
+    ranked: Iterable[str],
+    full_text: Callable[[str], str],
+    compact_text: Callable[[str], str],
+    budget: int,
+    max_full: Optional[int] = MAX_FULL_COLUMNS,
+) -> ColumnBudget:
+    """
+    Fits columns into `budget` tokens. Every column first gets its compact
+    one-liner (in rank order, dropping the least relevant if even those do not
+    fit); the remaining budget upgrades the top-ranked columns to full stats.
+    """
+    ranked = list(ranked)
+    compact_cost = {col: estimate_tokens(compact_text(col)) for col in ranked}
+    packed = ColumnBudget()
+    remaining = budget
+    for col in ranked:
+        if compact_cost[col] <= remaining:
+            packed.compact.append(col)
+            remaining -= compact_cost[col]
+        else:
+            packed.omitted.append(col)
+
+    for col in list(packed.compact):
+        if max_full is not None and len(packed.full) >= max_full:
+            break
+        extra = estimate_tokens(full_text(col)) - compact_cost[col]
+        if extra <= remaining:
+            packed.full.append(col)
+            packed.compact.remove(col)
+            remaining -= extra
+    packed.tokens = budget - remaining
+    return packed
@@ -0,0 +1,133 @@
+# File: src/Test_red/app_backend/query_cache.py
+
+import os
+import re
+import time
+import threading
+from typing import Callable, Optional, Tuple
+
+import duckdb
+import pandas as pd
+
+from .cache_utils import CACHE_DIR, FrameCache, hash_bytes
+from .trace_utils import span
+
+# ────────────────────────────────────────────────────────────────────────────────
+# QUERY CACHE SETTINGS (overridable through environment variables)
+# ────────────────────────────────────────────────────────────────────────────────
+QUERY_CACHE_DIR       = os.getenv("GROWIFY_QUERY_CACHE_DIR", os.path.join(CACHE_DIR, "queries"))
+QUERY_CACHE_MEMORY_MB = int(os.getenv("GROWIFY_QUERY_CACHE_MEMORY_MB", "256"))
+QUERY_CACHE_DISK_MB   = int(os.getenv("GROWIFY_QUERY_CACHE_DISK_MB", "1024"))
+
+# Single-quoted literals and quoted identifiers are kept verbatim; comments are dropped
+_SQL_TOKENS = re.compile(
+    r"(?P<literal>'(?:[^']|'')*')"
+    r"|(?P<ident>\"(?:[^\"]|\"\")*\")"
+    r"|(?P<comment>--[^\n]*|/\*.*?\*/)"
+    r"|(?P<space>\s+)"
+    r"|(?P<other>[^'\"\s-]+|-)",
+    re.DOTALL,
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Canonical form of a query for cache keys: comments removed, whitespace
+    collapsed, trailing semicolons dropped and everything outside string
+    literals lowercased (DuckDB identifiers and keywords are case-insensitive).
+    """
+    parts = []
+    for match in _SQL_TOKENS.finditer(sql):
+        kind = match.lastgroup
+        if kind in ("comment", "space"):
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+        elif kind == "literal":
+            parts.append(match.group())
+        else:
+            parts.append(match.group().lower())
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+class QueryResultCache:
+    """
+    Results of executed SQL keyed by (dataset version, normalized SQL), kept in
+    a FrameCache (memory LRU over size-bounded Parquet files). Each entry
+    remembers how long the query took, so hits report the time they saved.
+    """
+
+    def __init__(self, directory: str = QUERY_CACHE_DIR, max_memory_mb: int = QUERY_CACHE_MEMORY_MB,
+                 max_disk_mb: int = QUERY_CACHE_DISK_MB):
+        self.frames = FrameCache(directory, max_memory_mb=max_memory_mb, max_disk_mb=max_disk_mb)
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(sql: str, dataset_version: str) -> str:
+        # Version first, so every entry of a dataset version shares a prefix
+        return f"{dataset_version[:32]}-{hash_bytes(normalize_sql(sql).encode('utf-8'))[:32]}"
+
+    def execute(
+        self,
+        conn: duckdb.DuckDBPyConnection,
+        sql: str,
+        dataset_version: str,
+        run: Optional[Callable[[], pd.DataFrame]] = None,
+    ) -> Tuple[pd.DataFrame, bool, float]:
+        """
+        Returns (result, served_from_cache, seconds). On a miss the query runs
+        through `run()` (default: plain conn.execute) and the result is stored;
+        `seconds` is the execution time, or for a hit the time that was saved.
+        """
+        with span("sql_query") as query_span:
+            key = self.make_key(sql, dataset_version)
+            cached = self.frames.get(key)
+            query_span.set(cached=cached is not None)
+            if cached is not None:
+                seconds = float(cached.attrs.get("execution_seconds", 0.0))
+                with self._lock:
+                    self.hits += 1
+                    self.saved_seconds += seconds
+                return cached, True, seconds
+
+            started = time.perf_counter()
+            result = run() if run is not None else conn.execute(sql).df()
+            seconds = time.perf_counter() - started
+            result.attrs["execution_seconds"] = seconds
+            self.frames.put(key, result)
+            with self._lock:
+                self.misses += 1
+        return result, False, seconds
+
+    def invalidate(self, dataset_version: str) -> int:
+        """Drops every cached result of one dataset version (e.g. after its data changed)."""
+        return self.frames.drop_prefix(f"{dataset_version[:32]}-")
+
+    def stats(self) -> dict:
+        frames = self.frames.stats()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "entries_in_memory": frames["entries"],
+                "memory_mb": frames["memory_mb"],
+                "disk_mb": frames["disk_mb"],
+            }
+
+
+_cache: Optional[QueryResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryResultCache:
+    """Process-wide SQL result cache shared by every Streamlit session."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = QueryResultCache()
+        return _cache
@@ -0,0 +1,236 @@
+# File: src/Test_red/app_backend/rollup_utils.py
+
+import os
+import re
+import json
+import time
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional
+
+import duckdb
+
+from ..logger import logger
+from .prompt_utils import rank_columns, tokenize
+from .sql_utils import quote_identifier, quote_literal
+from .trace_utils import traced
+
+# ────────────────────────────────────────────────────────────────────────────────
+# ROLLUP SETTINGS (overridable through environment variables)
+# ────────────────────────────────────────────────────────────────────────────────
+ROLLUP_GRAINS           = ("day", "week", "month")
+ROLLUP_MAX_DIMENSIONS   = int(os.getenv("GROWIFY_ROLLUP_MAX_DIMENSIONS", "2"))
+ROLLUP_MAX_CARDINALITY  = int(os.getenv("GROWIFY_ROLLUP_MAX_CARDINALITY", "50"))
+ROLLUP_MAX_MEASURES     = int(os.getenv("GROWIFY_ROLLUP_MAX_MEASURES", "12"))
+ROLLUP_PROMPT_ROWS      = int(os.getenv("GROWIFY_ROLLUP_PROMPT_ROWS", "100"))
+ROLLUP_CATALOG          = "rollup_catalog"
+
+# Additive measures are summed; rates and ratios are averaged
+SUMMED_PURPOSES   = ('financial', 'volume_metric', 'numeric')
+AVERAGED_PURPOSES = ('performance_metric',)
+
+NUMERIC_TYPES = re.compile(r'^(TINYINT|SMALLINT|INTEGER|BIGINT|HUGEINT|UTINYINT|USMALLINT|UINTEGER|UBIGINT'
+                           r'|FLOAT|REAL|DOUBLE|DECIMAL)')
+TEMPORAL_TYPES = re.compile(r'^(DATE|TIMESTAMP)')
+
+GRAIN_LABELS = {"day": "daily", "week": "weekly", "month": "monthly"}
+# Question words (as prompt_utils.tokenize stems them) that ask for a grain
+GRAIN_WORDS = {
+    "day": {"day", "daily", "date"},
+    "week": {"week", "weekly"},
+    "month": {"month", "monthly", "january", "february", "march", "april", "june", "july",
+              "august", "september", "october", "november", "december"},
+}
+GRAIN_WORDS = {grain: {stem for word in words for stem in tokenize(word)} for grain, words in GRAIN_WORDS.items()}
+
+
+@dataclass
+class RollupTable:
+    """One materialized rollup: `grain` buckets of `time_column`, optionally split by `dimension`."""
+    name: str
+    grain: str
+    time_column: str
+    dimension: Optional[str] = None
+    sums: List[str] = field(default_factory=list)
+    averages: List[str] = field(default_factory=list)
+    row_count: int = 0
+
+    @property
+    def output_columns(self) -> List[str]:
+        columns = ["period"] + ([self.dimension] if self.dimension else []) + ["row_count"]
+        return columns + [f"sum_{m}" for m in self.sums] + [f"avg_{m}" for m in self.averages]
+
+    def describe(self) -> str:
+        split = f" by {self.dimension}" if self.dimension else ""
+        return (f"{self.name} ({GRAIN_LABELS[self.grain]} totals{split}, {self.row_count} rows): "
+                f"{', '.join(self.output_columns)}")
+
+
+def _table_name(grain: str, dimension: Optional[str], taken: set) -> str:
+    name = f"rollup_{grain}"
+    if dimension:
+        name += "_by_" + (re.sub(r'[^0-9a-zA-Z]+', '_', dimension).strip('_').lower() or "dimension")
+    base, i = name, 2
+    while name in taken:
+        name, i = f"{base}_{i}", i + 1
+    taken.add(name)
+    return name
+
+
+def column_types(conn: duckdb.DuckDBPyConnection, table: str) -> dict:
+    """DuckDB type name of every column of `table`."""
+    return {row[0]: row[1] for row in conn.execute(f"DESCRIBE {quote_identifier(table)}").fetchall()}
+
+
+def find_time_column(types: dict, column_analysis: dict) -> Optional[str]:
+    """The first temporal-tagged column actually stored as DATE/TIMESTAMP."""
+    return next((col for col, info in column_analysis.items()
+                 if info['likely_purpose'] == 'temporal' and TEMPORAL_TYPES.match(types.get(col, ''))), None)
+
+
+def plan_rollups(conn: duckdb.DuckDBPyConnection, table: str, column_analysis: dict) -> List[RollupTable]:
+    """
+    Chooses the rollups to materialize from the detect_column_types tags:
+    the first temporal column stored as DATE/TIMESTAMP, numeric financial,
+    volume and performance columns as measures, and low-cardinality
+    categorical columns as split dimensions.
+    """
+    types = column_types(conn, table)
+    time_column = find_time_column(types, column_analysis)
+    if time_column is None:
+        return []
+    measures = [col for col, info in column_analysis.items()
+                if info['likely_purpose'] in SUMMED_PURPOSES + AVERAGED_PURPOSES
+                and NUMERIC_TYPES.match(types.get(col, ''))][:ROLLUP_MAX_MEASURES]
+    if not measures:
+        return []
+    sums = [m for m in measures if column_analysis[m]['likely_purpose'] in SUMMED_PURPOSES]
+    averages = [m for m in measures if column_analysis[m]['likely_purpose'] in AVERAGED_PURPOSES]
+    dimensions = [col for col, info in column_analysis.items()
+                  if info['likely_purpose'] == 'categorical'
+                  and 2 <= info['unique_count'] <= ROLLUP_MAX_CARDINALITY][:ROLLUP_MAX_DIMENSIONS]
+
+    taken = set()
+    return [
+        RollupTable(_table_name(grain, dimension, taken), grain, time_column, dimension, sums, averages)
+        for grain in ROLLUP_GRAINS
+        for dimension in [None] + dimensions
+    ]
+
+
+def _period_sql(rollup: RollupTable) -> str:
+    return f"CAST(date_trunc({quote_literal(rollup.grain)}, {quote_identifier(rollup.time_column)}) AS DATE)"
+
+
+def _rollup_select(rollup: RollupTable, table: str, where: str = "") -> str:
+    keys = [f"{_period_sql(rollup)} AS period"]
+    group = ["1"]
+    if rollup.dimension:
+        keys.append(quote_identifier(rollup.dimension))
+        group.append("2")
+    aggregates = ["COUNT(*) AS row_count"]
+    aggregates += [f"SUM({quote_identifier(m)}) AS {quote_identifier('sum_' + m)}" for m in rollup.sums]
+    aggregates += [f"AVG({quote_identifier(m)}) AS {quote_identifier('avg_' + m)}" for m in rollup.averages]
+    return (
+        f"SELECT {', '.join(keys + aggregates)} FROM {quote_identifier(table)} "
+        f"WHERE {quote_identifier(rollup.time_column)} IS NOT NULL{where} "
+        f"GROUP BY {', '.join(group)} ORDER BY {', '.join(group)}"
+    )
+
+
+def _rollup_sql(rollup: RollupTable, table: str) -> str:
+    return f"CREATE OR REPLACE TABLE {quote_identifier(rollup.name)} AS {_rollup_select(rollup, table)}"
+
+
+def _write_catalog(conn: duckdb.DuckDBPyConnection, rollups: List[RollupTable]) -> None:
+    conn.execute(f"CREATE OR REPLACE TABLE {ROLLUP_CATALOG} (name VARCHAR, spec VARCHAR)")
+    if rollups:
+        conn.executemany(f"INSERT INTO {ROLLUP_CATALOG} VALUES (?, ?)",
+                         [(r.name, json.dumps(asdict(r))) for r in rollups])
+
+
+@traced("rollups")
+def build_rollups(conn: duckdb.DuckDBPyConnection, table: str, column_analysis: dict) -> List[RollupTable]:
+    """
+    Materializes the planned rollups next to `table` and records them in the
+    rollup catalog, so any later read-only session can discover them.
+    """
+    started = time.perf_counter()
+    rollups = plan_rollups(conn, table, column_analysis)
+    for rollup in rollups:
+        conn.execute(_rollup_sql(rollup, table))
+        rollup.row_count = conn.execute(f"SELECT COUNT(*) FROM {quote_identifier(rollup.name)}").fetchone()[0]
+    _write_catalog(conn, rollups)
+    logger.info(f"Built {len(rollups)} rollup tables in {time.perf_counter() - started:.2f}s")
+    return rollups
+
+
+@traced("rollups")
+def refresh_rollups(conn: duckdb.DuckDBPyConnection, table: str, appended: str) -> List[RollupTable]:
+    """
+    Brings the cataloged rollups up to date after the rows of the relation
+    `appended` were inserted into `table`: only the periods those rows fall in
+    are re-aggregated, and the scan of `table` starts at the earliest of them.
+    The rollup plan itself is kept, so the tables keep their names and columns.
+    """
+    started = time.perf_counter()
+    rollups = list_rollups(conn)
+    for rollup in rollups:
+        name = quote_identifier(rollup.name)
+        time_column = quote_identifier(rollup.time_column)
+        touched = f"(SELECT DISTINCT {_period_sql(rollup)} AS touched_period FROM {appended} WHERE {time_column} IS NOT NULL)"
+        conn.execute(f"DELETE FROM {name} WHERE period IN {touched}")
+        conn.execute(f"INSERT INTO {name} " + _rollup_select(
+            rollup, table,
+            f" AND {time_column} >= (SELECT min(touched_period) FROM {touched}) AND {_period_sql(rollup)} IN {touched}",
+        ))
+        # Rollups are small; re-sorting keeps their rows in the order a fresh build has
+        order = "period, " + quote_identifier(rollup.dimension) if rollup.dimension else "period"
+        conn.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM {name} ORDER BY {order}")
+        rollup.row_count = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+    _write_catalog(conn, rollups)
+    logger.info(f"Refreshed {len(rollups)} rollup tables in {time.perf_counter() - started:.2f}s")
+    return rollups
+
+
+def list_rollups(conn: duckdb.DuckDBPyConnection) -> List[RollupTable]:
+    """Rollups recorded in the workspace (empty for workspaces built without them)."""
+    try:
+        rows = conn.execute(f"SELECT spec FROM {ROLLUP_CATALOG} ORDER BY name").fetchall()
+    except duckdb.CatalogException:
+        return []
+    return [RollupTable(**json.loads(spec)) for (spec,) in rows]
+
+
+def pick_rollup(rollups: List[RollupTable], question: str, max_rows: int = ROLLUP_PROMPT_ROWS) -> Optional[RollupTable]:
+    """
+    The rollup that best matches the question: the grain it mentions (monthly
+    by default), split by a dimension it mentions. Falls back to coarser grains,
+    then to no split, until the table fits in `max_rows` rows.
+    """
+    if not rollups:
+        return None
+    words = set(tokenize(question))
+    asked = [grain for grain in ROLLUP_GRAINS if words & GRAIN_WORDS[grain]]
+    preferred = asked[0] if asked else "month"
+    grains = [preferred] + [g for g in ROLLUP_GRAINS[ROLLUP_GRAINS.index(preferred) + 1:]]
+
+    dimensions = {r.dimension for r in rollups if r.dimension}
+    ranked = rank_columns(question, {d: {'likely_purpose': 'categorical'} for d in dimensions}) if dimensions else []
+    mentioned = [d for d in ranked if set(tokenize(d)) & words]
+    for dimension in mentioned[:1] + [None]:
+        for grain in grains:
+            rollup = next((r for r in rollups if r.grain == grain and r.dimension == dimension), None)
+            if rollup is not None and rollup.row_count <= max_rows:
+                return rollup
+    return None
+
+
+def rollup_context(conn: duckdb.DuckDBPyConnection, rollups: List[RollupTable], question: str,
+                   max_rows: int = ROLLUP_PROMPT_ROWS) -> str:
+    """The picked rollup's rows as compact CSV for the analysis prompt ("" if none fits)."""
+    rollup = pick_rollup(rollups, question, max_rows)
+    if rollup is None:
+        return ""
+    frame = conn.execute(f"SELECT * FROM {quote_identifier(rollup.name)}").df()
+    # Rounded to fixed decimals, never significant digits: the prompt calls these figures exact
+    return f"{rollup.describe()}\n{frame.round(6).to_csv(index=False)}"
@@ -0,0 +1,173 @@
+# File: src/Test_red/app_backend/sketch_utils.py
+
+import base64
+from typing import Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+# ────────────────────────────────────────────────────────────────────────────────
+# MERGEABLE SKETCHES
+# Fixed-size summaries that can be updated chunk by chunk and merged, so
+# profiling a file of any size keeps a flat memory footprint.
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def hash_values(values: pd.Series) -> np.ndarray:
+    """64-bit hashes of a Series' values (independent of its index)."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        values = values.astype('int64')
+    return pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+
+
+class HyperLogLog:
+    """Distinct-count estimator with 2**precision one-byte registers (~1.6% error at 12)."""
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values: pd.Series) -> None:
+        values = values.dropna()
+        if values.empty:
+            return
+        hashes = hash_values(values)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        remainder_bits = 64 - self.precision
+        remainder = hashes & np.uint64((1 << remainder_bits) - 1)
+        # Rank = position of the leftmost 1-bit in the remaining bits (bit_length via frexp)
+        _, bit_length = np.frexp(remainder.astype(np.float64))
+        rank = (remainder_bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def to_dict(self) -> dict:
+        return {"precision": self.precision, "registers": base64.b64encode(self.registers.tobytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HyperLogLog":
+        sketch = cls(int(data["precision"]))
+        registers = np.frombuffer(base64.b64decode(data["registers"]), dtype=np.uint8)
+        if len(registers) != len(sketch.registers):
+            raise ValueError("HyperLogLog registers do not match the precision")
+        sketch.registers = registers.copy()
+        return sketch
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * np.log(m / zeros)))  # linear counting for small cardinalities
+        return int(round(raw))
+
+
+class KLLSketch:
+    """
+    Quantile sketch (KLL): a stack of compactors where an item at level h stands
+    for 2**h inputs. Full levels are sorted and every other item is promoted.
+    """
+
+    def __init__(self, k: int = 200, seed: int = 0):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(self.k * (2 / 3) ** depth))
+
+    def update(self, values: Iterable[float]) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: "KLLSketch") -> None:
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "count": self.count, "levels": [level.tolist() for level in self.levels],
+                "rng": self._rng.bit_generator.state}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "KLLSketch":
+        sketch = cls(int(data["k"]))
+        sketch.count = int(data["count"])
+        sketch.levels = [np.asarray(level, dtype=np.float64) for level in data["levels"]] or [np.empty(0)]
+        sketch._rng.bit_generator.state = data["rng"]
+        return sketch
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                leftover = items[len(items) - len(items) % 2:]
+                promoted = items[int(self._rng.integers(2)):len(items) - len(leftover):2]
+                self.levels[level] = leftover
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def quantiles(self, qs: Iterable[float]) -> list:
+        items = np.concatenate(self.levels)
+        if not len(items):
+            return [None for _ in qs]
+        weights = np.concatenate([np.full(len(lvl), 2.0 ** h) for h, lvl in enumerate(self.levels)])
+        order = np.argsort(items)
+        items, cumulative = items[order], np.cumsum(weights[order])
+        cumulative /= cumulative[-1]
+        positions = np.searchsorted(cumulative, np.asarray(list(qs), dtype=np.float64), side='left')
+        return [float(items[min(pos, len(items) - 1)]) for pos in positions]
+
+
+class SpaceSaving:
+    """Heavy-hitters summary keeping at most `capacity` counters (counts are upper bounds)."""
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+
+    def _floor(self) -> int:
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def update(self, values: pd.Series) -> None:
+        chunk_counts = values.value_counts(dropna=True)
+        floor = int(chunk_counts.iloc[self.capacity]) if len(chunk_counts) > self.capacity else 0
+        self.merge_counts({str(k): int(v) for k, v in chunk_counts.head(self.capacity).items()}, floor)
+
+    def merge(self, other: "SpaceSaving") -> None:
+        self.merge_counts(other.counts, other._floor())
+
+    def merge_counts(self, counts: Dict[str, int], floor: int = 0) -> None:
+        own_floor = self._floor()
+        merged = {key: self.counts.get(key, own_floor) + counts.get(key, floor)
+                  for key in set(self.counts) | set(counts)}
+        self.counts = dict(sorted(merged.items(), key=lambda kv: (-kv[1], kv[0]))[:self.capacity])
+
+    def top(self, n: int) -> Dict[str, int]:
+        return dict(list(self.counts.items())[:n])
+
+    def to_dict(self) -> dict:
+        return {"capacity": self.capacity, "counts": self.counts}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SpaceSaving":
+        sketch = cls(int(data["capacity"]))
+        sketch.counts = {str(key): int(count) for key, count in data["counts"].items()}
+        return sketch
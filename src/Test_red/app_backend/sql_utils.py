@@ -1,39 +1,111 @@
 # File: src/Test_red/app_backend/sql_utils.py
 
+import os
+import re
 import json
+import threading
+from typing import Optional
+
+import duckdb
+import pandas as pd
+
+from ..exception import QueryTimeoutError, SQLGuardError
+from ..logger import logger
 from .api_clients import call_together_ai
+from .prompt_utils import SQL_PROMPT_TOKENS, estimate_tokens, pack_columns, rank_columns
+from .trace_utils import span
 
+# ────────────────────────────────────────────────────────────────────────────────
+# SQL GUARD LIMITS (overridable through environment variables)
+# ────────────────────────────────────────────────────────────────────────────────
+SQL_MAX_ROWS           = int(os.getenv("GROWIFY_SQL_MAX_ROWS", "1000"))
+SQL_TIMEOUT_SECONDS    = float(os.getenv("GROWIFY_SQL_TIMEOUT_SECONDS", "15"))
+SQL_MAX_ESTIMATED_ROWS = int(float(os.getenv("GROWIFY_SQL_MAX_ESTIMATED_ROWS", "1e9")))
+ALLOWED_TABLES         = re.compile(r'^(marketing_data|rollup_\w+)$', re.IGNORECASE)
+# Table functions that only generate values; any other (read_text, read_csv, glob, ...) can reach the file system
+ALLOWED_TABLE_FUNCTIONS = {"RANGE", "GENERATE_SERIES", "UNNEST"}
 
-def generate_sql_query(question: str, df, column_analysis: dict) -> str:
-    """Generate SQL query for specific analysis"""
-    
-    # Build table schema
-    table_schema = []
-    for col, info in column_analysis.items():
-        col_type = "TEXT"
-        if info['likely_purpose'] in ['financial', 'performance_metric', 'volume_metric', 'numeric']:
-            col_type = "DOUBLE"
-        elif info['likely_purpose'] == 'temporal':
-            col_type = "DATE"
-        table_schema.append(f"`{col}` {col_type}")
+_STRING_LITERAL = re.compile(r"('(?:[^']|'')*')")
+
+
+def quote_identifier(name: str) -> str:
+    """Double-quotes a column or table name for DuckDB, escaping embedded quotes."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def quote_literal(value: str) -> str:
+    """Single-quotes a string literal for DuckDB, escaping embedded quotes."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _schema_type(info: dict) -> str:
+    if info['likely_purpose'] in ['financial', 'performance_metric', 'volume_metric', 'numeric']:
+        return "DOUBLE"
+    if info['likely_purpose'] == 'temporal':
+        return "DATE"
+    return "TEXT"
+
+
+def build_sql_prompt(question: str, column_analysis: dict, token_budget: int = SQL_PROMPT_TOKENS,
+                     rollups: Optional[list] = None) -> str:
+    """
+    Prompt for SQL generation. Columns are ranked by relevance to the question;
+    every column that fits the budget is listed in the schema, and the top ones
+    also get their purpose and sample values. Materialized `rollups`
+    (rollup_utils.RollupTable) are offered as pre-aggregated alternatives.
+    """
+    def schema_entry(col):
+        return f"{quote_identifier(col)} {_schema_type(column_analysis[col])}, "
+
+    def samples(col):
+        # Already collected by the column profile
+        return list(column_analysis[col].get('sample_values', []))[:3]
+
+    def full_entry(col):
+        detail = {col: {"purpose": column_analysis[col]['likely_purpose'], "sample": samples(col)}}
+        return schema_entry(col) + json.dumps(detail, default=str)
+
+    rollup_section = ""
+    if rollups:
+        rollup_section = (
+            "\n    Pre-aggregated rollup tables (tiny; prefer one when it has every column the query needs,"
+            " and re-aggregate sum_ columns with SUM):\n"
+            + "\n".join(f"    - {r.describe()}" for r in rollups)
+        )
+    overhead = estimate_tokens(_render_sql_prompt(question, "", {}, {}, 0, rollup_section))
+    packed = pack_columns(
+        rank_columns(question, column_analysis),
+        full_text=full_entry,
+        compact_text=schema_entry,
+        budget=max(0, token_budget - overhead),
+    )
 
+    # Build table schema (most relevant columns first)
+    table_schema = [schema_entry(col)[:-2] for col in packed.full + packed.compact]
+    purposes = {col: column_analysis[col]['likely_purpose'] for col in packed.full}
     # Get sample data for better context
-    sample_data = {}
-    for col in list(column_analysis.keys())[:5]:  # Limit to 5 columns
-        try:
-            sample_values = df[col].dropna().head(3).tolist()
-            sample_data[col] = sample_values
-        except:
-            sample_data[col] = []
+    sample_data = {col: samples(col) for col in packed.full[:5]}  # Limit to 5 columns
+    prompt = _render_sql_prompt(question, ', '.join(table_schema), purposes, sample_data, len(packed.omitted),
+                                rollup_section)
+    logger.info(
+        f"SQL prompt: ~{estimate_tokens(prompt)} tokens "
+        f"({len(packed.full)} described, {len(packed.compact)} schema-only, {len(packed.omitted)} omitted columns)"
+    )
+    return prompt
+
 
-    prompt = f"""
+def _render_sql_prompt(question: str, schema: str, purposes: dict, sample_data: dict, omitted: int,
+                       rollup_section: str = "") -> str:
+    omitted_note = f"\n    ({omitted} less relevant columns omitted)" if omitted else ""
+    return f"""
     Generate a SQL query to answer: "{question}"
     
     Table: marketing_data
-    Schema: {', '.join(table_schema)}
+    Schema: {schema}{omitted_note}
+    {rollup_section}
     
     Column purposes:
-    {json.dumps({col: info['likely_purpose'] for col, info in column_analysis.items()}, indent=2)}
+    {json.dumps(purposes, indent=2)}
     
     Sample data:
     {json.dumps(sample_data, indent=2, default=str)}
@@ -42,12 +114,17 @@ def generate_sql_query(question: str, df, column_analysis: dict) -> str:
     - Return ONLY the SQL query, no explanations
     - Use appropriate aggregations and filters
     - Handle NULL values with COALESCE if needed
-    - Use backticks around column names
+    - Use double quotes around column names (DuckDB dialect)
     - Limit results to 100 rows if no specific limit mentioned
     - Use proper date functions if dealing with dates
     
     SQL Query:
     """
+
+
+def generate_sql_query(question: str, df, column_analysis: dict, rollups: Optional[list] = None) -> str:
+    """Generate SQL query for specific analysis"""
+    prompt = build_sql_prompt(question, column_analysis, rollups=rollups)
     
     try:
         sql = call_together_ai(prompt, max_tokens=400, temperature=0.0)
@@ -74,29 +151,182 @@ def generate_sql_query(question: str, df, column_analysis: dict) -> str:
         return f"Error generating SQL query: {str(e)}"
 
 
+def backticks_to_quotes(sql: str) -> str:
+    """Rewrites MySQL-style `identifiers` as DuckDB "identifiers", leaving string literals alone."""
+    parts = _STRING_LITERAL.split(sql)
+    for i in range(0, len(parts), 2):  # even positions are outside literals
+        parts[i] = re.sub(r'`([^`]*)`', lambda m: quote_identifier(m.group(1)), parts[i])
+    return "".join(parts)
+
+
+def restrict_connection(conn: duckdb.DuckDBPyConnection) -> duckdb.DuckDBPyConnection:
+    """
+    Turns off file and network access for everything `conn` (and its cursors) runs
+    from now on, and locks the configuration so a query cannot turn it back on.
+    Applied after connecting, since settings such as temp_directory can no longer be
+    changed once external access is off; tables and registered frames stay readable.
+    """
+    conn.execute("SET enable_external_access = false")
+    conn.execute("SET lock_configuration = true")
+    return conn
+
+
+def check_select(sql: str, conn: Optional[duckdb.DuckDBPyConnection] = None) -> str:
+    """
+    Parses `sql` with DuckDB and returns it if it is exactly one SELECT over
+    the dataset tables; raises SQLGuardError otherwise. The check is structural,
+    so column names such as `updated_at` or `created_date` are fine.
+    """
+    parser = conn if conn is not None else duckdb
+    try:
+        statements = parser.extract_statements(sql)
+    except duckdb.Error as e:
+        raise SQLGuardError(f"Could not parse the query: {e}") from e
+    if len(statements) != 1:
+        raise SQLGuardError(f"Expected a single statement, got {len(statements)}")
+    if statements[0].type != duckdb.StatementType.SELECT:
+        raise SQLGuardError(f"Only SELECT queries may run, got {statements[0].type.name}")
+    tables = parser.get_table_names(sql)
+    if not tables:
+        raise SQLGuardError("The query does not read from marketing_data")
+    unknown = sorted(t for t in tables if not ALLOWED_TABLES.match(t))
+    if unknown:
+        raise SQLGuardError(f"The query reads tables outside the dataset: {', '.join(unknown)}")
+    return statements[0].query.strip()
+
+
 def validate_sql_query(sql: str) -> bool:
     """Basic SQL query validation"""
     if not sql or not sql.strip():
         return False
-    
-    sql_lower = sql.lower().strip()
-    
-    # Must contain SELECT and FROM
-    if 'select' not in sql_lower or 'from' not in sql_lower:
-        return False
-    
-    # Should reference our table
-    if 'marketing_data' not in sql_lower:
-        return False
-    
-    # Basic security check - no dangerous keywords
-    dangerous_keywords = ['drop', 'delete', 'truncate', 'alter', 'create', 'insert', 'update']
-    if any(keyword in sql_lower for keyword in dangerous_keywords):
+    try:
+        check_select(backticks_to_quotes(sql))
+    except SQLGuardError:
         return False
-    
     return True
 
 
+def limit_query(sql: str, max_rows: int = SQL_MAX_ROWS) -> str:
+    """
+    Caps the result at `max_rows` by wrapping the query: a smaller LIMIT
+    inside still wins, a larger or missing one is clamped, and ordering is kept.
+    """
+    return f"SELECT * FROM (\n{sql.rstrip().rstrip(';')}\n) AS guarded_query LIMIT {int(max_rows)}"
+
+
+# Operators whose output can be the product of their inputs' sizes
+_CROSS_OPERATORS = ("CROSS_PRODUCT", "NESTED_LOOP_JOIN", "BLOCKWISE_NL_JOIN", "PIECEWISE_MERGE_JOIN")
+
+
+def explain_plan(conn: duckdb.DuckDBPyConnection, sql: str) -> list:
+    """Root operators of the physical plan of `sql`, as DuckDB's JSON EXPLAIN output."""
+    return [node for row in conn.execute(f"EXPLAIN (FORMAT JSON) {sql}").fetchall() for node in json.loads(row[1])]
+
+
+def check_plan_sources(plan: list) -> None:
+    """
+    Raises SQLGuardError unless every scan in the plan reads a dataset table or a
+    value-generating table function. Table functions such as read_text never show
+    up in the parsed table names, but they do in the plan, subqueries included.
+    """
+    def visit(node: dict) -> None:
+        extra = node.get("extra_info", {})
+        function = str(extra.get("Function", "")).upper()
+        if function and function not in ALLOWED_TABLE_FUNCTIONS:
+            raise SQLGuardError(f"The query calls the table function {function.lower()}; "
+                                f"queries may only read marketing_data and its rollups")
+        table = extra.get("Table")
+        if table and not ALLOWED_TABLES.match(str(table)):
+            raise SQLGuardError(f"The query reads tables outside the dataset: {table}")
+        for child in node.get("children", []):
+            visit(child)
+
+    for node in plan:
+        visit(node)
+
+
+def estimate_cardinality(conn: duckdb.DuckDBPyConnection, sql: str, plan: Optional[list] = None) -> int:
+    """
+    Largest row count the optimizer expects at any operator of the plan (0 if
+    unknown). Cross products without an estimate count as the product of their inputs.
+    """
+    largest = 0
+
+    def visit(node: dict) -> int:
+        nonlocal largest
+        children = [visit(child) for child in node.get("children", [])]
+        estimate = node.get("extra_info", {}).get("Estimated Cardinality")
+        if isinstance(estimate, str) and estimate.isdigit():
+            rows = int(estimate)
+        elif node.get("name", "").strip() in _CROSS_OPERATORS and children:
+            rows = 1
+            for child in children:
+                rows *= max(child, 1)
+        else:
+            rows = max(children, default=0)
+        largest = max(largest, rows)
+        return rows
+
+    for node in plan if plan is not None else explain_plan(conn, sql):
+        visit(node)
+    return largest
+
+
+def run_with_timeout(conn: duckdb.DuckDBPyConnection, sql: str,
+                     timeout_seconds: float = SQL_TIMEOUT_SECONDS) -> pd.DataFrame:
+    """Runs `sql`, interrupting the connection if it exceeds `timeout_seconds` of wall-clock time."""
+    timer = threading.Timer(timeout_seconds, conn.interrupt)
+    timer.daemon = True
+    timer.start()
+    try:
+        return conn.execute(sql).df()
+    except duckdb.InterruptException as e:
+        raise QueryTimeoutError(f"Query cancelled after {timeout_seconds:g}s") from e
+    finally:
+        timer.cancel()
+
+
+def guarded_execute(
+    conn: duckdb.DuckDBPyConnection,
+    sql: str,
+    max_rows: int = SQL_MAX_ROWS,
+    timeout_seconds: float = SQL_TIMEOUT_SECONDS,
+    max_estimated_rows: int = SQL_MAX_ESTIMATED_ROWS,
+) -> pd.DataFrame:
+    """
+    Executes LLM-generated SQL safely: only a single SELECT over the dataset
+    tables (no file-reading table functions anywhere in its plan), at most
+    `max_rows` result rows, rejected up front when the plan expects more than
+    `max_estimated_rows` rows at any step (e.g. a cartesian join), and cancelled
+    after `timeout_seconds`. Raises SQLGuardError or QueryTimeoutError; the
+    result's attrs record the estimate and whether it was truncated. `conn`
+    should also have gone through restrict_connection.
+    """
+    with span("sql_execute") as sql_span:
+        statement = check_select(backticks_to_quotes(sql), conn)
+        # One row past the cap tells a truncated result from one that fits exactly
+        limited = limit_query(statement, max_rows + 1)
+        try:
+            plan = explain_plan(conn, limited)
+        except duckdb.Error as e:
+            raise SQLGuardError(f"Query does not fit the dataset: {e}") from e
+        check_plan_sources(plan)
+        estimate = estimate_cardinality(conn, limited, plan)
+        sql_span.set(estimated_rows=estimate)
+        if estimate > max_estimated_rows:
+            raise SQLGuardError(
+                f"Query rejected: the plan expects ~{estimate:,} intermediate rows "
+                f"(limit {max_estimated_rows:,}); add filters or aggregate first"
+            )
+        result = run_with_timeout(conn, limited, timeout_seconds)
+        truncated = len(result) > max_rows
+        result = result.head(max_rows)
+        result.attrs["estimated_rows"] = estimate
+        result.attrs["truncated"] = truncated
+        sql_span.set(rows=len(result), truncated=result.attrs["truncated"])
+    return result
+
+
 def format_sql_result(result_df, question: str) -> str:
     """Format SQL query results for display"""
     if result_df.empty:
@@ -0,0 +1,302 @@
+# File: src/Test_red/app_backend/trace_utils.py
+
+import os
+import time
+import uuid
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ..logger import logger, trace_logger
+
+# ────────────────────────────────────────────────────────────────────────────────
+# TRACING & METRICS SETTINGS (overridable through environment variables)
+# ────────────────────────────────────────────────────────────────────────────────
+TRACE_ENABLED         = os.getenv("GROWIFY_TRACE", "1") != "0"
+METRICS_FILE          = os.getenv("GROWIFY_METRICS_FILE", "")       # Prometheus textfile-collector output
+METRICS_PORT          = int(os.getenv("GROWIFY_METRICS_PORT", "0"))  # > 0 serves /metrics on this port
+METRICS_FLUSH_SECONDS = float(os.getenv("GROWIFY_METRICS_FLUSH_SECONDS", "15"))
+RECENT_SPANS          = int(os.getenv("GROWIFY_TRACE_RECENT_SPANS", "2000"))
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS   = (64, 256, 1024, 2048, 4096, 8192, 16384, 32768)
+
+METRIC_HELP = {
+    "growify_span_seconds": ("histogram", "Duration of instrumented operations by span name and status"),
+    "growify_llm_tokens": ("histogram", "Tokens per LLM call by provider and direction"),
+    "growify_llm_calls_total": ("counter", "LLM calls by provider, mode and outcome"),
+    "growify_llm_retries_total": ("counter", "HTTP retries against LLM providers"),
+}
+
+_session_id: ContextVar[Optional[str]] = ContextVar("growify_session_id", default=None)
+_question_id: ContextVar[Optional[str]] = ContextVar("growify_question_id", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("growify_current_span", default=None)
+
+
+def new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+@contextmanager
+def trace_context(session_id: Optional[str] = None, question_id: Optional[str] = None):
+    """Correlation IDs for every span opened inside the block (and in threads that copy its context)."""
+    tokens = []
+    if session_id is not None:
+        tokens.append((_session_id, _session_id.set(session_id)))
+    if question_id is not None:
+        tokens.append((_question_id, _question_id.set(question_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def bind_trace_context(session_id: Optional[str] = None, question_id: Optional[str] = None) -> None:
+    """trace_context without a block: binds both IDs (None clears) for the rest of the current context, e.g. a script run."""
+    _session_id.set(session_id)
+    _question_id.set(question_id)
+
+
+@dataclass
+class Span:
+    """One timed operation; `attrs` carries sizes, token counts, retries, cache hits..."""
+    name: str
+    span_id: str = field(default_factory=new_id)
+    parent_id: Optional[str] = None
+    session_id: Optional[str] = None
+    question_id: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+    seconds: float = 0.0
+    status: str = "ok"
+    attrs: dict = field(default_factory=dict)
+
+    def set(self, **attrs) -> "Span":
+        self.attrs.update(attrs)
+        return self
+
+    def add(self, key: str, amount: float = 1) -> "Span":
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+        return self
+
+    def to_dict(self) -> dict:
+        return {
+            "event": "span", "span": self.name, "span_id": self.span_id, "parent_id": self.parent_id,
+            "session_id": self.session_id, "question_id": self.question_id,
+            "started_at": round(self.started_at, 3), "seconds": round(self.seconds, 6),
+            "status": self.status, **self.attrs,
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class MetricsRegistry:
+    """Counters and fixed-bucket histograms keyed by (name, labels), rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self._histograms: Dict[Tuple[str, tuple], list] = {}  # -> [bucket bounds, bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, amount: float = 1.0, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = SECONDS_BUCKETS, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            entry = self._histograms.setdefault(key, [buckets, [0] * len(buckets), 0.0, 0])
+            for i, bound in enumerate(entry[0]):
+                if value <= bound:
+                    entry[1][i] += 1
+            entry[2] += value
+            entry[3] += 1
+
+    @staticmethod
+    def _labels(labels: tuple, extra: Optional[tuple] = None) -> str:
+        pairs = list(labels) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (e[0], list(e[1]), e[2], e[3])) for key, e in self._histograms.items())
+        lines, described = [], set()
+
+        def describe(name: str) -> None:
+            if name not in described and name in METRIC_HELP:
+                kind, text = METRIC_HELP[name]
+                lines.extend([f"# HELP {name} {text}", f"# TYPE {name} {kind}"])
+            described.add(name)
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{self._labels(labels)} {value:g}")
+        for (name, labels), (bounds, counts, total, count) in histograms:
+            describe(name)
+            for bound, bucket in zip(bounds, counts):
+                lines.append(f"{name}_bucket{self._labels(labels, ('le', f'{bound:g}'))} {bucket}")
+            lines.append(f"{name}_bucket{self._labels(labels, ('le', '+Inf'))} {count}")
+            lines.append(f"{name}_sum{self._labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{self._labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Atomic write, so a scraping textfile collector never reads a half-written file."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+_metrics = MetricsRegistry()
+_recent: "deque[Span]" = deque(maxlen=RECENT_SPANS)
+_recent_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Process-wide metrics registry shared by every Streamlit session."""
+    return _metrics
+
+
+def _finish(span: Span) -> None:
+    with _recent_lock:
+        _recent.append(span)
+    trace_logger.info(span.to_dict())
+    _metrics.observe("growify_span_seconds", span.seconds, span=span.name, status=span.status)
+    if span.name == "llm":
+        provider = span.attrs.get("provider", "unknown")
+        mode = "stream" if span.attrs.get("stream") else "call"
+        outcome = "cached" if span.attrs.get("cached") else span.status
+        _metrics.inc("growify_llm_calls_total", provider=provider, mode=mode, outcome=outcome)
+        for direction in ("prompt", "completion"):
+            tokens = span.attrs.get(f"{direction}_tokens")
+            if tokens is not None and not span.attrs.get("cached"):
+                _metrics.observe("growify_llm_tokens", tokens, TOKEN_BUCKETS, provider=provider, direction=direction)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span]:
+    """
+    Times the block as a span named `name`, nested under the enclosing span and
+    tagged with the session/question IDs in context. On exit it is logged as a JSON
+    line, observed in the growify_span_seconds histogram and kept for the timings view.
+    """
+    if not TRACE_ENABLED:
+        yield Span(name, attrs=attrs)
+        return
+    parent = _current_span.get()
+    current = Span(name, parent_id=parent.span_id if parent else None, session_id=_session_id.get(),
+                   question_id=_question_id.get(), attrs=attrs)
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except GeneratorExit:
+        # A streaming consumer stopped reading early
+        current.status = "cancelled"
+        raise
+    except BaseException as e:
+        current.status = "error"
+        current.attrs.setdefault("error", f"{type(e).__name__}: {e}"[:300])
+        raise
+    finally:
+        current.seconds = time.perf_counter() - started
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Generator finalized from another context (e.g. garbage-collected mid-stream)
+            pass
+        _finish(current)
+
+
+def traced(name: str):
+    """Decorator form of span() for functions whose whole body is one operation."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_retry(provider: str) -> None:
+    """Counts an HTTP retry on the current span and in growify_llm_retries_total."""
+    active = _current_span.get()
+    if active is not None:
+        active.add("retries")
+    _metrics.inc("growify_llm_retries_total", provider=provider)
+
+
+def recent_spans(session_id: Optional[str] = None, question_id: Optional[str] = None,
+                 limit: Optional[int] = None) -> List[Span]:
+    """Finished spans (oldest first), optionally only those of one session or question."""
+    with _recent_lock:
+        spans = [s for s in _recent
+                 if (session_id is None or s.session_id == session_id)
+                 and (question_id is None or s.question_id == question_id)]
+    return spans[-limit:] if limit else spans
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = _metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+_export_started = False
+_export_lock = threading.Lock()
+
+
+def start_metrics_export(metrics_file: str = METRICS_FILE, port: int = METRICS_PORT) -> None:
+    """
+    Starts the configured exporters once per process: a thread rewriting
+    `metrics_file` every METRICS_FLUSH_SECONDS and/or a /metrics endpoint on `port`.
+    Safe to call on every Streamlit rerun.
+    """
+    global _export_started
+    with _export_lock:
+        if _export_started:
+            return
+        _export_started = True
+    if metrics_file:
+        def flush() -> None:
+            while True:
+                time.sleep(METRICS_FLUSH_SECONDS)
+                try:
+                    _metrics.write(metrics_file)
+                except OSError as e:
+                    logger.warning(f"Could not write metrics to {metrics_file}: {e}")
+        threading.Thread(target=flush, name="metrics-file", daemon=True).start()
+    if port:
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        except OSError as e:
+            logger.warning(f"Metrics endpoint not started on port {port}: {e}")
+            return
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"Serving Prometheus metrics on :{port}/metrics")
@@ -1,11 +1,155 @@
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
 
+from .compact_utils import to_logical_dtypes
+from .correlation_utils import (
+    CORR_LABEL_MAX_COLUMNS,
+    get_correlation_matrix,
+    order_for_heatmap,
+    top_correlated_pairs,
+)
+from .trace_utils import traced
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# ────────────────────────────────────────────────────────────────────────────────
+# CHART PAYLOAD LIMITS (overridable through environment variables)
+# ────────────────────────────────────────────────────────────────────────────────
+MAX_POINTS      = int(os.getenv("GROWIFY_VIZ_MAX_POINTS", "2000"))      # per trace
+WEBGL_POINTS    = int(os.getenv("GROWIFY_VIZ_WEBGL_POINTS", "1000"))    # Scattergl above this
+MARKER_POINTS   = 200                                                  # markers only on short series
+DOWNSAMPLE_MODE = os.getenv("GROWIFY_VIZ_DOWNSAMPLE", "bucket")         # "bucket" or "lttb"
+
+# Candidate time buckets from finest to coarsest: (label, pandas frequency, approximate length)
+TIME_BUCKETS = [
+    ("hourly", "h", pd.Timedelta(hours=1)),
+    ("daily", "D", pd.Timedelta(days=1)),
+    ("weekly", "W-MON", pd.Timedelta(days=7)),
+    ("monthly", "MS", pd.Timedelta(days=30.44)),
+    ("quarterly", "QS", pd.Timedelta(days=91.31)),
+    ("yearly", "YS", pd.Timedelta(days=365.25)),
+]
+
+
+def choose_time_bucket(start: pd.Timestamp, end: pd.Timestamp, max_points: int = MAX_POINTS) -> Optional[Tuple[str, str]]:
+    """Finest (label, frequency) whose bucket count over [start, end] stays within max_points."""
+    span = end - start
+    for label, freq, length in TIME_BUCKETS:
+        if span / length < max_points:
+            return label, freq
+    return None
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of `n_out` points that keep the
+    visual shape of the (sorted) series. The first and last points are always kept.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out - 2 inner buckets
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[previous] - avg_x) * (y[lo:hi] - y[previous])
+                      - (x[previous] - x[lo:hi]) * (avg_y - y[previous]))
+        previous = lo + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def _numeric_axis(values: pd.Series) -> np.ndarray:
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype("int64").to_numpy()
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=np.float64)
+    return np.arange(len(values), dtype=np.float64)
+
+
+def downsample_time_series(
+    df: pd.DataFrame,
+    time_col: str,
+    value_cols: List[str],
+    how: str = "sum",
+    max_points: int = MAX_POINTS,
+    mode: str = DOWNSAMPLE_MODE,
+) -> Tuple[Dict[str, pd.Series], Optional[str]]:
+    """
+    Reduces each value column to at most `max_points` points against `time_col`.
+
+    Datetime axes are aggregated (`how` = "sum" or "mean") into the finest
+    hourly…yearly bucket that fits; other axes, or mode="lttb", use LTTB.
+    Returns the series (indexed by x) and a label for the chart title, which is
+    None when the data was small enough to plot as is.
+    """
+    frame = to_logical_dtypes(df[[time_col] + value_cols]).dropna(subset=[time_col])
+    if len(frame) <= max_points:
+        frame = frame.sort_values(time_col)
+        return {col: frame.set_index(time_col)[col] for col in value_cols}, None
+
+    times = frame[time_col]
+    if mode == "bucket" and pd.api.types.is_datetime64_any_dtype(times):
+        bucket = choose_time_bucket(times.min(), times.max(), max_points)
+        if bucket is not None:
+            label, freq = bucket
+            grouped = frame.groupby(pd.Grouper(key=time_col, freq=freq))[value_cols]
+            # min_count keeps empty buckets as gaps rather than zeros
+            agg = grouped.sum(min_count=1) if how == "sum" else grouped.mean()
+            return {col: agg[col] for col in value_cols}, f"{label} {how}"
+
+    frame = frame.sort_values(time_col, kind="stable")
+    series = {}
+    for col in value_cols:
+        points = frame[[time_col, col]].dropna()
+        keep = lttb(_numeric_axis(points[time_col]), points[col].to_numpy(), max_points)
+        series[col] = points.iloc[keep].set_index(time_col)[col]
+    return series, f"LTTB {max_points:,} points"
+
+
+def _time_series_figure(series: Dict[str, pd.Series], title: str, label: Optional[str], time_col: str) -> "go.Figure":
+    """Line chart, switching to WebGL (Scattergl) once a trace is long enough to need it."""
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    for name, values in series.items():
+        trace = go.Scattergl if len(values) > WEBGL_POINTS else go.Scatter
+        fig.add_trace(trace(
+            x=values.index,
+            y=values.to_numpy(),
+            mode='lines+markers' if len(values) <= MARKER_POINTS else 'lines',
+            name=name,
+            line=dict(width=2)
+        ))
+    fig.update_layout(
+        title=f"{title} ({label})" if label else title,
+        xaxis_title=time_col,
+        yaxis_title="Value",
+        hovermode='x unified'
+    )
+    return fig
+
+
+@traced("visualize")
+def create_dynamic_visualizations(df: pd.DataFrame, column_analysis: dict, dataset_key: Optional[str] = None) -> list:
+    """
+    Create relevant visualizations based on detected column types.
+    Pass `dataset_key` to reuse the correlation matrix across calls for the same dataset version.
+    """
+    # plotly is imported on the first chart rather than with the backend (plotly.express alone is ~0.3s)
+    import plotly.express as px
+    import plotly.graph_objects as go
 
-def create_dynamic_visualizations(df: pd.DataFrame, column_analysis: dict) -> list:
-    """Create relevant visualizations based on detected column types"""
     figures = []
     temporal_cols = [col for col, info in column_analysis.items() if info['likely_purpose'] == 'temporal']
     financial_cols = [col for col, info in column_analysis.items() if info['likely_purpose'] == 'financial']
@@ -14,45 +158,18 @@ def create_dynamic_visualizations(df: pd.DataFrame, column_analysis: dict) -> li
     if temporal_cols and (financial_cols or metric_cols):
         for time_col in temporal_cols[:1]:
             try:
-                df_sorted = df.sort_values(time_col)
+                # Payload stays bounded: at most MAX_POINTS points per trace whatever the row count
                 if financial_cols:
-                    fig = go.Figure()
-                    for fin_col in financial_cols[:3]:
-                        if pd.api.types.is_numeric_dtype(df_sorted[fin_col]):
-                            fig.add_trace(go.Scatter(
-                                x=df_sorted[time_col],
-                                y=df_sorted[fin_col],
-                                mode='lines+markers',
-                                name=fin_col,
-                                line=dict(width=2)
-                            ))
-                    if fig.data:
-                        fig.update_layout(
-                            title="Financial Metrics Over Time",
-                            xaxis_title=time_col,
-                            yaxis_title="Value",
-                            hovermode='x unified'
-                        )
-                        figures.append(fig)
+                    cols = [c for c in financial_cols[:3] if pd.api.types.is_numeric_dtype(df[c])]
+                    if cols:
+                        series, label = downsample_time_series(df, time_col, cols, how="sum")
+                        figures.append(_time_series_figure(series, "Financial Metrics Over Time", label, time_col))
                 if metric_cols:
-                    fig = go.Figure()
-                    for metric_col in metric_cols[:3]:
-                        if pd.api.types.is_numeric_dtype(df_sorted[metric_col]):
-                            fig.add_trace(go.Scatter(
-                                x=df_sorted[time_col],
-                                y=df_sorted[metric_col],
-                                mode='lines+markers',
-                                name=metric_col,
-                                line=dict(width=2)
-                            ))
-                    if fig.data:
-                        fig.update_layout(
-                            title="Performance Metrics Over Time",
-                            xaxis_title=time_col,
-                            yaxis_title="Value",
-                            hovermode='x unified'
-                        )
-                        figures.append(fig)
+                    # Rates and ratios are averaged per bucket, never summed
+                    cols = [c for c in metric_cols[:3] if pd.api.types.is_numeric_dtype(df[c])]
+                    if cols:
+                        series, label = downsample_time_series(df, time_col, cols, how="mean")
+                        figures.append(_time_series_figure(series, "Performance Metrics Over Time", label, time_col))
             except Exception as e:
                 # In Streamlit, warnings happen in st.warning calls; here, propagate exception
                 raise RuntimeError(f"Could not create time series for {time_col}: {e}")
@@ -64,15 +181,38 @@ def create_dynamic_visualizations(df: pd.DataFrame, column_analysis: dict) -> li
         try:
             numeric_df = df[numeric_cols].select_dtypes(include=[np.number])
             if len(numeric_df.columns) > 1:
-                corr_matrix = numeric_df.corr()
+                corr_matrix = get_correlation_matrix(df, list(numeric_df.columns), dataset_key)
+                heatmap = order_for_heatmap(corr_matrix)
+                title = "Metric Correlations"
+                if len(heatmap) < len(corr_matrix):
+                    title += f" ({len(heatmap)} of {len(corr_matrix)} most correlated metrics)"
                 fig = px.imshow(
-                    corr_matrix,
-                    text_auto=True,
+                    heatmap,
+                    text_auto='.2f' if len(heatmap) <= CORR_LABEL_MAX_COLUMNS else False,
                     aspect="auto",
-                    title="Metric Correlations",
-                    color_continuous_scale='RdBu_r'
+                    title=title,
+                    color_continuous_scale='RdBu_r',
+                    zmin=-1,
+                    zmax=1
                 )
                 figures.append(fig)
+
+                pairs = top_correlated_pairs(corr_matrix)
+                if len(corr_matrix) > 3 and not pairs.empty:
+                    labels = pairs["metric_a"] + " ↔ " + pairs["metric_b"]
+                    fig = go.Figure(go.Bar(
+                        x=pairs["correlation"][::-1],
+                        y=labels[::-1],
+                        orientation='h',
+                        marker_color=np.where(pairs["correlation"][::-1] >= 0, '#b2182b', '#2166ac'),
+                        text=pairs["correlation"][::-1].round(2),
+                    ))
+                    fig.update_layout(
+                        title=f"Strongest Metric Correlations (top {len(pairs)})",
+                        xaxis_title="Pearson r",
+                        xaxis_range=[-1, 1]
+                    )
+                    figures.append(fig)
         except Exception as e:
             raise RuntimeError(f"Could not create correlation matrix: {e}")
 
@@ -0,0 +1,178 @@
+# File: src/Test_red/app_backend/workspace.py
+
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import duckdb
+
+from ..logger import logger
+from .cache_utils import CACHE_DIR
+from .sql_utils import restrict_connection
+
+# ────────────────────────────────────────────────────────────────────────────────
+# WORKSPACE SETTINGS (overridable through environment variables)
+# ────────────────────────────────────────────────────────────────────────────────
+WORKSPACE_DIR         = os.getenv("GROWIFY_WORKSPACE_DIR", os.path.join(CACHE_DIR, "workspaces"))
+WORKSPACE_THREADS     = int(os.getenv("GROWIFY_DUCKDB_THREADS", "2"))
+WORKSPACE_MEMORY      = os.getenv("GROWIFY_DUCKDB_MEMORY_LIMIT", "2GB")
+MAX_OPEN_WORKSPACES   = int(os.getenv("GROWIFY_MAX_OPEN_WORKSPACES", "8"))
+# Workspaces touched more recently than this are never evicted, so a rerun in
+# progress does not lose its connection to another session's upload.
+WORKSPACE_IDLE_SECONDS = float(os.getenv("GROWIFY_WORKSPACE_IDLE_SECONDS", "120"))
+
+
+class WorkspaceManager:
+    """
+    One file-backed DuckDB database per dataset key.
+
+    Each database is built once with a read-write connection, then opened
+    read-only, without file or network access for the SQL it runs, and shared
+    by every session looking at the same file; sessions get their own cursor
+    per rerun. Open databases are closed LRU-first once more than `max_open`
+    are idle.
+    """
+
+    def __init__(
+        self,
+        directory: str = WORKSPACE_DIR,
+        max_open: int = MAX_OPEN_WORKSPACES,
+        threads: int = WORKSPACE_THREADS,
+        memory_limit: str = WORKSPACE_MEMORY,
+        idle_seconds: float = WORKSPACE_IDLE_SECONDS,
+    ):
+        self.directory = directory
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self.config = {
+            "threads": threads,
+            "memory_limit": memory_limit,
+            "temp_directory": os.path.join(directory, "tmp"),
+        }
+        self._open = OrderedDict()   # key -> (read-only connection, last access time)
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        os.makedirs(self.config["temp_directory"], exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.duckdb")
+
+    def _build_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._build_locks.setdefault(key, threading.Lock())
+
+    def _ready_marker(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.ready")
+
+    def connect(self, key: str, build: Callable[[duckdb.DuckDBPyConnection], None]) -> duckdb.DuckDBPyConnection:
+        """
+        Returns a cursor on the dataset's workspace, building the database with
+        `build(conn)` the first time any session asks for this key.
+        """
+        with self._lock:
+            entry = self._open.get(key)
+            if entry is not None:
+                self._open[key] = (entry[0], time.monotonic())
+                self._open.move_to_end(key)
+                return entry[0].cursor()
+
+        with self._build_lock(key):
+            with self._lock:
+                entry = self._open.get(key)
+            if entry is None:
+                if not os.path.exists(self._ready_marker(key)):
+                    self._build(key, build)
+                conn = restrict_connection(duckdb.connect(self.path(key), read_only=True, config=self.config))
+                with self._lock:
+                    self._open[key] = (conn, time.monotonic())
+                    self._evict_idle()
+                entry = (conn, None)
+        return entry[0].cursor()
+
+    def _build(self, key: str, build: Callable[[duckdb.DuckDBPyConnection], None]) -> None:
+        path = self.path(key)
+        for leftover in (path, f"{path}.wal"):  # from a build that never completed
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        started = time.perf_counter()
+        conn = duckdb.connect(path, config=self.config)
+        try:
+            build(conn)
+            conn.execute("CHECKPOINT")
+        finally:
+            conn.close()
+        open(self._ready_marker(key), "w").close()
+        logger.info(f"Built workspace {key[:12]} in {time.perf_counter() - started:.2f}s")
+
+    def derive(self, key: str, base_key: str, update: Callable[[duckdb.DuckDBPyConnection], None]) -> bool:
+        """
+        Builds the workspace for `key` as a copy of the already-built `base_key`
+        workspace changed by `update(conn)`, e.g. with appended rows, instead of
+        loading everything again. Returns False, building nothing, when there is
+        no base workspace to start from.
+        """
+        if not os.path.exists(self._ready_marker(base_key)):
+            return False
+        with self._build_lock(key):
+            if os.path.exists(self._ready_marker(key)):
+                return True
+            path = self.path(key)
+            if os.path.exists(f"{path}.wal"):
+                os.remove(f"{path}.wal")
+            started = time.perf_counter()
+            # Base workspaces are checkpointed when built and only opened read-only afterwards
+            shutil.copyfile(self.path(base_key), path)
+            conn = duckdb.connect(path, config=self.config)
+            try:
+                update(conn)
+                conn.execute("CHECKPOINT")
+            finally:
+                conn.close()
+            open(self._ready_marker(key), "w").close()
+            logger.info(f"Derived workspace {key[:12]} from {base_key[:12]} in {time.perf_counter() - started:.2f}s")
+        return True
+
+    def _evict_idle(self) -> None:
+        """Closes least-recently-used workspaces beyond max_open (caller holds the lock)."""
+        now = time.monotonic()
+        for key in list(self._open):
+            if len(self._open) <= self.max_open:
+                break
+            conn, last_access = self._open[key]
+            if now - last_access < self.idle_seconds:
+                continue
+            del self._open[key]
+            conn.close()
+            logger.info(f"Evicted idle workspace {key[:12]}")
+
+    def close(self, key: str) -> None:
+        with self._lock:
+            entry = self._open.pop(key, None)
+        if entry is not None:
+            entry[0].close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            entries, self._open = list(self._open.values()), OrderedDict()
+        for conn, _ in entries:
+            conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"open_workspaces": len(self._open), "max_open": self.max_open, **self.config}
+
+
+_manager: Optional[WorkspaceManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_workspace_manager() -> WorkspaceManager:
+    """Process-wide workspace manager shared by every Streamlit session."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = WorkspaceManager()
+        return _manager
@@ -0,0 +1,440 @@
+# File: src/Test_red/batch.py
+"""
+Headless batch analysis: every CSV/XLSX in a directory × a fixed list of questions.
+
+    python -m src.Test_red.batch exports/ --questions questions.txt --output-dir reports/
+    python -m src.Test_red.batch exports/ -q "Which month had the best ROAS?" --workers 8 --llm-concurrency 16
+
+Ingestion and profiling run in a process pool (scales with cores); the analysis,
+SQL and polish calls go through a bounded thread pool (scales with the LLM
+concurrency limit). Each file gets a Markdown and a JSON report, and the run
+ends with a timing summary (summary.md / summary.json).
+"""
+
+import os
+import json
+import time
+import queue
+import argparse
+import contextvars
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional
+
+# ────────────────────────────────────────────────────────────────────────────────
+# BATCH SETTINGS (overridable through environment variables or flags)
+# ────────────────────────────────────────────────────────────────────────────────
+DATA_EXTENSIONS   = (".csv", ".xlsx", ".xls")
+DEFAULT_WORKERS   = int(os.getenv("GROWIFY_BATCH_WORKERS", str(os.cpu_count() or 1)))
+LLM_CONCURRENCY   = int(os.getenv("GROWIFY_BATCH_LLM_CONCURRENCY", "8"))
+REPORT_SQL_ROWS   = 20      # result rows kept per question in the reports
+STAGES            = ("ingest", "profile", "analysis", "sql", "polish", "sql_execute", "question", "file")
+PERCENTILES       = (50, 95)
+
+
+@dataclass
+class PreparedDataset:
+    """Output of the local stages for one file, shipped back from the worker process."""
+    path: str
+    dataset_key: str
+    df: object
+    profile: object
+    column_analysis: dict
+    summary_text: str
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class QuestionRun:
+    question: str
+    question_id: str
+    results: Dict[str, object] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+    sql_rows: Optional[list] = None
+    sql_truncated: bool = False
+    started: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class FileRun:
+    """Per-file progress: pending LLM jobs and the per-question results."""
+    dataset: PreparedDataset
+    questions: List[QuestionRun]
+    pending: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+
+def find_datasets(directory: str, recursive: bool = False) -> List[str]:
+    """CSV/Excel files under `directory`, sorted for stable report order."""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(DATA_EXTENSIONS))
+        if not recursive:
+            break
+    return sorted(paths)
+
+
+def read_questions(path: Optional[str], inline: Optional[List[str]]) -> List[str]:
+    """Questions from a file (one per line, `#` comments and blank lines skipped) plus any given inline."""
+    questions = []
+    if path:
+        with open(path, encoding="utf-8") as f:
+            questions.extend(line.strip() for line in f if line.strip() and not line.lstrip().startswith("#"))
+    questions.extend(q.strip() for q in inline or [] if q.strip())
+    return questions
+
+
+def prepare_dataset(path: str) -> PreparedDataset:
+    """Local stages, run in a worker process: parse, clean (cached by content hash), profile."""
+    from .app_backend.data_utils import detect_column_types
+    from .app_backend.ingest import load_dataset
+    from .app_backend.profile_utils import get_dataset_profile
+
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        data = f.read()
+    key, df = load_dataset(data, os.path.basename(path))
+    ingested = time.perf_counter()
+    profile = get_dataset_profile(df, key)  # already computed if ingestion compacted the frame
+    column_analysis = detect_column_types(df, profile)
+    summary_text = f"The dataset has {profile.n_rows} rows and columns like {', '.join(df.columns[:5])}."
+    return PreparedDataset(path, key, df, profile, column_analysis, summary_text, {
+        "ingest": ingested - started,
+        "profile": time.perf_counter() - ingested,
+    })
+
+
+def _failed(result) -> bool:
+    # The API clients report failures as text instead of raising
+    return isinstance(result, str) and result.startswith("Error")
+
+
+class BatchRunner:
+    """
+    Drives the run from the main thread: a process pool for the local stages, a
+    bounded thread pool as the LLM queue, and one event queue both report to.
+    At most `workers + llm_concurrency` files are in flight, so cleaned frames
+    waiting for the LLM queue never pile up in memory.
+    """
+
+    def __init__(self, questions: List[str], output_dir: str, workers: int = DEFAULT_WORKERS,
+                 llm_concurrency: int = LLM_CONCURRENCY, execute_sql: bool = True, root: Optional[str] = None):
+        self.questions = questions
+        self.output_dir = output_dir
+        self.root = root
+        self.workers = max(1, workers)
+        self.llm_concurrency = max(1, llm_concurrency)
+        self.execute_sql = execute_sql
+        self.run_id = None
+        self.events: "queue.Queue[tuple]" = queue.Queue()
+        self.reports: List[dict] = []
+
+    # ── LLM queue ──────────────────────────────────────────────────────────────
+    def _submit_llm(self, pool: ThreadPoolExecutor, run: FileRun, question: QuestionRun, stage: str,
+                    call: Callable[[], object]) -> None:
+        from .app_backend.trace_utils import span, trace_context
+
+        def job():
+            begin = time.perf_counter()
+            try:
+                with trace_context(self.run_id, question.question_id), span(stage, file=os.path.basename(run.dataset.path)):
+                    result = call()
+                return result, None, time.perf_counter() - begin
+            except Exception as e:  # reported in the file's report, never fatal to the run
+                return None, e, time.perf_counter() - begin
+
+        run.pending += 1
+        # Each job runs in a copy of this context, so the cache bypass applies in the pool threads
+        future = pool.submit(contextvars.copy_context().run, job)
+        future.add_done_callback(lambda f: self.events.put(("llm", run, question, stage, f)))
+
+    def _start_questions(self, pool: ThreadPoolExecutor, run: FileRun) -> None:
+        from .app_backend.analysis_utils import analyze_marketing_question
+        from .app_backend.sql_utils import generate_sql_query
+
+        ds = run.dataset
+        for q in run.questions:
+            self._submit_llm(pool, run, q, "analysis", lambda q=q: analyze_marketing_question(
+                ds.df, q.question, ds.summary_text, profile=ds.profile, column_analysis=ds.column_analysis))
+            self._submit_llm(pool, run, q, "sql", lambda q=q: generate_sql_query(
+                q.question, ds.df, ds.column_analysis))
+
+    def _record(self, pool: ThreadPoolExecutor, run: FileRun, question: QuestionRun, stage: str, future: Future) -> None:
+        from .app_backend.analysis_utils import polish_with_gemini
+
+        run.pending -= 1
+        result, error, seconds = future.result()
+        question.timings[stage] = seconds
+        question.timings["question"] = time.perf_counter() - question.started  # queue wait included
+        if error is not None or _failed(result):
+            question.errors[stage] = f"{type(error).__name__}: {error}" if error is not None else str(result)
+            if stage == "analysis":
+                question.errors["polish"] = "skipped: analysis failed"
+            return
+        question.results[stage] = result
+        if stage == "analysis":
+            # The polish joins the queue the moment its input lands
+            self._submit_llm(pool, run, question, "polish",
+                             lambda: polish_with_gemini(question.question, result, run.dataset.summary_text))
+
+    # ── per-file reports ───────────────────────────────────────────────────────
+    def _execute_sql(self, run: FileRun) -> None:
+        import duckdb
+        from .app_backend.ingest import TABLE_NAME, create_table_from_frame
+        from .app_backend.sql_utils import guarded_execute, restrict_connection
+
+        todo = [q for q in run.questions if "sql" in q.results]
+        if not todo:
+            return
+        conn = duckdb.connect()
+        try:
+            create_table_from_frame(conn, run.dataset.df, TABLE_NAME)
+            restrict_connection(conn)
+            for q in todo:
+                begin = time.perf_counter()
+                try:
+                    result_df = guarded_execute(conn, q.results["sql"])
+                except Exception as e:  # SQLGuardError, QueryTimeoutError or a DuckDB error
+                    q.errors["sql_execute"] = f"{type(e).__name__}: {e}"
+                else:
+                    q.sql_rows = json.loads(result_df.head(REPORT_SQL_ROWS).to_json(orient="records", date_format="iso"))
+                    q.sql_truncated = bool(result_df.attrs.get("truncated")) or len(result_df) > REPORT_SQL_ROWS
+                q.timings["sql_execute"] = time.perf_counter() - begin
+        finally:
+            conn.close()
+
+    def _finish_file(self, run: FileRun) -> None:
+        if self.execute_sql:
+            self._execute_sql(run)
+        now = time.perf_counter()
+        ds = run.dataset
+        report = {
+            "file": ds.path,
+            "dataset_key": ds.dataset_key,
+            "rows": ds.profile.n_rows,
+            "columns": len(ds.df.columns),
+            "status": "ok" if not any(q.errors for q in run.questions) else "partial",
+            "timings": {**ds.timings, "file": ds.timings["ingest"] + ds.timings["profile"] + now - run.started},
+            "questions": [{
+                "question": q.question,
+                "question_id": q.question_id,
+                "polish": q.results.get("polish"),
+                "analysis": q.results.get("analysis"),
+                "sql": q.results.get("sql"),
+                "sql_rows": q.sql_rows,
+                "sql_truncated": q.sql_truncated,
+                "errors": q.errors,
+                "timings": {k: round(v, 4) for k, v in q.timings.items()},
+            } for q in run.questions],
+        }
+        self._write_report(report)
+
+    def _fail_file(self, path: str, error: BaseException) -> None:
+        self._write_report({"file": path, "status": "failed", "error": f"{type(error).__name__}: {error}",
+                            "timings": {}, "questions": []})
+
+    def _write_report(self, report: dict) -> None:
+        # Relative path as the name, so same-named exports in different folders don't collide
+        name = os.path.relpath(report["file"], self.root) if self.root else os.path.basename(report["file"])
+        stem = os.path.join(self.output_dir, name.replace(os.sep, "__"))
+        report["report"] = f"{stem}.md"
+        with open(f"{stem}.json", "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+        with open(f"{stem}.md", "w", encoding="utf-8") as f:
+            f.write(render_markdown(report))
+        self.reports.append(report)
+        print(f"[{len(self.reports)}] {report['status']:<8} {os.path.basename(report['file'])}", flush=True)
+
+    # ── main loop ──────────────────────────────────────────────────────────────
+    def run(self, paths: List[str]) -> List[dict]:
+        from .app_backend.trace_utils import new_id
+
+        self.run_id = new_id()
+        os.makedirs(self.output_dir, exist_ok=True)
+        pending_paths = iter(paths)
+        in_flight = 0
+        # spawn: workers must not inherit the parent's LLM threads or DuckDB state through fork
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.workers, mp_context=context) as processes, \
+                ThreadPoolExecutor(self.llm_concurrency, thread_name_prefix="llm") as llm:
+
+            def submit_next() -> bool:
+                path = next(pending_paths, None)
+                if path is None:
+                    return False
+                future = processes.submit(prepare_dataset, path)
+                future.add_done_callback(lambda f, path=path: self.events.put(("prepared", path, f)))
+                return True
+
+            for _ in range(self.workers + self.llm_concurrency):
+                in_flight += submit_next()
+            while in_flight:
+                event = self.events.get()
+                if event[0] == "prepared":
+                    _, path, future = event
+                    try:
+                        dataset = future.result()
+                    except Exception as e:
+                        self._fail_file(path, e)
+                        in_flight -= 1
+                        in_flight += submit_next()
+                        continue
+                    run = FileRun(dataset, [QuestionRun(q, new_id()) for q in self.questions])
+                    self._start_questions(llm, run)
+                else:
+                    _, run, question, stage, future = event
+                    self._record(llm, run, question, stage, future)
+                if run.pending == 0:
+                    self._finish_file(run)
+                    in_flight -= 1
+                    in_flight += submit_next()
+        return self.reports
+
+
+def _fmt_rows(rows: list) -> str:
+    if not rows:
+        return "_(no rows)_"
+    columns = list(rows[0])
+    lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+    lines.extend("| " + " | ".join(str(row.get(c, "")).replace("|", "\\|") for c in columns) + " |" for row in rows)
+    return "\n".join(lines)
+
+
+def render_markdown(report: dict) -> str:
+    """Human-readable report of one file: executive summary, analysis and SQL per question."""
+    name = os.path.basename(report["file"])
+    if report["status"] == "failed":
+        return f"# {name}\n\n**Failed:** {report['error']}\n"
+    lines = [f"# {name}", "",
+             f"{report['rows']:,} rows × {report['columns']} columns · dataset `{report['dataset_key'][:12]}` · "
+             f"ingest {report['timings']['ingest']:.2f}s · profile {report['timings']['profile']:.2f}s", ""]
+    for i, q in enumerate(report["questions"], start=1):
+        lines += [f"## {i}. {q['question']}", ""]
+        for stage, title in (("polish", "Executive Report"), ("analysis", "Detailed Analysis")):
+            lines += [f"### {title}", "", q[stage] or f"_Failed: {q['errors'].get(stage, 'no result')}_", ""]
+        lines += ["### SQL", ""]
+        if q["sql"]:
+            lines += ["```sql", q["sql"], "```", ""]
+            if "sql_execute" in q["errors"]:
+                lines += [f"_Execution failed: {q['errors']['sql_execute']}_", ""]
+            elif q["sql_rows"] is not None:
+                lines += [_fmt_rows(q["sql_rows"]), ""]
+                if q["sql_truncated"]:
+                    lines += [f"_First {len(q['sql_rows'])} rows shown_", ""]
+        else:
+            lines += [f"_Failed: {q['errors'].get('sql', 'no result')}_", ""]
+        timings = " · ".join(f"{stage} {seconds:.1f}s" for stage, seconds in q["timings"].items())
+        lines += [f"⏱️ {timings}", ""]
+    return "\n".join(lines)
+
+
+def summarize(reports: List[dict], wall_seconds: float, settings: dict) -> dict:
+    """Run summary: file/question counts, per-stage p50/p95/max and throughput."""
+    import numpy as np
+
+    samples: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    for report in reports:
+        for stage, seconds in report["timings"].items():
+            samples.setdefault(stage, []).append(seconds)
+        for q in report["questions"]:
+            for stage, seconds in q["timings"].items():
+                samples.setdefault(stage, []).append(seconds)
+            for stage in q["errors"]:
+                errors[stage] = errors.get(stage, 0) + 1
+    stages = {}
+    for stage in STAGES:
+        if stage in samples:
+            values = np.asarray(samples[stage])
+            stages[stage] = {**{f"p{p}": round(float(np.percentile(values, p)), 4) for p in PERCENTILES},
+                             "max": round(float(values.max()), 4), "total": round(float(values.sum()), 4),
+                             "count": len(values)}
+    questions = sum(len(r["questions"]) for r in reports)
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "settings": settings,
+        "wall_seconds": round(wall_seconds, 3),
+        "files": {status: sum(r["status"] == status for r in reports) for status in ("ok", "partial", "failed")},
+        "questions": questions,
+        "throughput": {
+            "files_per_minute": round(60 * len(reports) / wall_seconds, 2) if wall_seconds else 0.0,
+            "questions_per_minute": round(60 * questions / wall_seconds, 2) if wall_seconds else 0.0,
+        },
+        "stages": stages,
+        "errors": errors,
+        "reports": [{"file": r["file"], "status": r["status"], "report": r["report"]} for r in reports],
+    }
+
+
+def render_summary(summary: dict) -> Iterator[str]:
+    files = summary["files"]
+    yield (f"{sum(files.values())} files ({files['ok']} ok, {files['partial']} partial, {files['failed']} failed), "
+           f"{summary['questions']} questions in {summary['wall_seconds']:.1f}s "
+           f"({summary['throughput']['files_per_minute']:.1f} files/min, "
+           f"{summary['throughput']['questions_per_minute']:.1f} questions/min)")
+    yield f"{'stage':<14}{'p50':>9}{'p95':>9}{'max':>9}{'total':>10}{'count':>7}{'errors':>8}"
+    for stage, stats in summary["stages"].items():
+        yield (f"{stage:<14}{stats['p50']:>8.2f}s{stats['p95']:>8.2f}s{stats['max']:>8.2f}s{stats['total']:>9.1f}s"
+               f"{stats['count']:>7}{summary['errors'].get(stage, 0):>8}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory", help="directory of CSV/XLSX exports")
+    parser.add_argument("--questions", help="text file with one question per line")
+    parser.add_argument("-q", "--question", action="append", help="a question (repeatable)")
+    parser.add_argument("--output-dir", default="batch_reports")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="processes for ingestion and profiling")
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_CONCURRENCY, help="LLM calls in flight at once")
+    parser.add_argument("--recursive", action="store_true")
+    parser.add_argument("--no-sql-execute", action="store_true", help="generate SQL without running it")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the LLM response cache")
+    parser.add_argument("--trace-log", help="JSON span log (default: <output-dir>/trace.jsonl)")
+    args = parser.parse_args(argv)
+
+    questions = read_questions(args.questions, args.question)
+    if not questions:
+        parser.error("no questions given (use --questions FILE or -q)")
+    paths = find_datasets(args.directory, args.recursive)
+    if not paths:
+        parser.error(f"no {'/'.join(DATA_EXTENSIONS)} files in {args.directory}")
+
+    # Span JSON goes to a file rather than stdout; set before the backend (and the worker processes) load
+    os.makedirs(args.output_dir, exist_ok=True)
+    os.environ.setdefault("GROWIFY_TRACE_LOG", args.trace_log or os.path.join(args.output_dir, "trace.jsonl"))
+    from .app_backend.api_clients import missing_api_keys
+    from .app_backend.llm_cache import llm_cache_bypass
+
+    missing = missing_api_keys()
+    if missing:
+        parser.error(f"missing or empty {', '.join(missing)} in environment variables")
+
+    runner = BatchRunner(questions, args.output_dir, args.workers, args.llm_concurrency, not args.no_sql_execute,
+                         root=args.directory)
+    print(f"{len(paths)} files × {len(questions)} questions · {runner.workers} workers · "
+          f"{runner.llm_concurrency} concurrent LLM calls", flush=True)
+    started = time.perf_counter()
+    with llm_cache_bypass(args.no_cache):
+        reports = runner.run(paths)
+    wall = time.perf_counter() - started
+
+    settings = {k: v for k, v in vars(args).items() if k not in ("question",)}
+    settings.update(questions=questions, workers=runner.workers, llm_concurrency=runner.llm_concurrency)
+    summary = summarize(reports, wall, settings)
+    lines = list(render_summary(summary))
+    print("\n" + "\n".join(lines))
+    with open(os.path.join(args.output_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    with open(os.path.join(args.output_dir, "summary.md"), "w", encoding="utf-8") as f:
+        f.write("# Batch run summary\n\n" + lines[0] + "\n\n```\n" + "\n".join(lines[1:]) + "\n```\n\n")
+        f.write("\n".join(f"- [{os.path.basename(r['file'])}]({os.path.basename(r['report'])}) — {r['status']}"
+                          for r in summary["reports"]) + "\n")
+    print(f"Reports written to {args.output_dir}")
+    return 1 if summary["files"]["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -7,3 +7,19 @@ class DataIngestionError(Exception):
 class ModelAPIError(Exception):
     """Raised when the LLM/API call fails."""
     pass
+
+class CircuitOpenError(ModelAPIError):
+    """Raised when a provider's circuit breaker is open and calls fail fast."""
+    pass
+
+class SQLGuardError(Exception):
+    """Raised when a generated SQL query is rejected before execution."""
+    pass
+
+class QueryTimeoutError(Exception):
+    """Raised when a SQL query is cancelled after exceeding its time limit."""
+    pass
+
+class ConfigurationError(Exception):
+    """Raised when a required setting such as an API key is missing."""
+    pass
@@ -1,7 +1,9 @@
 # logger.py
 
-import logging
+import os
 import sys
+import json
+import logging
 
 # Create a logger for the entire app
 logger = logging.getLogger("julius_clone")
@@ -17,6 +19,36 @@ formatter = logging.Formatter(
 ch.setFormatter(formatter)
 logger.addHandler(ch)
 
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: dict messages are merged in, anything else becomes "message"."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        if isinstance(record.msg, dict):
+            entry.update(record.msg)
+        else:
+            entry["message"] = record.getMessage()
+        return json.dumps(entry, default=str)
+
+
+# Structured trace events (see app_backend/trace_utils.py), off unless GROWIFY_TRACE_LOG
+# names a file to write them to ("-" for stdout)
+trace_logger = logger.getChild("trace")
+trace_logger.propagate = False
+_trace_path = os.getenv("GROWIFY_TRACE_LOG")
+if _trace_path:
+    th = logging.StreamHandler(sys.stdout) if _trace_path == "-" else logging.FileHandler(_trace_path)
+    th.setLevel(logging.INFO)
+    th.setFormatter(JsonFormatter())
+else:
+    th = logging.NullHandler()
+trace_logger.addHandler(th)
+
 # Example usage:
 # from app_backend.logger import logger
 # logger.info("This is an informational message.")
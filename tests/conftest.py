@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Tests import the package the way app.py does (`src.Test_red...`), from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Every on-disk cache (ingestion, LLM responses, workspaces) goes to a fresh directory per run
+os.environ.setdefault("GROWIFY_CACHE_DIR", tempfile.mkdtemp(prefix="growify_test_"))
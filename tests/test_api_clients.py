@@ -0,0 +1,108 @@
+import contextvars
+import json
+import threading
+
+import pytest
+import requests
+
+from src.Test_red.app_backend import api_clients
+from src.Test_red.app_backend.llm_cache import LLMResponseCache
+from src.Test_red.exception import ModelAPIError
+
+
+class FakeStream:
+    """A streamed Together response: SSE lines, optionally failing after them."""
+
+    def __init__(self, lines, error=None):
+        self.lines, self.error = lines, error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self, decode_unicode=False):
+        yield from self.lines
+        if self.error is not None:
+            raise self.error
+
+
+def _delta(text, finish_reason=None):
+    return "data: " + json.dumps({"choices": [{"delta": {"content": text}, "finish_reason": finish_reason}]})
+
+
+@pytest.fixture
+def together(monkeypatch, tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"))
+    monkeypatch.setattr(api_clients, "TOGETHER_API_KEY", "test-key")
+    monkeypatch.setattr(api_clients, "get_llm_cache", lambda: cache)
+    monkeypatch.setattr(api_clients, "_report_error", lambda message: None)
+
+    def respond(stream):
+        client = type("Client", (), {"post": lambda self, *args, **kwargs: stream})()
+        monkeypatch.setattr(api_clients, "get_http_client", lambda name: client)
+    return respond, cache
+
+
+def _cached(cache, prompt):
+    return cache.get(LLMResponseCache.make_key(api_clients.MODEL_NAME, prompt, 512, 0.1))
+
+
+def test_complete_stream_is_cached(together):
+    respond, cache = together
+    respond(FakeStream([_delta("Hello "), _delta("world"), "data: [DONE]"]))
+    assert "".join(api_clients.stream_together_ai("complete")) == "Hello world"
+    assert _cached(cache, "complete") == "Hello world"
+
+
+def test_finish_reason_marks_stream_complete(together):
+    respond, cache = together
+    respond(FakeStream([_delta("Hello"), _delta("", finish_reason="stop")]))
+    assert "".join(api_clients.stream_together_ai("finished")) == "Hello"
+    assert _cached(cache, "finished") == "Hello"
+
+
+def test_failure_after_partial_output_raises(together):
+    respond, cache = together
+    respond(FakeStream([_delta("Step 1: ")], error=requests.exceptions.ChunkedEncodingError("connection broken")))
+    tokens = []
+    with pytest.raises(ModelAPIError):
+        for token in api_clients.stream_together_ai("broken"):
+            tokens.append(token)
+    assert tokens == ["Step 1: "]
+    assert _cached(cache, "broken") is None
+
+
+def test_stream_without_done_is_not_cached(together):
+    respond, cache = together
+    respond(FakeStream([_delta("Step 1: "), _delta("partial")]))
+    with pytest.raises(ModelAPIError):
+        list(api_clients.stream_together_ai("truncated"))
+    assert _cached(cache, "truncated") is None
+
+
+def test_failure_before_output_yields_error_text(together):
+    respond, cache = together
+    respond(FakeStream([], error=requests.exceptions.ChunkedEncodingError("connection broken")))
+    assert list(api_clients.stream_together_ai("failed")) == ["Error generating response"]
+    assert _cached(cache, "failed") is None
+
+
+def test_error_handler_is_scoped_to_its_context():
+    def session(errors):
+        api_clients.set_error_handler(errors.append)
+        worker = threading.Thread(target=contextvars.copy_context().run,
+                                  args=(api_clients._report_error, f"error {len(errors)}"))
+        worker.start()
+        worker.join()
+
+    first, second = [], ["seen"]
+    contextvars.copy_context().run(session, first)
+    contextvars.copy_context().run(session, second)
+    assert first == ["error 0"]
+    assert second == ["seen", "error 1"]
+    assert api_clients._error_handler.get() == api_clients.logger.error
@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.Test_red.app_backend.append_utils import _profile_state_path, append_dataset
+from src.Test_red.app_backend.ingest import load_dataset
+from src.Test_red.app_backend.profile_utils import StreamingProfiler
+from src.Test_red.exception import DataIngestionError
+
+
+def _export(start: str, days: int, seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "Date": pd.date_range(start, periods=days, freq="D").repeat(3).strftime("%Y-%m-%d"),
+        "Channel": ["Search", "Social", "Email"] * days,
+        "Spend": rng.uniform(10, 100, days * 3).round(2),
+        "Clicks": rng.integers(0, 50, days * 3),
+    })
+    return df.to_csv(index=False).encode()
+
+
+@pytest.fixture
+def history():
+    return load_dataset(_export("2024-01-01", 60, seed=1), "history.csv")
+
+
+def test_append_adds_new_periods(history):
+    base_key, base_df = history
+    result = append_dataset(base_key, _export("2024-03-01", 10, seed=2), "march.csv")
+    assert len(result.df) == len(base_df) + 30
+    assert result.profile.n_rows == len(result.df)
+    assert result.profile.columns["Spend"].sum == pytest.approx(result.df["Spend"].sum())
+
+
+def test_overlapping_export_is_rejected(history):
+    base_key, base_df = history
+    march = _export("2024-03-01", 10, seed=2)
+    result = append_dataset(base_key, march, "march.csv")
+    with pytest.raises(DataIngestionError, match="overlaps"):
+        append_dataset(result.version, march, "march.csv")
+    with pytest.raises(DataIngestionError, match="overlaps"):
+        append_dataset(base_key, _export("2024-02-25", 10, seed=3), "late_february.csv")
+
+
+def test_profile_sketches_are_stored_as_json(history):
+    base_key, _ = history
+    result = append_dataset(base_key, _export("2024-03-01", 10, seed=2), "march.csv")
+    with open(_profile_state_path(result.version)) as f:
+        state = json.load(f)
+    assert state["n_rows"] == len(result.df)
+
+
+def test_streaming_profiler_round_trip():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "date": pd.date_range("2024-01-01", periods=5000, freq="h"),
+        "channel": rng.choice(["Search", "Social", "Email"], 5000),
+        "spend": rng.gamma(2, 50, 5000),
+        "clicks": rng.integers(0, 500, 5000),
+    })
+    profiler = StreamingProfiler()
+    profiler.update(df.iloc[:2500])
+    restored = StreamingProfiler.from_dict(json.loads(json.dumps(profiler.to_dict(), default=str)))
+    for p in (profiler, restored):
+        p.update(df.iloc[2500:])
+    expected, actual = profiler.snapshot(), restored.snapshot()
+    assert actual.n_rows == expected.n_rows
+    for col in df.columns:
+        a, e = actual.columns[col], expected.columns[col]
+        assert (a.unique_count, a.count, a.sum, a.min, a.max, a.mean) == (e.unique_count, e.count, e.sum, e.min, e.max, e.mean)
+        assert (a.q25, a.median, a.q75, a.min_date, a.max_date) == (e.q25, e.median, e.q75, e.min_date, e.max_date)
+        assert (a.year_counts, a.top_categories) == (e.year_counts, e.top_categories)
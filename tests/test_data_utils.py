@@ -0,0 +1,26 @@
+import pandas as pd
+
+from src.Test_red.app_backend.data_utils import clean_numeric_data
+
+
+def test_clean_numeric_data_strips_spaces_and_symbols():
+    df = pd.DataFrame({
+        "spend": ["1 234", "$ 3,000", "5 000", "12"],
+        "campaign": ["Spring sale", "Brand", "Retargeting", "Search"],
+    })
+    cleaned = clean_numeric_data(df)
+    assert pd.api.types.is_numeric_dtype(cleaned["spend"])
+    assert cleaned["spend"].tolist() == [1234, 3000, 5000, 12]
+    assert cleaned["campaign"].dtype == object
+
+
+def test_clean_numeric_data_keeps_mostly_text_columns():
+    df = pd.DataFrame({"notes": ["1 234", "n/a", "pending", "tbd"]})
+    assert clean_numeric_data(df)["notes"].dtype == object
+
+
+def test_clean_numeric_data_converts_mixed_int_and_str_cells():
+    # Excel and API frames hold Python numbers and formatted strings in one object column
+    cleaned = clean_numeric_data(pd.DataFrame({"clicks": [1, "2,000", 3, 4, 5]}))
+    assert pd.api.types.is_integer_dtype(cleaned["clicks"])
+    assert cleaned["clicks"].tolist() == [1, 2000, 3, 4, 5]
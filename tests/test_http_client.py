@@ -0,0 +1,88 @@
+import pytest
+import requests
+
+from benchmarks.mock_llm import MockLLMServer, MockSettings
+from src.Test_red.app_backend.http_client import CircuitBreaker, PooledHTTPClient
+from src.Test_red.exception import CircuitOpenError
+
+PAYLOAD = {"model": "mock", "messages": [{"role": "user", "content": "hello"}], "max_tokens": 5}
+
+
+@pytest.fixture
+def stub():
+    def start(**settings):
+        server = MockLLMServer(MockSettings(latency=0.0, jitter=0.0, tokens_per_second=0, seed=1, **settings))
+        servers.append(server.__enter__())
+        return server
+    servers = []
+    yield start
+    for server in servers:
+        server.__exit__(None, None, None)
+
+
+def _client(**kwargs) -> PooledHTTPClient:
+    kwargs.setdefault("breaker", CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    return PooledHTTPClient("test", connect_timeout=1, read_timeout=5, backoff_base=0.001, backoff_max=0.01, **kwargs)
+
+
+def test_post_reuses_pooled_connection(stub):
+    server = stub()
+    client = _client()
+    for _ in range(3):
+        response = client.post(f"{server.url}/v1/chat/completions", {}, PAYLOAD)
+        assert response.status_code == 200
+        assert response.json()["choices"][0]["message"]["content"]
+    assert server.stats()["requests"] == {"together": 3}
+    assert client.retries == 0
+    assert client.breaker.state == "closed"
+
+
+def test_retryable_status_is_retried_then_returned(stub):
+    server = stub(error_rate=1.0, error_status=503)
+    client = _client(max_retries=2)
+    response = client.post(f"{server.url}/v1/chat/completions", {}, PAYLOAD)
+    assert response.status_code == 503
+    assert server.stats()["requests"] == {"together": 3}
+    assert client.retries == 2
+    assert client.breaker.failures == 1
+
+
+def test_breaker_opens_and_fails_fast(stub):
+    server = stub(error_rate=1.0)
+    client = _client(max_retries=0)
+    for _ in range(2):
+        client.post(f"{server.url}/v1/chat/completions", {}, PAYLOAD)
+    assert client.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        client.post(f"{server.url}/v1/chat/completions", {}, PAYLOAD)
+    assert server.stats()["requests"] == {"together": 2}
+
+
+def test_connection_errors_raise_after_retries():
+    client = _client(max_retries=1)
+    # Nothing listens on port 9 of the loopback interface
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post("http://127.0.0.1:9/v1/chat/completions", {}, PAYLOAD)
+    assert client.retries == 1
+    assert client.breaker.failures == 1
+
+
+def test_unexpected_error_ends_half_open_trial(stub, monkeypatch):
+    server = stub()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    client = _client(breaker=breaker)
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+
+    def broken_post(*args, **kwargs):
+        raise requests.exceptions.ChunkedEncodingError("connection broken")
+    monkeypatch.setattr(client.session, "post", broken_post)
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.post(f"{server.url}/v1/chat/completions", {}, PAYLOAD)
+
+    # The failed trial re-opened the breaker instead of leaving it stuck half-open
+    monkeypatch.undo()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert client.post(f"{server.url}/v1/chat/completions", {}, PAYLOAD).status_code == 200
+    assert breaker.state == "closed"
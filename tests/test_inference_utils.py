@@ -0,0 +1,18 @@
+import pandas as pd
+
+from src.Test_red.app_backend.inference_utils import convert_dataframe
+
+
+def test_date_format_guess_falls_back_to_mixed_parsing():
+    # The first value's format does not fit the rest of the column
+    dates = ["01/02/2024"] + [f"2024-02-{day:02d}" for day in range(1, 29)]
+    converted, decisions = convert_dataframe(pd.DataFrame({"date": dates}))
+    assert decisions["date"].kind == "datetime"
+    assert decisions["date"].date_format is None
+    assert converted["date"].notna().all()
+
+
+def test_guessed_date_format_is_kept_when_it_fits():
+    converted, decisions = convert_dataframe(pd.DataFrame({"date": [f"2024-03-{day:02d}" for day in range(1, 29)]}))
+    assert decisions["date"].date_format == "%Y-%m-%d"
+    assert converted["date"].notna().all()
@@ -0,0 +1,22 @@
+import duckdb
+import pytest
+
+from src.Test_red.app_backend.ingest import stream_csv_into_duckdb
+from src.Test_red.exception import DataIngestionError
+
+
+def test_stream_csv_loads_every_chunk(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("Day,Spend\n" + "".join(f"2024-01-{d:02d},{d}.5\n" for d in range(1, 11)))
+    conn = duckdb.connect()
+    profiles = [profile for profile, _ in stream_csv_into_duckdb(conn, str(path), "data", chunk_rows=4)]
+    assert [profile.n_rows for profile in profiles] == [4, 8, 10]
+    assert conn.execute("SELECT COUNT(*), SUM(Spend) FROM data").fetchone() == (10, 60.0)
+
+
+@pytest.mark.parametrize("content", ["Day,Spend\n", ""])
+def test_stream_csv_rejects_files_without_rows(tmp_path, content):
+    path = tmp_path / "data.csv"
+    path.write_text(content)
+    with pytest.raises(DataIngestionError):
+        list(stream_csv_into_duckdb(duckdb.connect(), str(path), "data"))
@@ -0,0 +1,83 @@
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.Test_red.app_backend.data_utils import detect_column_types
+from src.Test_red.app_backend.ingest import create_table_from_frame
+from src.Test_red.app_backend.insight_engine import (
+    answer_question, build_narrative_prompt, match_intent, mentions_filter,
+)
+from src.Test_red.app_backend.rollup_utils import column_types
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    rng = np.random.default_rng(7)
+    n = 1200
+    df = pd.DataFrame({
+        "date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365, n), unit="D"),
+        "channel": rng.choice(["Search", "Social", "Display"], n),
+        "campaign_name": rng.choice([f"Campaign {i}" for i in range(12)], n),
+        "spend": rng.uniform(10, 500, n).round(2),
+        "revenue": rng.uniform(10, 2000, n).round(2),
+    })
+    conn = duckdb.connect()
+    create_table_from_frame(conn, df, "marketing_data")
+    yield conn, detect_column_types(df)
+    conn.close()
+
+
+@pytest.mark.parametrize("question", [
+    "Which month in 2023 had the highest revenue?",
+    "Top 3 channels by spend in March 2023",
+    "Top 3 channels by spend in March",
+    "Monthly revenue for Search only",
+    "Monthly revenue for Search",
+    "Best ROAS last quarter",
+    "Total spend per month this year",
+    "Top 5 campaigns by revenue in Q2",
+    "Monthly revenue from Social",
+])
+def test_filtered_questions_fall_through_to_the_llm(dataset, question):
+    conn, column_analysis = dataset
+    assert answer_question(conn, question, column_analysis) is None
+
+
+@pytest.mark.parametrize("question, kind", [
+    ("Which month had the highest revenue?", "extreme_period"),
+    ("Top 3 channels by spend", "top_n"),
+    ("Monthly revenue", "trend"),
+    ("Total revenue for each month", "trend"),
+    ("Month-over-month change in spend", "period_change"),
+])
+def test_templated_questions_are_answered(dataset, question, kind):
+    conn, column_analysis = dataset
+    result = answer_question(conn, question, column_analysis)
+    assert result is not None
+    assert result.intent.kind == kind
+    assert not result.table.empty
+
+
+def test_literal_values_are_filters():
+    values = {"channel": ["Search", "Social"], "region": ["EU", "North America"]}
+    assert mentions_filter("Top campaigns by spend in north america", values)
+    assert mentions_filter("Weekly clicks from Social", values)
+    # Too short to tell apart from ordinary words, or part of another word
+    assert not mentions_filter("Weekly clicks in Europe", values)
+    assert not mentions_filter("Weekly clicks by searcher", values)
+
+
+def test_match_intent_skips_filters_without_values(dataset):
+    conn, column_analysis = dataset
+    types = column_types(conn, "marketing_data")
+    assert match_intent("Which month in 2023 had the highest revenue?", column_analysis, types) is None
+    assert match_intent("Which month had the highest revenue?", column_analysis, types).kind == "extreme_period"
+
+
+def test_narrative_prompt_keeps_totals_exact(dataset):
+    conn, column_analysis = dataset
+    result = answer_question(conn, "Top 3 channels by revenue", column_analysis)
+    prompt = build_narrative_prompt(result)
+    for total in result.table.iloc[:, -1]:
+        assert f"{round(total, 6)}" in prompt
@@ -0,0 +1,13 @@
+import duckdb
+
+from src.Test_red.app_backend.rollup_utils import RollupTable, rollup_context
+
+
+def test_rollup_context_keeps_large_figures_exact():
+    conn = duckdb.connect()
+    conn.execute("CREATE TABLE rollup_month AS SELECT DATE '2024-01-01' AS period, 3 AS row_count, "
+                 "1234567.891 AS sum_Spend, 0.001234 AS avg_CTR")
+    rollup = RollupTable("rollup_month", "month", "Date", sums=["Spend"], averages=["CTR"], row_count=1)
+    context = rollup_context(conn, [rollup], "monthly spend")
+    assert "1234567.891" in context
+    assert "0.001234" in context
@@ -0,0 +1,71 @@
+import duckdb
+import pandas as pd
+import pytest
+
+from src.Test_red.app_backend.sql_utils import guarded_execute, restrict_connection
+from src.Test_red.exception import SQLGuardError
+
+
+@pytest.fixture
+def secret(tmp_path):
+    path = tmp_path / "secret.txt"
+    path.write_text("top secret")
+    return str(path)
+
+
+@pytest.fixture(params=["plain", "restricted"])
+def conn(request):
+    conn = duckdb.connect()
+    conn.execute("CREATE TABLE marketing_data AS SELECT range AS id, range * 1.5 AS spend FROM range(100)")
+    conn.execute("CREATE TABLE rollup_month AS SELECT 1 AS id, 10.0 AS sum_spend")
+    if request.param == "restricted":
+        restrict_connection(conn)
+    yield conn
+    conn.close()
+
+
+def test_select_runs_and_is_capped(conn):
+    result = guarded_execute(conn, "SELECT id, spend FROM marketing_data ORDER BY id", max_rows=10)
+    assert len(result) == 10
+    assert result.attrs["truncated"]
+
+
+def test_result_that_fits_exactly_is_not_truncated(conn):
+    result = guarded_execute(conn, "SELECT id FROM marketing_data", max_rows=100)
+    assert len(result) == 100
+    assert not result.attrs["truncated"]
+
+
+def test_rollups_and_generators_are_allowed(conn):
+    result = guarded_execute(conn, "SELECT m.id, r.sum_spend FROM marketing_data m JOIN rollup_month r ON m.id = r.id")
+    assert result["sum_spend"].tolist() == [10.0]
+    assert len(guarded_execute(conn, "SELECT * FROM marketing_data WHERE id IN (SELECT * FROM range(3))")) == 3
+
+
+@pytest.mark.parametrize("template", [
+    "SELECT * FROM marketing_data, read_text('{path}')",
+    "SELECT id, (SELECT content FROM read_text('{path}')) AS leaked FROM marketing_data",
+    "SELECT * FROM marketing_data WHERE EXISTS (SELECT * FROM glob('{path}'))",
+])
+def test_file_reading_table_functions_are_rejected(conn, secret, template):
+    with pytest.raises((SQLGuardError, duckdb.PermissionException)):
+        guarded_execute(conn, template.format(path=secret))
+
+
+def test_other_tables_are_rejected(conn):
+    with pytest.raises(SQLGuardError):
+        guarded_execute(conn, "SELECT * FROM duckdb_settings()")
+    with pytest.raises(SQLGuardError):
+        guarded_execute(conn, "DROP TABLE marketing_data")
+
+
+def test_restricted_connection_cannot_be_reopened(secret):
+    conn = restrict_connection(duckdb.connect())
+    cursor = conn.cursor()
+    with pytest.raises(duckdb.Error):
+        cursor.execute("SET enable_external_access = true")
+    with pytest.raises(duckdb.PermissionException):
+        cursor.execute(f"SELECT * FROM read_text('{secret}')")
+    # Registered frames, as used to load tables, are still readable
+    conn.register("frame", pd.DataFrame({"x": [1, 2]}))
+    assert conn.execute("SELECT SUM(x) FROM frame").fetchone()[0] == 3